@@ -0,0 +1,98 @@
+"""add name stem index
+
+Revision ID: a1d5c8e3f427
+Revises: f3a8d6b2c915
+Create Date: 2026-10-18 11:02:53.614290
+
+"""
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.config import SIMILAR_NAME_THRESHOLD
+from backend.name_similarity import cluster_stems, normalize_name, stem_buckets
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1d5c8e3f427'
+down_revision: Union[str, None] = 'f3a8d6b2c915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def _backfill(bind) -> None:
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, name FROM files WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(
+            sa.text("UPDATE files SET name_stem = :name_stem WHERE id = :id"),
+            [{'id': file_id, 'name_stem': normalize_name(name)} for file_id, name in rows],
+        )
+        last_id = rows[-1][0]
+
+    # Each user's stems are clustered in one pass, as similar_files_service.index_name_stems would have
+    for user_id, in bind.execute(sa.text("SELECT DISTINCT user_id FROM files")).fetchall():
+        stems = [stem for stem, in bind.execute(
+            sa.text("SELECT DISTINCT name_stem FROM files WHERE user_id = :user_id AND name_stem != '' ORDER BY name_stem"),
+            {'user_id': user_id},
+        )]
+        if not stems:
+            continue
+        bind.execute(sa.text("INSERT INTO name_stems (user_id, stem) VALUES (:user_id, :stem)"), [{'user_id': user_id, 'stem': stem} for stem in stems])
+        ids = dict(bind.execute(sa.text("SELECT stem, id FROM name_stems WHERE user_id = :user_id"), {'user_id': user_id}).fetchall())
+        clusters = cluster_stems(stems, SIMILAR_NAME_THRESHOLD)
+        members = defaultdict(list)
+        for index, stem in enumerate(stems):
+            members[clusters.find(index)].append(ids[stem])
+        bind.execute(
+            sa.text("UPDATE name_stems SET cluster_id = :cluster_id WHERE id = :id"),
+            [{'id': stem_id, 'cluster_id': min(stem_ids)} for stem_ids in members.values() for stem_id in stem_ids],
+        )
+        bind.execute(
+            sa.text("INSERT INTO name_stem_buckets (user_id, bucket, stem_id) VALUES (:user_id, :bucket, :stem_id)"),
+            [{'user_id': user_id, 'bucket': bucket, 'stem_id': ids[stem]} for stem in stems for bucket in sorted(set(stem_buckets(stem)))],
+        )
+
+
+def upgrade() -> None:
+    op.create_table('name_stems',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('stem', sa.String(length=500), nullable=False),
+    sa.Column('cluster_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_name_stems_id'), 'name_stems', ['id'], unique=False)
+    op.create_index('uq_name_stem_user_stem', 'name_stems', ['user_id', 'stem'], unique=True)
+    op.create_index('idx_name_stem_user_cluster', 'name_stems', ['user_id', 'cluster_id'], unique=False)
+    op.create_table('name_stem_buckets',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.String(length=16), nullable=False),
+    sa.Column('stem_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['stem_id'], ['name_stems.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'bucket', 'stem_id')
+    )
+    op.add_column('files', sa.Column('name_stem', sa.String(length=500), nullable=True))
+    op.create_index('idx_file_user_name_stem', 'files', ['user_id', 'name_stem'], unique=False)
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_user_name_stem', table_name='files')
+    op.drop_column('files', 'name_stem')
+    op.drop_table('name_stem_buckets')
+    op.drop_index('idx_name_stem_user_cluster', table_name='name_stems')
+    op.drop_index('uq_name_stem_user_stem', table_name='name_stems')
+    op.drop_index(op.f('ix_name_stems_id'), table_name='name_stems')
+    op.drop_table('name_stems')
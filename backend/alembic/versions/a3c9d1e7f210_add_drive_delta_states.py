@@ -0,0 +1,40 @@
+"""add drive_delta_states
+
+Revision ID: a3c9d1e7f210
+Revises: 69de700e1b38
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c9d1e7f210'
+down_revision: Union[str, None] = '69de700e1b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('drive_delta_states',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('connection_id', sa.Integer(), nullable=False),
+    sa.Column('root_folder_id', sa.String(length=255), nullable=False),
+    sa.Column('delta_link', sa.Text(), nullable=True),
+    sa.Column('last_synced_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['connection_id'], ['cloud_connections.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_drive_delta_states_id'), 'drive_delta_states', ['id'], unique=False)
+    op.create_index('idx_delta_state_connection_root', 'drive_delta_states', ['connection_id', 'root_folder_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_delta_state_connection_root', table_name='drive_delta_states')
+    op.drop_index(op.f('ix_drive_delta_states_id'), table_name='drive_delta_states')
+    op.drop_table('drive_delta_states')
@@ -0,0 +1,27 @@
+"""add file url expiry
+
+Revision ID: a6d3f9c1e852
+Revises: f2c6b9d4e715
+Create Date: 2026-10-17 19:12:08.401736
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d3f9c1e852'
+down_revision: Union[str, None] = 'f2c6b9d4e715'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing cached URLs get no expiry and are refreshed on first use
+    op.add_column('files', sa.Column('url_expires_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('files', 'url_expires_at')
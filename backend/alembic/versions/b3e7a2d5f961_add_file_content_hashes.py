@@ -0,0 +1,72 @@
+"""add file content hashes
+
+Revision ID: b3e7a2d5f961
+Revises: a6d3f9c1e852
+Create Date: 2026-10-17 19:48:31.662094
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e7a2d5f961'
+down_revision: Union[str, None] = 'a6d3f9c1e852'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HASH_COLUMNS = ('hash', 'quick_xor_hash', 'sha1_hash', 'sha256_hash', 'md5_hash')
+BATCH_SIZE = 5000
+
+
+def _hash_values(file_id, extra):
+    try:
+        hashes = json.loads(extra).get('hashes') or {}
+    except (ValueError, AttributeError):
+        return None
+    quick_xor, sha256, sha1 = hashes.get('quickXorHash'), hashes.get('sha256Hash'), hashes.get('sha1Hash')
+    values = {
+        'id': file_id,
+        'quick_xor_hash': quick_xor,
+        'sha256_hash': sha256.lower() if sha256 else None,
+        'sha1_hash': sha1.lower() if sha1 else None,
+    }
+    values['hash'] = values['quick_xor_hash'] or values['sha256_hash'] or values['sha1_hash']
+    return values if values['hash'] else None
+
+
+def upgrade() -> None:
+    op.add_column('files', sa.Column('hash', sa.String(length=128), nullable=True))
+    op.add_column('files', sa.Column('quick_xor_hash', sa.String(length=64), nullable=True))
+    op.add_column('files', sa.Column('sha1_hash', sa.String(length=64), nullable=True))
+    op.add_column('files', sa.Column('sha256_hash', sa.String(length=64), nullable=True))
+    op.add_column('files', sa.Column('md5_hash', sa.String(length=64), nullable=True))
+
+    # The OneDrive delta sync kept Graph hashes in extra["hashes"]; move them into the columns
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, extra FROM files WHERE id > :last_id AND extra LIKE '%\"hashes\"%' ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = [values for values in (_hash_values(file_id, extra) for file_id, extra in rows) if values]
+        if updates:
+            bind.execute(
+                sa.text("UPDATE files SET hash = :hash, quick_xor_hash = :quick_xor_hash, sha256_hash = :sha256_hash, sha1_hash = :sha1_hash WHERE id = :id"),
+                updates,
+            )
+
+    op.create_index('idx_file_user_size_hash', 'files', ['user_id', 'size', 'hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_user_size_hash', table_name='files')
+    for column in reversed(HASH_COLUMNS):
+        op.drop_column('files', column)
@@ -0,0 +1,69 @@
+"""add file sync roots
+
+Revision ID: b6e2f9a4c173
+Revises: a1d5c8e3f427
+Create Date: 2026-10-18 12:27:09.481552
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2f9a4c173'
+down_revision: Union[str, None] = 'a1d5c8e3f427'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def _load_extra(extra):
+    try:
+        data = json.loads(extra) if extra else {}
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _backfill(bind) -> None:
+    # Roots used to be kept in files.extra["sync_roots"]; move them into the table
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, user_id, extra FROM files WHERE id > :last_id AND extra LIKE '%sync_roots%' ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        memberships, extras = [], []
+        for file_id, user_id, extra in rows:
+            data = _load_extra(extra)
+            roots = data.pop('sync_roots', None) or []
+            memberships += [{'user_id': user_id, 'root_folder_id': root, 'file_id': file_id} for root in sorted(set(roots))]
+            extras.append({'id': file_id, 'extra': json.dumps(data)})
+        if memberships:
+            bind.execute(sa.text("INSERT INTO file_sync_roots (user_id, root_folder_id, file_id) VALUES (:user_id, :root_folder_id, :file_id)"), memberships)
+        bind.execute(sa.text("UPDATE files SET extra = :extra WHERE id = :id"), extras)
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    op.create_table('file_sync_roots',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('root_folder_id', sa.String(length=255), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['file_id'], ['files.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'root_folder_id', 'file_id')
+    )
+    op.create_index('idx_file_sync_root_file', 'file_sync_roots', ['file_id'], unique=False)
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_sync_root_file', table_name='file_sync_roots')
+    op.drop_table('file_sync_roots')
@@ -0,0 +1,53 @@
+"""add background_jobs
+
+Revision ID: b7e4f2a9c310
+Revises: a3c9d1e7f210
+Create Date: 2026-10-17 11:04:27.552930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4f2a9c310'
+down_revision: Union[str, None] = 'a3c9d1e7f210'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('background_jobs',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('connection_id', sa.Integer(), nullable=True),
+    sa.Column('job_type', sa.String(length=50), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('progress', sa.Integer(), nullable=True),
+    sa.Column('folders_visited', sa.Integer(), nullable=True),
+    sa.Column('files_found', sa.Integer(), nullable=True),
+    sa.Column('cancelled', sa.Boolean(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('params', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+    sa.Column('checkpoint', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+    sa.Column('result', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+    sa.Column('worker_id', sa.String(length=255), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['connection_id'], ['cloud_connections.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_background_job_user_status', 'background_jobs', ['user_id', 'status'], unique=False)
+    op.create_index('idx_background_job_status_heartbeat', 'background_jobs', ['status', 'heartbeat_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_background_job_status_heartbeat', table_name='background_jobs')
+    op.drop_index('idx_background_job_user_status', table_name='background_jobs')
+    op.drop_table('background_jobs')
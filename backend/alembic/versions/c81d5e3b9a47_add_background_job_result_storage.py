@@ -0,0 +1,30 @@
+"""add background job result storage
+
+Revision ID: c81d5e3b9a47
+Revises: b7e4f2a9c310
+Create Date: 2026-10-17 13:26:50.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d5e3b9a47'
+down_revision: Union[str, None] = 'b7e4f2a9c310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('background_jobs', sa.Column('result_path', sa.String(length=500), nullable=True))
+    op.add_column('background_jobs', sa.Column('result_count', sa.Integer(), nullable=True))
+    op.add_column('background_jobs', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('background_jobs', 'expires_at')
+    op.drop_column('background_jobs', 'result_count')
+    op.drop_column('background_jobs', 'result_path')
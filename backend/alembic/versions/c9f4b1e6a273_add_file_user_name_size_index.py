@@ -0,0 +1,26 @@
+"""add file user name size index
+
+Revision ID: c9f4b1e6a273
+Revises: b3e7a2d5f961
+Create Date: 2026-10-17 20:31:54.207318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9f4b1e6a273'
+down_revision: Union[str, None] = 'b3e7a2d5f961'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_file_user_name_size', 'files', ['user_id', 'name', 'size'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_user_name_size', table_name='files')
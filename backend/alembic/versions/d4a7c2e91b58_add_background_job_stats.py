@@ -0,0 +1,27 @@
+"""add background job stats
+
+Revision ID: d4a7c2e91b58
+Revises: c81d5e3b9a47
+Create Date: 2026-10-17 15:02:11.604218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7c2e91b58'
+down_revision: Union[str, None] = 'c81d5e3b9a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('background_jobs', sa.Column('stats', postgresql.JSON(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('background_jobs', 'stats')
@@ -0,0 +1,108 @@
+"""add duplicate groups
+
+Revision ID: d8e2a5c7f314
+Revises: c9f4b1e6a273
+Create Date: 2026-10-17 22:12:40.518233
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e2a5c7f314'
+down_revision: Union[str, None] = 'c9f4b1e6a273'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.heic')
+
+
+def _dup_key(name, size, content_hash):
+    # Same digest as duplicate_index_service.duplicate_key at the time of this revision
+    if not size or size <= 0:
+        return ''
+    if content_hash:
+        raw = f"hash\0{size}\0{content_hash}"
+    elif name:
+        raw = f"name_size\0{size}\0{name}"
+    else:
+        return ''
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _backfill(bind) -> None:
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, name, size, hash FROM files WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(
+            sa.text("UPDATE files SET dup_key = :dup_key WHERE id = :id"),
+            [{'id': file_id, 'dup_key': _dup_key(name, size, content_hash)} for file_id, name, size, content_hash in rows],
+        )
+        last_id = rows[-1][0]
+
+    json_object_agg = 'json_object_agg' if bind.dialect.name == 'postgresql' else 'json_group_object'
+    # files.is_deleted comes from the models (create_all) rather than from a revision
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('files')}
+    live = "AND (is_deleted IS NULL OR is_deleted = :false)" if 'is_deleted' in columns else ""
+    is_image = ' OR '.join(f"lower(name) LIKE '%{ext}'" for ext in IMAGE_EXTENSIONS)
+    bind.execute(sa.text(f"""
+        INSERT INTO duplicate_groups (user_id, dup_key, key_type, name, size, hash, member_count, image_count, provider_count, providers, wasted_bytes)
+        SELECT user_id, dup_key, CASE WHEN max(hash) IS NULL THEN 'name_size' ELSE 'hash' END, min(name), max(size), max(hash),
+               sum(members), sum(images), count(provider), {json_object_agg}(provider, members), max(size) * (sum(members) - 1)
+        FROM (
+            SELECT user_id, dup_key, provider, count(id) AS members, sum(CASE WHEN {is_image} THEN 1 ELSE 0 END) AS images,
+                   min(name) AS name, max(size) AS size, max(hash) AS hash
+            FROM files
+            WHERE dup_key != '' {live}
+            GROUP BY user_id, dup_key, provider
+        ) AS per_provider
+        GROUP BY user_id, dup_key
+        HAVING sum(members) > 1
+    """), {'false': False})
+
+
+def upgrade() -> None:
+    op.create_table('duplicate_groups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('dup_key', sa.String(length=40), nullable=False),
+    sa.Column('key_type', sa.String(length=20), nullable=False),
+    sa.Column('name', sa.String(length=500), nullable=True),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('hash', sa.String(length=128), nullable=True),
+    sa.Column('member_count', sa.Integer(), nullable=False),
+    sa.Column('image_count', sa.Integer(), nullable=False),
+    sa.Column('provider_count', sa.Integer(), nullable=False),
+    sa.Column('providers', sa.JSON(), nullable=True),
+    sa.Column('wasted_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_duplicate_groups_id'), 'duplicate_groups', ['id'], unique=False)
+    op.create_index('uq_duplicate_group_user_key', 'duplicate_groups', ['user_id', 'dup_key'], unique=True)
+    op.create_index('idx_duplicate_group_user_wasted', 'duplicate_groups', ['user_id', 'wasted_bytes', 'id'], unique=False)
+    op.add_column('files', sa.Column('dup_key', sa.String(length=40), nullable=True))
+    op.create_index('idx_file_user_dup_key', 'files', ['user_id', 'dup_key'], unique=False)
+    # Existing files are keyed in batches and their groups counted in one pass
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_user_dup_key', table_name='files')
+    op.drop_column('files', 'dup_key')
+    op.drop_index('idx_duplicate_group_user_wasted', table_name='duplicate_groups')
+    op.drop_index('uq_duplicate_group_user_key', table_name='duplicate_groups')
+    op.drop_index(op.f('ix_duplicate_groups_id'), table_name='duplicate_groups')
+    op.drop_table('duplicate_groups')
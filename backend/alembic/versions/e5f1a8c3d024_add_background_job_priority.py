@@ -0,0 +1,28 @@
+"""add background job priority
+
+Revision ID: e5f1a8c3d024
+Revises: d4a7c2e91b58
+Create Date: 2026-10-17 16:41:37.285519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f1a8c3d024'
+down_revision: Union[str, None] = 'd4a7c2e91b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('background_jobs', sa.Column('priority', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('idx_background_job_queue', 'background_jobs', ['status', 'priority', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_background_job_queue', table_name='background_jobs')
+    op.drop_column('background_jobs', 'priority')
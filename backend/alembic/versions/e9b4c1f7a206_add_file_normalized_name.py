@@ -0,0 +1,50 @@
+"""add file normalized name
+
+Revision ID: e9b4c1f7a206
+Revises: d8e2a5c7f314
+Create Date: 2026-10-17 23:40:12.730915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.filename_normalization import normalize_filename
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9b4c1f7a206'
+down_revision: Union[str, None] = 'd8e2a5c7f314'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def _backfill(bind) -> None:
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, name FROM files WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(
+            sa.text("UPDATE files SET normalized_name = :normalized_name WHERE id = :id"),
+            [{'id': file_id, 'normalized_name': normalize_filename(name)} for file_id, name in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    op.add_column('files', sa.Column('normalized_name', sa.String(length=500), nullable=True))
+    op.create_index('idx_file_user_normalized_name_size', 'files', ['user_id', 'normalized_name', 'size'], unique=False)
+    # Existing rows are normalized with the rules active when the migration runs
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_user_normalized_name_size', table_name='files')
+    op.drop_column('files', 'normalized_name')
@@ -0,0 +1,40 @@
+"""unique file cloud_id per user and provider
+
+Revision ID: f2c6b9d4e715
+Revises: e5f1a8c3d024
+Create Date: 2026-10-17 18:12:05.913447
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6b9d4e715'
+down_revision: Union[str, None] = 'e5f1a8c3d024'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The per-file upsert allowed duplicate rows; keep the newest row of each (user, provider, cloud_id)
+    if sa.inspect(op.get_bind()).has_table('file_usage_patterns'):
+        op.execute("""
+            UPDATE file_usage_patterns SET file_id = (
+                SELECT MAX(f2.id) FROM files f1
+                JOIN files f2 ON f2.user_id = f1.user_id AND f2.provider = f1.provider AND f2.cloud_id = f1.cloud_id
+                WHERE f1.id = file_usage_patterns.file_id
+            )
+        """)
+    op.execute("""
+        DELETE FROM files WHERE id NOT IN (
+            SELECT keep_id FROM (SELECT MAX(id) AS keep_id FROM files GROUP BY user_id, provider, cloud_id) AS keep
+        )
+    """)
+    op.create_index('uq_file_user_provider_cloud_id', 'files', ['user_id', 'provider', 'cloud_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_file_user_provider_cloud_id', table_name='files')
@@ -0,0 +1,30 @@
+"""add shared hash indexes
+
+Revision ID: f3a8d6b2c915
+Revises: e9b4c1f7a206
+Create Date: 2026-10-18 09:14:27.305816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8d6b2c915'
+down_revision: Union[str, None] = 'e9b4c1f7a206'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_file_user_size_sha256', 'files', ['user_id', 'size', 'sha256_hash'], unique=False)
+    op.create_index('idx_file_user_size_sha1', 'files', ['user_id', 'size', 'sha1_hash'], unique=False)
+    op.create_index('idx_file_user_size_md5', 'files', ['user_id', 'size', 'md5_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_user_size_md5', table_name='files')
+    op.drop_index('idx_file_user_size_sha1', table_name='files')
+    op.drop_index('idx_file_user_size_sha256', table_name='files')
@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 from enum import Enum
 from backend.helpers import debug_log
 from datetime import datetime, timezone
@@ -77,6 +78,104 @@ else:  # DEVELOPMENT
     DB_MAX_OVERFLOW = 10
     DB_POOL_TIMEOUT = 30
 
+# Outbound HTTP client settings (Microsoft Graph, OAuth token endpoints, download proxy)
+# Each worker process keeps one pooled keep-alive session; these control its size.
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # number of distinct hosts kept pooled
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))  # keep-alive connections per host
+HTTP_POOL_BLOCK = os.getenv("HTTP_POOL_BLOCK", "false").lower() == "true"  # wait for a free connection instead of opening extras
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))  # seconds, applied when the caller passes no timeout
+
+# Async (httpx) Graph client settings, used by the /api/onedrive/async/* routes
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "200"))
+ASYNC_HTTP_MAX_KEEPALIVE = int(os.getenv("ASYNC_HTTP_MAX_KEEPALIVE", "50"))
+ASYNC_GRAPH_CONCURRENCY = int(os.getenv("ASYNC_GRAPH_CONCURRENCY", "64"))  # concurrent folder listings per traversal
+
+# Folder listing pagination: $top per /children page (Graph allows up to 999) and
+# threads used to fetch the next page while the current one is being processed
+GRAPH_PAGE_SIZE = int(os.getenv("GRAPH_PAGE_SIZE", "200"))
+GRAPH_PREFETCH_WORKERS = int(os.getenv("GRAPH_PREFETCH_WORKERS", "8"))
+
+# Number of $batch requests (of up to 20 sub-requests each) sent concurrently by backend.graph_batch
+GRAPH_BATCH_CONCURRENCY = int(os.getenv("GRAPH_BATCH_CONCURRENCY", "4"))
+
+# Folder traversal settings (backend.folder_walker)
+TRAVERSAL_MAX_WORKERS = int(os.getenv("TRAVERSAL_MAX_WORKERS", "32"))  # global cap on concurrent folder listings per process
+TRAVERSAL_PER_USER_LIMIT = int(os.getenv("TRAVERSAL_PER_USER_LIMIT", "8"))  # concurrent listings any one user may hold
+
+# Background scan jobs (backend.services.scan_job_service)
+SCAN_JOB_CONCURRENCY = int(os.getenv("SCAN_JOB_CONCURRENCY", "8"))  # default concurrent folder listings per scan job
+SCAN_SCHEDULER_WORKERS = int(os.getenv("SCAN_SCHEDULER_WORKERS", "4"))  # scan jobs run at once per process; the rest queue by plan priority
+SCAN_INTERACTIVE_PRIORITY_BOOST = int(os.getenv("SCAN_INTERACTIVE_PRIORITY_BOOST", "5"))  # added to the plan priority of scans a user just started
+SCAN_STALL_SECONDS = int(os.getenv("SCAN_STALL_SECONDS", "60"))  # no folder listed for this long marks a scan as stalled
+SCAN_CHECKPOINT_INTERVAL = float(os.getenv("SCAN_CHECKPOINT_INTERVAL", "10"))  # seconds between checkpoints of a running scan
+SCAN_JOB_STALE_SECONDS = int(os.getenv("SCAN_JOB_STALE_SECONDS", "300"))  # a running job with no heartbeat for this long is resumed elsewhere
+# Where background jobs run: "inline" runs them on the API process's scheduler; "queue" makes
+# the API only enqueue them for `python -m backend.worker` processes to claim and run
+JOB_EXECUTION_MODE = os.getenv("JOB_EXECUTION_MODE", "inline")
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))  # job processes started by one `python -m backend.worker`
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "2"))  # how often an idle worker process looks for queued jobs
+# Scan results are spooled to msgpack files here (use a shared volume when workers run on several hosts)
+SCAN_RESULT_DIR = os.getenv("SCAN_RESULT_DIR", os.path.join(tempfile.gettempdir(), "declutter-scan-results"))
+SCAN_RESULT_INLINE_LIMIT = int(os.getenv("SCAN_RESULT_INLINE_LIMIT", "1000"))  # results up to this many files are kept in the job row
+SCAN_RESULT_TTL_SECONDS = int(os.getenv("SCAN_RESULT_TTL_SECONDS", "86400"))  # finished results are dropped after this long
+SCAN_RESULT_MAX_BYTES = int(os.getenv("SCAN_RESULT_MAX_BYTES", str(1024 * 1024 * 1024)))  # LRU cap for SCAN_RESULT_DIR
+SCAN_RESULT_PAGE_SIZE = int(os.getenv("SCAN_RESULT_PAGE_SIZE", "1000"))
+SCAN_RESULT_PURGE_SECONDS = float(os.getenv("SCAN_RESULT_PURGE_SECONDS", "3600"))  # how often expired results are purged
+# Scan progress stream (GET /api/onedrive/scan_job/{job_id}/events)
+SCAN_EVENT_INTERVAL = float(os.getenv("SCAN_EVENT_INTERVAL", "0.5"))  # seconds between pushed progress/file batches
+SCAN_EVENT_BUFFER = int(os.getenv("SCAN_EVENT_BUFFER", "64"))  # recent events kept per job for reconnecting clients
+SCAN_EVENT_KEEPALIVE = float(os.getenv("SCAN_EVENT_KEEPALIVE", "15"))
+SCAN_EVENT_DB_POLL_SECONDS = float(os.getenv("SCAN_EVENT_DB_POLL_SECONDS", "2"))  # when the job runs on another worker
+
+# Provider rate limiting (backend.rate_limiter)
+# Token buckets are shared per tenant (all users of one Microsoft 365 tenant / Google project) and per connection.
+GRAPH_TENANT_RATE = float(os.getenv("GRAPH_TENANT_RATE", "50"))  # requests/second per tenant
+GRAPH_TENANT_BURST = int(os.getenv("GRAPH_TENANT_BURST", "100"))
+GRAPH_CONNECTION_RATE = float(os.getenv("GRAPH_CONNECTION_RATE", "10"))  # requests/second per connection
+GRAPH_CONNECTION_BURST = int(os.getenv("GRAPH_CONNECTION_BURST", "20"))
+GOOGLE_PROJECT_RATE = float(os.getenv("GOOGLE_PROJECT_RATE", "150"))
+GOOGLE_PROJECT_BURST = int(os.getenv("GOOGLE_PROJECT_BURST", "300"))
+GOOGLE_CONNECTION_RATE = float(os.getenv("GOOGLE_CONNECTION_RATE", "10"))
+GOOGLE_CONNECTION_BURST = int(os.getenv("GOOGLE_CONNECTION_BURST", "20"))
+# AIMD concurrency per connection: +1 slot per window of successes, halved on every 429/503.
+ADAPTIVE_CONCURRENCY_INITIAL = int(os.getenv("ADAPTIVE_CONCURRENCY_INITIAL", "8"))
+ADAPTIVE_CONCURRENCY_MIN = int(os.getenv("ADAPTIVE_CONCURRENCY_MIN", "1"))
+ADAPTIVE_CONCURRENCY_MAX = int(os.getenv("ADAPTIVE_CONCURRENCY_MAX", "32"))
+THROTTLE_MAX_RETRIES = int(os.getenv("THROTTLE_MAX_RETRIES", "5"))
+THROTTLE_MAX_BACKOFF = float(os.getenv("THROTTLE_MAX_BACKOFF", "120"))  # seconds
+
+# OAuth access tokens are refreshed this many seconds before token_expires_at
+TOKEN_REFRESH_SKEW_SECONDS = int(os.getenv("TOKEN_REFRESH_SKEW_SECONDS", "300"))
+
+# Bulk file upserts (/api/files/upsert): rows per INSERT ... ON CONFLICT batch and transaction
+FILE_UPSERT_CHUNK_SIZE = int(os.getenv("FILE_UPSERT_CHUNK_SIZE", "1000"))
+# Streaming ingestion (/api/files/ingest): largest single NDJSON line or msgpack record buffered
+INGEST_MAX_RECORD_BYTES = int(os.getenv("INGEST_MAX_RECORD_BYTES", str(1024 * 1024)))
+# Graph @microsoft.graph.downloadUrl links are pre-authenticated for about an hour; cached ones
+# (File.url) are treated as expired this many seconds early and refreshed through $batch
+DOWNLOAD_URL_TTL_SECONDS = int(os.getenv("DOWNLOAD_URL_TTL_SECONDS", "3600"))
+DOWNLOAD_URL_REFRESH_SKEW_SECONDS = int(os.getenv("DOWNLOAD_URL_REFRESH_SKEW_SECONDS", "300"))
+# Duplicate listings (/api/files/duplicates, /api/images/duplicates): groups per keyset page
+DUPLICATE_PAGE_SIZE = int(os.getenv("DUPLICATE_PAGE_SIZE", "100"))
+DUPLICATE_MAX_PAGE_SIZE = int(os.getenv("DUPLICATE_MAX_PAGE_SIZE", "1000"))
+# Similar names (/api/files/similar): trigram Jaccard similarity for two stems to match, used to
+# build the stored clusters (a request may only ask for a stricter one), and the MinHash LSH
+# layout that picks candidates (more rows per band = fewer, closer candidates). Changing any of
+# them takes effect for stems indexed afterwards.
+SIMILAR_NAME_THRESHOLD = float(os.getenv("SIMILAR_NAME_THRESHOLD", "0.7"))
+SIMILAR_MINHASH_BANDS = int(os.getenv("SIMILAR_MINHASH_BANDS", "8"))
+SIMILAR_MINHASH_ROWS = int(os.getenv("SIMILAR_MINHASH_ROWS", "2"))
+SIMILAR_MAX_BUCKET_SIZE = int(os.getenv("SIMILAR_MAX_BUCKET_SIZE", "500"))
+# Rules that build File.normalized_name for copy-variant grouping, applied in order
+# (see backend/filename_normalization.py)
+NAME_NORMALIZATION_RULES = [rule.strip() for rule in os.getenv("NAME_NORMALIZATION_RULES", "unicode_nfc,case,copy_suffix,extension_alias").split(",") if rule.strip()]
+# Download proxy (/api/files/{file_id}/download): bytes read from upstream per streamed chunk
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+# Proxied downloads are cached on disk by content hash and served locally on repeat views
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", os.path.join(tempfile.gettempdir(), "declutter-download-cache"))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # LRU cap, 0 disables the cache
+DOWNLOAD_CACHE_MAX_FILE_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_FILE_BYTES", str(50 * 1024 * 1024)))  # larger files are only streamed
+
 # Security settings
 JWT_ALGORITHM = "HS256"
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))  # 1 week
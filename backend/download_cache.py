@@ -0,0 +1,235 @@
+"""
+Content-addressed disk cache for proxied file downloads.
+
+Bodies are stored once per SHA-256 under ``blobs/``, so identical copies of a file (the
+members of a duplicate group) share one entry. ``keys/`` maps a file version (owner,
+provider, cloud id, size, last modified) to the blob it downloaded as, together with its
+content type. Hits refresh the blob's mtime and blobs are evicted least recently used
+first once the directory grows past DOWNLOAD_CACHE_MAX_BYTES. Hit/miss counters are per
+process.
+
+Every method does blocking disk I/O; async callers run them in the threadpool. A disk
+error (a full disk, a removed directory) only ever costs the cache entry: writers drop what
+they had and lookups count a miss.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from backend.config import DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MAX_BYTES, DOWNLOAD_CACHE_MAX_FILE_BYTES
+from backend.helpers import debug_log
+from backend.models import File
+
+class CachedDownload:
+    def __init__(self, path: str, digest: str, content_type: str, stat_result: os.stat_result):
+        self.path = path
+        self.digest = digest
+        self.content_type = content_type
+        self.stat_result = stat_result
+
+class CacheWriter:
+    """
+    Tees a streamed body into a temporary file. ``commit()`` moves it into the cache once
+    the whole body has been seen; anything else (a disconnect, an oversized body, a disk
+    error) discards it.
+    """
+
+    def __init__(self, cache: "DownloadCache", key: str, content_type: str):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.tmp_dir)
+        self._file = os.fdopen(fd, "wb")
+        self.active = True
+
+    def write(self, chunk: bytes) -> None:
+        if not self.active:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_file_bytes:
+            self.abort()
+            return
+        self._hash.update(chunk)
+        try:
+            self._file.write(chunk)
+        except OSError as e:
+            debug_log(f"Dropping download cache entry {self.key}: {e}")
+            self.abort()
+
+    def commit(self) -> None:
+        if not self.active:
+            return
+        self.active = False
+        try:
+            self._file.close()
+            self.cache._add(self.key, self._hash.hexdigest(), self.content_type, self.tmp_path, self.size)
+        except OSError as e:
+            debug_log(f"Dropping download cache entry {self.key}: {e}")
+            _remove(self.tmp_path)
+
+    def abort(self) -> None:
+        if not self.active:
+            return
+        self.active = False
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        _remove(self.tmp_path)
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class DownloadCache:
+    def __init__(self, root: str = DOWNLOAD_CACHE_DIR, max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES, max_file_bytes: int = DOWNLOAD_CACHE_MAX_FILE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_file_bytes = min(max_file_bytes, max_bytes)
+        self.tmp_dir = os.path.join(root, "tmp")
+        self._lock = threading.Lock()
+        # digest -> size, least recently used first
+        self._blobs: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def _key_path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.root, "keys", name[:2], name)
+
+    def _load(self) -> None:
+        """Indexes blobs left by earlier runs (or other workers), oldest mtime first."""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        entries = []
+        blob_root = os.path.join(self.root, "blobs")
+        for dirpath, _, names in os.walk(blob_root):
+            for name in names:
+                try:
+                    stat_result = os.stat(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    continue  # evicted by another worker meanwhile
+                entries.append((stat_result.st_mtime, name, stat_result.st_size))
+        for _, digest, size in sorted(entries):
+            self._blobs[digest] = size
+            self._bytes += size
+
+    def lookup(self, key: str) -> Optional[CachedDownload]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            try:
+                self._load()
+                with open(self._key_path(key)) as f:
+                    entry = json.load(f)
+                path = self._blob_path(entry["digest"])
+                os.utime(path)
+                stat_result = os.stat(path)
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            # The blob may have been stored by another worker process
+            self._bytes += stat_result.st_size - self._blobs.get(entry["digest"], 0)
+            self._blobs[entry["digest"]] = stat_result.st_size
+            self._blobs.move_to_end(entry["digest"])
+            return CachedDownload(path, entry["digest"], entry.get("content_type") or "application/octet-stream", stat_result)
+
+    def writer(self, key: str, content_type: str, expected_size: Optional[int] = None) -> Optional[CacheWriter]:
+        """Returns a writer for a body worth caching, or None if the cache is off or it is too big."""
+        if not self.enabled or (expected_size is not None and expected_size > self.max_file_bytes):
+            return None
+        try:
+            with self._lock:
+                self._load()
+            return CacheWriter(self, key, content_type)
+        except OSError as e:
+            debug_log(f"Download cache unavailable: {e}")
+            return None
+
+    def _add(self, key: str, digest: str, content_type: str, tmp_path: str, size: int) -> None:
+        blob_path = self._blob_path(digest)
+        key_path = self._key_path(key)
+        with self._lock:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.makedirs(os.path.dirname(key_path), exist_ok=True)
+            if digest in self._blobs and os.path.exists(blob_path):
+                # Same content already cached under another key
+                os.remove(tmp_path)
+                os.utime(blob_path)
+            else:
+                os.replace(tmp_path, blob_path)
+                self._bytes += size - self._blobs.get(digest, 0)
+                self.stores += 1
+            self._blobs[digest] = size
+            self._blobs.move_to_end(digest)
+            fd, tmp_key = tempfile.mkstemp(dir=self.tmp_dir)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"digest": digest, "content_type": content_type}, f)
+            os.replace(tmp_key, key_path)
+            self._evict()
+
+    def _evict(self) -> None:
+        # Key files of evicted blobs are left behind; lookups treat them as misses
+        removed = 0
+        while self._bytes > self.max_bytes and len(self._blobs) > 1:
+            digest, size = self._blobs.popitem(last=False)
+            try:
+                os.remove(self._blob_path(digest))
+            except FileNotFoundError:
+                pass
+            self._bytes -= size
+            removed += 1
+        if removed:
+            self.evictions += removed
+            debug_log(f"Evicted {removed} cached downloads to stay under {self.max_bytes} bytes")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": len(self._blobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+_cache: Optional[DownloadCache] = None
+_cache_lock = threading.Lock()
+
+def get_download_cache() -> DownloadCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DownloadCache()
+    return _cache
+
+def cache_key(file: File) -> str:
+    """Identifies one version of a file; a new size or modification time is a new entry."""
+    return f"{file.user_id}:{file.provider}:{file.cloud_id}:{file.size}:{file.last_modified}"
@@ -0,0 +1,84 @@
+"""
+Canonical file names for copy-variant detection (File.normalized_name).
+
+A name is split into stem and extension and passed through the rules listed in
+NAME_NORMALIZATION_RULES, in that order. Each rule maps (stem, ext) to (stem, ext); new
+ones are added with the @name_rule decorator and switched on through the setting. With the
+default rules "IMG_001 (1).JPEG", "Copy of img_001.jpg" and "img_001 - Copy (2).jpg" all
+become "img_001.jpg".
+
+The setting is checked once, at import, so an unknown rule fails at startup. The result is
+stored when files are written, so changing the active rules only affects rows written
+afterwards; rows stored before the column existed were filled in by the e9b4c1f7a206
+migration.
+"""
+import os
+import re
+import unicodedata
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from backend.config import NAME_NORMALIZATION_RULES
+
+NameRule = Callable[[str, str], Tuple[str, str]]
+NAME_RULES: Dict[str, NameRule] = {}
+
+def name_rule(key: str):
+    def register(rule: NameRule) -> NameRule:
+        NAME_RULES[key] = rule
+        return rule
+    return register
+
+@name_rule("unicode_nfc")
+def _unicode_nfc(stem: str, ext: str) -> Tuple[str, str]:
+    # macOS uploads decomposed names (e + combining accent); compare them composed
+    return unicodedata.normalize("NFC", stem), unicodedata.normalize("NFC", ext)
+
+@name_rule("case")
+def _case(stem: str, ext: str) -> Tuple[str, str]:
+    return stem.casefold(), ext.casefold()
+
+# Only markers copy tools add: "Budget (2024)" keeps its year and "Hard copy" its last word
+COPY_SUFFIXES = (
+    re.compile(r"^copy of\s+", re.IGNORECASE),  # Copy of report
+    re.compile(r"\s*[-_]\s*copy(\s*\(\d{1,3}\)|\s*\d{1,3})?$", re.IGNORECASE),  # report - Copy, report - Copy (2), report_copy 2
+    re.compile(r"\s*\((\d{1,3})\)$"),  # report (1)
+)
+
+@name_rule("copy_suffix")
+def _copy_suffix(stem: str, ext: str) -> Tuple[str, str]:
+    # Repeated until nothing changes: "Copy of report (1) - Copy" -> "report"
+    original, previous = stem, None
+    while stem != previous:
+        previous = stem
+        for pattern in COPY_SUFFIXES:
+            stem = pattern.sub("", stem).strip()
+    # A name that is nothing but a marker ("(1).txt") is kept as is
+    return stem or original, ext
+
+EXTENSION_ALIASES = {
+    ".jpeg": ".jpg",
+    ".jpe": ".jpg",
+    ".tif": ".tiff",
+    ".htm": ".html",
+    ".yml": ".yaml",
+    ".mpeg": ".mpg",
+    ".markdown": ".md",
+}
+
+@name_rule("extension_alias")
+def _extension_alias(stem: str, ext: str) -> Tuple[str, str]:
+    return stem, EXTENSION_ALIASES.get(ext.lower(), ext)
+
+def active_rules(keys: Optional[Sequence[str]] = None) -> List[NameRule]:
+    keys = NAME_NORMALIZATION_RULES if keys is None else keys
+    unknown = [key for key in keys if key not in NAME_RULES]
+    if unknown:
+        raise ValueError(f"Unknown NAME_NORMALIZATION_RULES: {', '.join(unknown)}")
+    return [NAME_RULES[key] for key in keys]
+
+DEFAULT_RULES = active_rules()
+
+def normalize_filename(name: Optional[str], rules: Optional[Sequence[NameRule]] = None) -> str:
+    stem, ext = os.path.splitext(name or "")
+    for rule in DEFAULT_RULES if rules is None else rules:
+        stem, ext = rule(stem, ext)
+    return (stem + ext)[:500]
@@ -0,0 +1,131 @@
+"""
+Bounded breadth-first folder traversal shared by every recursive OneDrive walk.
+
+All walks in a process submit folder listings to one shared thread pool
+(TRAVERSAL_MAX_WORKERS threads), and each user may only hold
+TRAVERSAL_PER_USER_LIMIT listings in flight at once, so a deep tree can no longer
+fan out into thousands of threads.
+"""
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from backend.config import TRAVERSAL_MAX_WORKERS, TRAVERSAL_PER_USER_LIMIT
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_user_slots: Dict[Any, threading.BoundedSemaphore] = {}
+_user_slots_lock = threading.Lock()
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=TRAVERSAL_MAX_WORKERS,
+                    thread_name_prefix="folder-walker",
+                )
+    return _executor
+
+def _get_user_slots(user_key: Any) -> threading.BoundedSemaphore:
+    with _user_slots_lock:
+        slots = _user_slots.get(user_key)
+        if slots is None:
+            slots = threading.BoundedSemaphore(TRAVERSAL_PER_USER_LIMIT)
+            _user_slots[user_key] = slots
+        return slots
+
+class FolderWalker:
+    """
+    Walks folder trees breadth-first up to max_depth (root folders are depth 1).
+
+    ``list_folder(folder_id)`` must return items shaped like get_onedrive_folder_contents,
+    i.e. dicts with at least ``id`` and ``type`` ("file" or "folder").
+    ``walk()`` yields ``(folder_id, depth, items)`` as listings complete; the caller's
+    thread owns the frontier and visited set, so neither needs locking, and it is the only
+    thread that sees results, so counters kept by the caller stay exact under concurrency.
+    When should_stop() turns true no new listings are started and walk() returns once the
+    ones already running have finished.
+    """
+
+    def __init__(
+        self,
+        list_folder: Callable[[str], List[Dict[str, Any]]],
+        folder_ids: List[str],
+        max_depth: int = 5,
+        user_key: Any = None,
+        max_concurrency: Optional[int] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        frontier: Optional[List[Tuple[str, int]]] = None,
+        visited: Optional[List[str]] = None,
+    ):
+        self.list_folder = list_folder
+        self.max_depth = max_depth
+        self.user_key = user_key
+        self.max_concurrency = max(1, min(max_concurrency or TRAVERSAL_PER_USER_LIMIT, TRAVERSAL_MAX_WORKERS))
+        self.should_stop = should_stop
+        self._frontier = deque()
+        self._visited = set(visited or [])
+        self._in_flight: Dict[concurrent.futures.Future, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+        if frontier is not None:
+            # Resuming from a checkpoint: the frontier entries are already marked visited.
+            self._frontier.extend((folder_id, depth) for folder_id, depth in frontier)
+            self._visited.update(folder_id for folder_id, _ in frontier)
+        else:
+            for folder_id in folder_ids:
+                if folder_id not in self._visited:
+                    self._visited.add(folder_id)
+                    self._frontier.append((folder_id, 1))
+
+    @property
+    def visited_count(self) -> int:
+        return len(self._visited)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns the folders still to be listed (queued and in flight) and the visited set,
+        in a form that can be passed back to the constructor to resume the walk.
+        """
+        with self._lock:
+            pending = list(self._in_flight.values()) + list(self._frontier)
+            return {"frontier": [list(entry) for entry in pending], "visited": list(self._visited)}
+
+    def walk(self) -> Iterator[Tuple[str, int, List[Dict[str, Any]]]]:
+        executor = _get_executor()
+        user_slots = _get_user_slots(self.user_key)
+        try:
+            while self._frontier or self._in_flight:
+                while self._frontier and len(self._in_flight) < self.max_concurrency:
+                    if self.should_stop and self.should_stop():
+                        return
+                    user_slots.acquire()
+                    with self._lock:
+                        folder_id, depth = self._frontier.popleft()
+                        future = executor.submit(self.list_folder, folder_id)
+                        self._in_flight[future] = (folder_id, depth)
+                    future.add_done_callback(lambda _: user_slots.release())
+
+                done, _ = concurrent.futures.wait(list(self._in_flight), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    items = future.result()
+                    with self._lock:
+                        folder_id, depth = self._in_flight.pop(future)
+                        if depth < self.max_depth:
+                            for item in items:
+                                if item["type"] == "folder" and item["id"] not in self._visited:
+                                    self._visited.add(item["id"])
+                                    self._frontier.append((item["id"], depth + 1))
+                    yield folder_id, depth, items
+                    if self.should_stop and self.should_stop():
+                        return
+        finally:
+            with self._lock:
+                for future in self._in_flight:
+                    future.cancel()
+                running = list(self._in_flight)
+            # Listings that had already started still use the caller's session and connection,
+            # so don't hand control back (and let the caller close them) until they finish.
+            concurrent.futures.wait(running)
@@ -0,0 +1,305 @@
+"""
+Generic Microsoft Graph JSON batching ($batch).
+
+Requests are queued on a GraphBatchExecutor and sent 20 per batch (Graph's limit), several
+batches at a time, from threads (execute) or on the event loop (execute_async). Requests
+linked through ``depends_on`` are always packed into the same batch, as Graph requires. Sub-requests that fail with a throttling or transient status are
+retried on their own after the Retry-After the sub-response carried, as far as should_retry
+allows for their method (a POST or PATCH only on 429 with Retry-After); requests that already
+succeeded are never re-sent.
+"""
+import asyncio
+import time
+import concurrent.futures
+import httpx
+import requests
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from backend.config import GRAPH_BATCH_CONCURRENCY, THROTTLE_MAX_RETRIES
+from backend.helpers import debug_log
+from backend.models import CloudConnection
+from backend.onedrive_api import GRAPH_API_BASE_URL, _make_graph_api_request, get_graph_limiter
+from backend.onedrive_async_api import _make_graph_api_request_async
+from backend.rate_limiter import parse_retry_after, backoff_delay, log_throttle, should_retry
+
+MAX_BATCH_SIZE = 20
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+FAILED_DEPENDENCY = 424
+
+def failed_responses(batch: List[Dict[str, Any]], status: int, message: str, retry_after: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Sub-responses for a batch that failed as a whole, shaped like the ones Graph returns."""
+    headers = {"Retry-After": retry_after} if retry_after else {}
+    return [{"id": request["id"], "status": status, "headers": headers, "body": {"error": {"message": message}}} for request in batch]
+
+class GraphBatchExecutor:
+    """
+    Collects Graph requests with ``add()`` and runs them with ``execute()``.
+
+    URLs are relative to the Graph version root (e.g. ``/me/drive/items/{id}``).
+    ``execute()`` returns ``{request_id: {"id", "status", "body", "success"}}`` for every request.
+    """
+
+    def __init__(self, connection: CloudConnection, db: Session, max_concurrency: Optional[int] = None, max_retries: Optional[int] = None):
+        self.connection = connection
+        self.db = db
+        self.max_concurrency = max(1, max_concurrency or GRAPH_BATCH_CONCURRENCY)
+        self.max_retries = THROTTLE_MAX_RETRIES if max_retries is None else max_retries
+        self._requests: Dict[str, Dict[str, Any]] = {}
+
+    def add(
+        self,
+        method: str,
+        url: str,
+        body: Optional[Dict[str, Any]] = None,
+        depends_on: Optional[List[str]] = None,
+        request_id: Optional[str] = None,
+    ) -> str:
+        request_id = request_id or str(len(self._requests) + 1)
+        if request_id in self._requests:
+            raise ValueError(f"Duplicate batch request id {request_id}")
+        for dependency in depends_on or []:
+            if dependency not in self._requests:
+                raise ValueError(f"Batch request {request_id} depends on unknown request {dependency}")
+        request = {"id": request_id, "method": method, "url": url}
+        if body is not None:
+            request["body"] = body
+            request["headers"] = {"Content-Type": "application/json"}
+        if depends_on:
+            request["dependsOn"] = list(depends_on)
+        self._requests[request_id] = request
+        return request_id
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def _pack(self, request_ids: List[str]) -> List[List[Dict[str, Any]]]:
+        """
+        Splits requests into batches of at most MAX_BATCH_SIZE, keeping every dependsOn
+        chain (a connected group of requests) inside a single batch.
+        """
+        parent = {request_id: request_id for request_id in request_ids}
+
+        def find(request_id: str) -> str:
+            while parent[request_id] != request_id:
+                parent[request_id] = parent[parent[request_id]]
+                request_id = parent[request_id]
+            return request_id
+
+        for request_id in request_ids:
+            for dependency in self._requests[request_id].get("dependsOn", []):
+                if dependency in parent:
+                    parent[find(request_id)] = find(dependency)
+
+        groups: Dict[str, List[str]] = {}
+        for request_id in request_ids:
+            groups.setdefault(find(request_id), []).append(request_id)
+
+        batches: List[List[Dict[str, Any]]] = []
+        for group in groups.values():
+            if len(group) > MAX_BATCH_SIZE:
+                raise ValueError(f"A dependsOn chain of {len(group)} requests does not fit in one batch of {MAX_BATCH_SIZE}")
+            target = next((batch for batch in batches if len(batch) + len(group) <= MAX_BATCH_SIZE), None)
+            if target is None:
+                target = []
+                batches.append(target)
+            target.extend(self._requests[request_id] for request_id in group)
+        return batches
+
+    def _send(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Sends one $batch. When the batch itself fails, every sub-request in it is reported
+        with that failure instead of raising, so batches that were applied keep their results.
+        """
+        try:
+            resp = _make_graph_api_request("POST", f"{GRAPH_API_BASE_URL}/$batch", self.connection, self.db, json={"requests": batch})
+        except HTTPException as e:
+            return failed_responses(batch, e.status_code, str(e.detail))
+        except requests.RequestException as e:
+            return failed_responses(batch, 502, f"Batch request failed: {e}")
+        return self._batch_responses(batch, resp)
+
+    async def _send_async(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Async counterpart of _send."""
+        try:
+            resp = await _make_graph_api_request_async("POST", f"{GRAPH_API_BASE_URL}/$batch", self.connection, self.db, json={"requests": batch})
+        except HTTPException as e:
+            return failed_responses(batch, e.status_code, str(e.detail))
+        except httpx.HTTPError as e:
+            return failed_responses(batch, 502, f"Batch request failed: {e}")
+        return self._batch_responses(batch, resp)
+
+    @staticmethod
+    def _batch_responses(batch: List[Dict[str, Any]], resp) -> List[Dict[str, Any]]:
+        if resp.status_code != 200:
+            return failed_responses(batch, resp.status_code, f"Batch request failed: {resp.text}", resp.headers.get("Retry-After"))
+        return resp.json().get("responses", [])
+
+    def _next_round(
+        self,
+        responses: List[Dict[str, Any]],
+        results: Dict[str, Dict[str, Any]],
+        pending: List[str],
+        attempt: int,
+    ) -> Tuple[List[str], float]:
+        """
+        Records one round's sub-responses in ``results`` and picks the requests to send again.
+        Returns (request ids, seconds to wait first); no ids when the batch is done.
+        """
+        retry_after = None
+        failed = {}
+        for res in responses:
+            status = res.get("status", 500)
+            results[res["id"]] = {
+                "id": res["id"],
+                "status": status,
+                "body": res.get("body"),
+                "success": 200 <= status < 300,
+            }
+            header_delay = parse_retry_after((res.get("headers") or {}).get("Retry-After"))
+            if should_retry(self._requests[res["id"]]["method"], status, header_delay, RETRYABLE_STATUS_CODES):
+                failed[res["id"]] = status
+                if header_delay is not None:
+                    retry_after = max(retry_after or 0.0, header_delay)
+
+        # Requests that only failed because a retried dependency failed go round again too.
+        retry_ids = set(failed)
+        changed = True
+        while changed:
+            changed = False
+            for request_id in pending:
+                if request_id not in retry_ids and results.get(request_id, {}).get("status") == FAILED_DEPENDENCY:
+                    if retry_ids.intersection(self._requests[request_id].get("dependsOn", [])):
+                        retry_ids.add(request_id)
+                        changed = True
+
+        if not retry_ids or attempt >= self.max_retries:
+            return [], 0.0
+
+        delay = backoff_delay(attempt, retry_after)
+        if 429 in failed.values() or 503 in failed.values():
+            get_graph_limiter(self.connection).on_throttle(delay)
+        log_throttle("onedrive", self.connection.id, max(failed.values()) if failed else FAILED_DEPENDENCY, delay, attempt)
+
+        # Dependencies that already succeeded are dropped so retried requests can be packed freely.
+        pending = [request_id for request_id in pending if request_id in retry_ids]
+        for request_id in pending:
+            depends_on = [d for d in self._requests[request_id].get("dependsOn", []) if d in retry_ids]
+            if depends_on:
+                self._requests[request_id]["dependsOn"] = depends_on
+            else:
+                self._requests[request_id].pop("dependsOn", None)
+        return pending, delay
+
+    def _finish(self, results: Dict[str, Dict[str, Any]], attempt: int) -> Dict[str, Dict[str, Any]]:
+        for request_id in self._requests:
+            # Graph omits sub-responses it never ran; report them as failed rather than dropping them
+            results.setdefault(request_id, {"id": request_id, "status": FAILED_DEPENDENCY, "body": None, "success": False})
+        debug_log(f"Graph batch for connection {self.connection.id}: {len(self._requests)} requests, {attempt} retry rounds")
+        return results
+
+    def execute(self) -> Dict[str, Dict[str, Any]]:
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = list(self._requests)
+        attempt = 0
+
+        while pending:
+            batches = self._pack(pending)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                responses = [res for batch_responses in pool.map(self._send, batches) for res in batch_responses]
+            pending, delay = self._next_round(responses, results, pending, attempt)
+            if pending:
+                time.sleep(delay)
+                attempt += 1
+        return self._finish(results, attempt)
+
+    async def execute_async(self) -> Dict[str, Dict[str, Any]]:
+        """Async counterpart of execute(): batches go out concurrently on the event loop."""
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = list(self._requests)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        attempt = 0
+
+        async def send(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self._send_async(batch)
+
+        while pending:
+            batch_responses = await asyncio.gather(*(send(batch) for batch in self._pack(pending)))
+            responses = [res for batch in batch_responses for res in batch]
+            pending, delay = self._next_round(responses, results, pending, attempt)
+            if pending:
+                await asyncio.sleep(delay)
+                attempt += 1
+        return self._finish(results, attempt)
+
+def _per_item(results: Dict[str, Dict[str, Any]], request_ids: List[str], item_ids: List[str]) -> List[Dict[str, Any]]:
+    """One result per item, in input order, keyed by item id rather than batch request id."""
+    return [{**results[request_id], "id": item_id} for request_id, item_id in zip(request_ids, item_ids)]
+
+def batch_move_items(connection: CloudConnection, db: Session, moves: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Moves items with $batch. ``moves`` is a list of (item_id, target_folder_id).
+    Returns one result per move, in input order.
+    """
+    executor = GraphBatchExecutor(connection, db)
+    request_ids = [
+        executor.add("PATCH", f"/me/drive/items/{item_id}", {"parentReference": {"id": target_folder_id}})
+        for item_id, target_folder_id in moves
+    ]
+    results = executor.execute() if moves else {}
+    return _per_item(results, request_ids, [item_id for item_id, _ in moves])
+
+def batch_create_folders(connection: CloudConnection, db: Session, parent_id: str, folder_names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Creates folders under parent_id with $batch. Returns {folder_name: result}; the new
+    folder's id is in result["body"]["id"] when result["success"] is true.
+    """
+    executor = GraphBatchExecutor(connection, db)
+    request_ids = {
+        name: executor.add("POST", f"/me/drive/items/{parent_id}/children", {
+            "name": name,
+            "folder": {},
+            "@microsoft.graph.conflictBehavior": "rename"
+        })
+        for name in folder_names
+    }
+    results = executor.execute() if folder_names else {}
+    return {name: results[request_id] for name, request_id in request_ids.items()}
+
+def batch_delete_items(connection: CloudConnection, db: Session, item_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Deletes items with $batch. Returns one result per item, in input order.
+    """
+    executor = GraphBatchExecutor(connection, db)
+    request_ids = [executor.add("DELETE", f"/me/drive/items/{item_id}") for item_id in item_ids]
+    results = executor.execute() if item_ids else {}
+    return _per_item(results, request_ids, item_ids)
+
+async def batch_delete_items_async(connection: CloudConnection, db: Session, item_ids: List[str]) -> List[Dict[str, Any]]:
+    """Async counterpart of batch_delete_items."""
+    executor = GraphBatchExecutor(connection, db)
+    request_ids = [executor.add("DELETE", f"/me/drive/items/{item_id}") for item_id in item_ids]
+    results = await executor.execute_async() if item_ids else {}
+    return _per_item(results, request_ids, item_ids)
+
+def batch_get_download_urls(connection: CloudConnection, db: Session, item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches pre-authenticated download URLs with $batch. Returns {item_id: result}; the URL is
+    in result["url"] (None when the item is gone or the request failed).
+    """
+    executor = GraphBatchExecutor(connection, db)
+    unique_ids = list(dict.fromkeys(item_ids))
+    request_ids = {
+        item_id: executor.add("GET", f"/me/drive/items/{item_id}?$select=id,@microsoft.graph.downloadUrl")
+        for item_id in unique_ids
+    }
+    results = executor.execute() if unique_ids else {}
+    return {
+        item_id: {
+            **results[request_id],
+            "id": item_id,
+            "url": (results[request_id]["body"] or {}).get("@microsoft.graph.downloadUrl") if results[request_id]["success"] else None,
+        }
+        for item_id, request_id in request_ids.items()
+    }
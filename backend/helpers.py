@@ -1,6 +1,46 @@
 import os
+from datetime import datetime
 
 def debug_log(*args):
     DEBUG = os.getenv("DEBUG", "false").lower() == "true"
     if DEBUG:
-        print("[DEBUG]", *args) 
\ No newline at end of file
+        print("[DEBUG]", *args)
+
+def parse_datetime(dt):
+    if not dt:
+        return None
+    if isinstance(dt, datetime):
+        return dt
+    try:
+        # Handles '2024-09-04T21:47:50Z' and similar
+        return datetime.fromisoformat(dt.replace('Z', '+00:00'))
+    except Exception:
+        return None
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.heic'}
+
+def is_image_name(name) -> bool:
+    return bool(name) and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+# Provider hash fields -> File columns. File.hash holds the first one present, in this order,
+# so rows from the same provider are always compared with the same algorithm. Copies held by
+# different providers are matched on duplicates_service.SHARED_HASH_COLUMNS instead.
+HASH_COLUMNS = (
+    ("quick_xor_hash", ("quickXorHash",)),
+    ("sha256_hash", ("sha256Hash", "sha256Checksum", "sha256")),
+    ("sha1_hash", ("sha1Hash", "sha1Checksum", "sha1")),
+    ("md5_hash", ("md5Checksum", "md5")),
+)
+
+def hash_columns(hashes):
+    """
+    Maps a provider's hashes (Graph file.hashes, Drive md5Checksum/sha1Checksum/sha256Checksum)
+    to File hash column values. Hex digests are lower-cased; quickXorHash is base64 and kept as is.
+    """
+    hashes = hashes if isinstance(hashes, dict) else {}
+    columns = {}
+    for column, fields in HASH_COLUMNS:
+        value = next((hashes[field] for field in fields if hashes.get(field)), None)
+        columns[column] = value if value is None or column == "quick_xor_hash" else value.lower()
+    columns["hash"] = next((columns[column] for column, _ in HASH_COLUMNS if columns[column]), None)
+    return columns
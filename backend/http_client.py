@@ -0,0 +1,62 @@
+"""
+Pooled, keep-alive HTTP sessions for outbound provider calls.
+
+Every call to the module-level ``requests.request`` opens (and tears down) its own
+TCP+TLS connection. Graph scans make thousands of calls, so instead each worker
+process shares one ``requests.Session`` whose connection pool is sized from config.
+"""
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from backend.config import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_POOL_BLOCK, HTTP_TIMEOUT
+from backend.helpers import debug_log
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=HTTP_POOL_BLOCK,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the pooled session for the current worker process.
+    A new session is built after a fork so workers never share sockets with their parent.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                debug_log(f"Creating pooled HTTP session for pid {pid} (maxsize={HTTP_POOL_MAXSIZE})")
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+def http_request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Drop-in replacement for ``requests.request`` that reuses pooled connections.
+    """
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    return get_http_session().request(method, url, **kwargs)
+
+def close_http_session() -> None:
+    """
+    Closes the pooled session (and all its keep-alive connections). Called on shutdown.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
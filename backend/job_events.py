@@ -0,0 +1,76 @@
+"""
+In-process event channels for background jobs, consumed by the Server-Sent Events endpoint.
+
+The job thread publishes progress and batches of newly found files; each SSE client awaits
+an asyncio.Event that the publisher sets through call_soon_threadsafe, so waiting clients
+cost no threads and no database work. Only the last SCAN_EVENT_BUFFER events are kept,
+which is enough for a client reconnecting with Last-Event-ID to catch up.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+from backend.config import SCAN_EVENT_BUFFER
+
+class JobEventChannel:
+    def __init__(self, maxlen: int = SCAN_EVENT_BUFFER):
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, event_type, data))
+            subscribers = list(self._subscribers)
+        for loop, wake in subscribers:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                pass
+        return self._seq
+
+    def events_since(self, seq: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        with self._lock:
+            return [event for event in self._events if event[0] > seq]
+
+    def subscribe(self) -> asyncio.Event:
+        """Must be called from the subscriber's event loop."""
+        wake = asyncio.Event()
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), wake))
+        return wake
+
+    def unsubscribe(self, wake: asyncio.Event) -> None:
+        with self._lock:
+            self._subscribers = {(loop, w) for loop, w in self._subscribers if w is not wake}
+
+_channels: Dict[str, JobEventChannel] = {}
+_channels_lock = threading.Lock()
+
+def open_channel(job_id: str) -> JobEventChannel:
+    with _channels_lock:
+        channel = _channels.get(job_id)
+        if channel is None:
+            channel = JobEventChannel()
+            _channels[job_id] = channel
+        return channel
+
+def get_channel(job_id: str) -> Optional[JobEventChannel]:
+    return _channels.get(job_id)
+
+def close_channel(job_id: str) -> None:
+    """Forget the channel; clients already subscribed keep their reference and drain it."""
+    with _channels_lock:
+        _channels.pop(job_id, None)
+
+def format_sse(event_type: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,206 @@
+"""
+Process-wide scheduler for background jobs.
+
+Jobs no longer get a thread each: a fixed pool of SCAN_SCHEDULER_WORKERS threads runs
+them in priority order. Each job carries its owner's plan limits (SubscriptionService.
+get_plan_limits): ``scan_priority`` orders the queue, ``concurrent_scans`` caps how many
+of one user's jobs run at once, and ``scan_pool_share`` caps the fraction of the pool a
+whole plan tier may hold. Among jobs of equal priority, users with fewer running jobs go
+first, then submission order.
+
+Preemption is cooperative. When an interactive job is queued behind a full pool, the
+lowest-priority running job below it is asked to yield; the job notices through
+should_yield(), checkpoints, and returns True from its run callable to be queued again.
+"""
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from backend.config import SCAN_SCHEDULER_WORKERS, SCAN_INTERACTIVE_PRIORITY_BOOST, SCAN_JOB_STALE_SECONDS
+from backend.helpers import debug_log
+
+def job_priority(limits: Dict[str, Any], interactive: bool) -> int:
+    return limits.get("scan_priority", 0) + (SCAN_INTERACTIVE_PRIORITY_BOOST if interactive else 0)
+
+class ScheduledJob:
+    def __init__(
+        self,
+        job_id: str,
+        user_id: int,
+        run: Callable[[], bool],
+        plan: str,
+        limits: Dict[str, Any],
+        interactive: bool,
+        heartbeat: Optional[Callable[[], None]],
+        seq: int,
+    ):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.run = run
+        self.plan = plan
+        self.user_limit = limits.get("concurrent_scans", 1)
+        self.pool_share = limits.get("scan_pool_share", 1.0)
+        self.priority = job_priority(limits, interactive)
+        self.interactive = interactive
+        self.heartbeat = heartbeat
+        self.seq = seq
+        self.yield_requested = False
+
+class JobScheduler:
+    def __init__(self, max_workers: int = SCAN_SCHEDULER_WORKERS, heartbeat_interval: float = SCAN_JOB_STALE_SECONDS / 3):
+        self.max_workers = max(1, max_workers)
+        self.heartbeat_interval = heartbeat_interval
+        self._queue: List[ScheduledJob] = []
+        self._running: Dict[str, ScheduledJob] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._started = False
+
+    def _start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f"job-scheduler-{i}", daemon=True).start()
+        threading.Thread(target=self._heartbeat_loop, name="job-scheduler-heartbeat", daemon=True).start()
+
+    def submit(
+        self,
+        job_id: str,
+        user_id: int,
+        run: Callable[[], bool],
+        plan: str = "free",
+        limits: Optional[Dict[str, Any]] = None,
+        interactive: bool = False,
+        heartbeat: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Queues a job. ``run()`` is called on a pool thread; it returns True when it yielded
+        to a higher-priority job and should be queued again, False when it is finished.
+        """
+        entry = ScheduledJob(job_id, user_id, run, plan, limits or {}, interactive, heartbeat, next(self._seq))
+        with self._cond:
+            self._start()
+            self._queue.append(entry)
+            self._maybe_preempt(entry)
+            self._cond.notify_all()
+
+    def cancel(self, job_id: str) -> bool:
+        """Removes a job that has not started yet. Returns False if it is running or unknown."""
+        with self._cond:
+            for entry in self._queue:
+                if entry.job_id == job_id:
+                    self._queue.remove(entry)
+                    return True
+        return False
+
+    def should_yield(self, job_id: str) -> bool:
+        entry = self._running.get(job_id)
+        return entry is not None and entry.yield_requested
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position among queued jobs, or None if the job is running or unknown."""
+        with self._cond:
+            for position, entry in enumerate(self._ordered(), start=1):
+                if entry.job_id == job_id:
+                    return position
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "workers": self.max_workers,
+                "running": len(self._running),
+                "queued": len(self._queue),
+                "running_by_plan": self._count(self._running.values(), lambda e: e.plan),
+                "queued_by_plan": self._count(self._queue, lambda e: e.plan),
+            }
+
+    @staticmethod
+    def _count(entries, key) -> Dict[Any, int]:
+        counts: Dict[Any, int] = {}
+        for entry in entries:
+            counts[key(entry)] = counts.get(key(entry), 0) + 1
+        return counts
+
+    def _plan_cap(self, entry: ScheduledJob) -> int:
+        return max(1, int(self.max_workers * entry.pool_share))
+
+    def _ordered(self) -> List[ScheduledJob]:
+        running_per_user = self._count(self._running.values(), lambda e: e.user_id)
+        return sorted(self._queue, key=lambda e: (-e.priority, running_per_user.get(e.user_id, 0), e.seq))
+
+    def _eligible(self, entry: ScheduledJob, running_per_user: Dict[int, int], running_per_plan: Dict[str, int]) -> bool:
+        if entry.user_limit != -1 and running_per_user.get(entry.user_id, 0) >= entry.user_limit:
+            return False
+        return running_per_plan.get(entry.plan, 0) < self._plan_cap(entry)
+
+    def _pick(self) -> Optional[ScheduledJob]:
+        if len(self._running) >= self.max_workers:
+            return None
+        running_per_user = self._count(self._running.values(), lambda e: e.user_id)
+        running_per_plan = self._count(self._running.values(), lambda e: e.plan)
+        for entry in self._ordered():
+            if self._eligible(entry, running_per_user, running_per_plan):
+                self._queue.remove(entry)
+                return entry
+        return None
+
+    def _maybe_preempt(self, entry: ScheduledJob) -> None:
+        """Asks one lower-priority running job to yield if an interactive job cannot start."""
+        if not entry.interactive or len(self._running) < self.max_workers:
+            return
+        running_per_user = self._count(self._running.values(), lambda e: e.user_id)
+        if entry.user_limit != -1 and running_per_user.get(entry.user_id, 0) >= entry.user_limit:
+            return
+        if any(e.yield_requested for e in self._running.values()):
+            # A slot is already being freed
+            return
+        candidates = [e for e in self._running.values() if e.priority < entry.priority]
+        if candidates:
+            victim = min(candidates, key=lambda e: (e.priority, -e.seq))
+            victim.yield_requested = True
+            debug_log(f"Job {victim.job_id} (priority {victim.priority}) asked to yield to {entry.job_id} (priority {entry.priority})")
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                entry = self._pick()
+                while entry is None:
+                    self._cond.wait()
+                    entry = self._pick()
+                self._running[entry.job_id] = entry
+            requeue = False
+            try:
+                requeue = entry.run()
+            except Exception as e:
+                debug_log(f"Scheduled job {entry.job_id} raised: {e}")
+            with self._cond:
+                self._running.pop(entry.job_id, None)
+                if requeue:
+                    entry.yield_requested = False
+                    self._queue.append(entry)
+                self._cond.notify_all()
+
+    def _heartbeat_loop(self) -> None:
+        """Keeps queued jobs from looking abandoned to other processes while they wait."""
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._cond:
+                waiting = [entry for entry in self._queue if entry.heartbeat is not None]
+            for entry in waiting:
+                try:
+                    entry.heartbeat()
+                except Exception as e:
+                    debug_log(f"Heartbeat for queued job {entry.job_id} failed: {e}")
+
+_scheduler: Optional[JobScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> JobScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = JobScheduler()
+    return _scheduler
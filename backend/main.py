@@ -13,11 +13,14 @@ import logging
 from datetime import datetime
 from fastapi import Depends
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
-from backend.database import get_db
+from backend.database import get_db, SessionLocal, engine
 import re
 import html
 import traceback
 from backend.routers.cloud import router as cloud_router
+from backend.http_client import close_http_session
+from backend.onedrive_async_api import open_async_http_client, close_async_http_client
+from backend.services.scan_job_service import resume_interrupted_scan_jobs, start_result_purger, stop_result_purger
 
 # Configure security logging
 security_logger = logging.getLogger("security")
@@ -37,7 +40,7 @@ class SecureHeadersMiddleware(BaseHTTPMiddleware):
 class SecurityLoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
         # Log security-relevant requests
-        if request.url.path in ["/auth/token", "/auth/register", "/api/onedrive/delete_files", "/api/files/delete"]:
+        if request.url.path in ["/auth/token", "/auth/register", "/api/onedrive/delete_files", "/api/onedrive/async/delete_files", "/api/files/delete"]:
             client_host = request.client.host if request.client else "unknown"
             security_logger.info(
                 f"Security event: {request.method} {request.url.path} from {client_host} at {datetime.utcnow()}"
@@ -70,6 +73,21 @@ class InputSanitizationMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
 
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZip for every path except those whose bodies are relayed byte for byte."""
+    def __init__(self, app, exclude_paths=(), **kwargs):
+        super().__init__(app, **kwargs)
+        self.exclude_paths = [re.compile(path) for path in exclude_paths]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and any(path.fullmatch(scope["path"]) for path in self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# File downloads keep their Content-Length and byte ranges, so they are never compressed
+UNCOMPRESSED_PATHS = (r"/api/files/\d+/download",)
+
 limiter = Limiter(key_func=get_remote_address)
 app = FastAPI(
     title="Declutter Cloud API",
@@ -124,7 +142,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1000, exclude_paths=UNCOMPRESSED_PATHS)
 app.add_middleware(InputSanitizationMiddleware)
 app.add_middleware(SecurityLoggingMiddleware)
 app.add_middleware(SecureHeadersMiddleware)
@@ -142,6 +160,27 @@ app.include_router(images)
 app.include_router(duplicates_router)
 app.include_router(feature_router)
 
+@app.on_event("startup")
+def resume_scan_jobs():
+    db = SessionLocal()
+    try:
+        resume_interrupted_scan_jobs(db)
+    except SQLAlchemyError as e:
+        logging.getLogger(__name__).warning(f"Could not resume interrupted scan jobs: {e}")
+    finally:
+        db.close()
+    start_result_purger(engine)
+
+@app.on_event("startup")
+async def open_outbound_connections():
+    await open_async_http_client()
+
+@app.on_event("shutdown")
+async def close_outbound_connections():
+    stop_result_purger()
+    close_http_session()
+    await close_async_http_client()
+
 @app.get("/health", tags=["infra"])
 def health():
     return {"status": "ok"}
@@ -6,7 +6,7 @@ from datetime import datetime, timezone
 import uuid
 from backend.database import Base
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 # Pydantic Schemas for API responses
 class CloudConnectionSchema(BaseModel):
@@ -28,6 +28,20 @@ class UserSchema(BaseModel):
     class Config:
         from_attributes = True
 
+class FileData(BaseModel):
+    """One file in an inventory upload (/api/files/upsert, /api/files/ingest)"""
+    cloud_id: str
+    name: str
+    size: Optional[int] = None
+    last_modified: Optional[str] = None
+    last_accessed: Optional[str] = None
+    provider: Optional[str] = "onedrive"
+    path: Optional[str] = None
+    tags: Optional[str] = None
+    extra: Optional[Dict[str, Any]] = None
+    url: Optional[str] = None
+    hashes: Optional[Dict[str, str]] = None  # provider hashes, e.g. {"quickXorHash": ...} or {"md5Checksum": ...}
+
 # SQLAlchemy Models
 class User(Base):
     __tablename__ = "users"
@@ -87,6 +101,75 @@ class CloudConnection(Base):
         Index('idx_cloud_connection_active', 'is_active'),
     )
 
+class DriveDeltaState(Base):
+    """Last Graph @odata.deltaLink seen for a connection's root folder, so rescans only fetch changes."""
+    __tablename__ = "drive_delta_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    connection_id = Column(Integer, ForeignKey("cloud_connections.id", ondelete="CASCADE"), nullable=False)
+    root_folder_id = Column(String(255), nullable=False)
+    delta_link = Column(Text, nullable=True)
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index('idx_delta_state_connection_root', 'connection_id', 'root_folder_id', unique=True),
+    )
+
+class FileSyncRoot(Base):
+    """
+    A synced OneDrive root folder a file was seen under. Delta responses carry no
+    parentReference.path, so inventory reads select a root's files through this table.
+    """
+    __tablename__ = "file_sync_roots"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    root_folder_id = Column(String(255), primary_key=True)
+    file_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        Index('idx_file_sync_root_file', 'file_id'),  # roots of a file, cascading deletes
+    )
+
+class BackgroundJob(Base):
+    """
+    Durable record of a long-running job (folder scans, duplicate searches, smart organise).
+    Any worker can serve its status, the checkpoint lets a scan interrupted by a crash or
+    redeploy pick up where it stopped, and in queue mode the table is the job queue.
+    """
+    __tablename__ = "background_jobs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    connection_id = Column(Integer, ForeignKey("cloud_connections.id", ondelete="SET NULL"), nullable=True)
+    job_type = Column(String(50), nullable=False, default="scan")  # scan, dedup, organise
+    priority = Column(Integer, nullable=False, default=0)  # higher is claimed first; from the owner's plan
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, complete, cancelled, error
+    progress = Column(Integer, default=0)
+    folders_visited = Column(Integer, default=0)
+    files_found = Column(Integer, default=0)
+    cancelled = Column(Boolean, default=False)
+    error = Column(Text, nullable=True)
+    params = Column(JSON, nullable=True)  # e.g. {"folder_ids": [...], "max_depth": 5}
+    checkpoint = Column(JSON, nullable=True)  # traversal frontier, visited folders and files found so far
+    stats = Column(JSON, nullable=True)  # latest progress estimate: ETA, throughput, stalled/throttled state
+    result = Column(JSON, nullable=True)  # small results only; larger ones are in the msgpack file at result_path
+    result_path = Column(String(500), nullable=True)
+    result_count = Column(Integer, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True)  # when the stored result is purged
+    worker_id = Column(String(255), nullable=True)  # host:pid currently running the job
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('idx_background_job_user_status', 'user_id', 'status'),
+        Index('idx_background_job_status_heartbeat', 'status', 'heartbeat_at'),
+        Index('idx_background_job_queue', 'status', 'priority', 'created_at'),
+    )
+
 class Session(Base):
     __tablename__ = "sessions"
     
@@ -119,6 +202,19 @@ class File(Base):
     tags = Column(String(1000), nullable=True)  # Comma-separated tags or JSON string
     extra = Column(Text, nullable=True)  # For additional metadata
     url = Column(String(2000), nullable=True)  # URL for file download/view, optional - cached for performance
+    url_expires_at = Column(DateTime(timezone=True), nullable=True)  # when a pre-authenticated url stops working; null = unknown
+    # Provider content hashes (see helpers.hash_columns); hash is the one duplicates are matched on
+    hash = Column(String(128), nullable=True)
+    quick_xor_hash = Column(String(64), nullable=True)
+    sha1_hash = Column(String(64), nullable=True)
+    sha256_hash = Column(String(64), nullable=True)
+    md5_hash = Column(String(64), nullable=True)
+    # Digest of the file's duplicate key (DuplicateGroup.dup_key); "" = never a duplicate
+    dup_key = Column(String(40), nullable=True)
+    # Canonical name from backend.filename_normalization ("img_001.jpg" for "IMG_001 (1).JPEG"); null = not computed yet
+    normalized_name = Column(String(500), nullable=True)
+    # Name stem for near-duplicate names (NameStem.stem, "holiday photo"); null = not computed yet
+    name_stem = Column(String(500), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     is_deleted = Column(Boolean, default=False)
@@ -130,15 +226,79 @@ class File(Base):
     # Indexes for better performance
     __table_args__ = (
         Index('idx_file_user_provider', 'user_id', 'provider'),
+        Index('uq_file_user_provider_cloud_id', 'user_id', 'provider', 'cloud_id', unique=True),  # upsert conflict target
         Index('idx_file_cloud_id', 'cloud_id'),
         Index('idx_file_name_size', 'name', 'size'),
+        Index('idx_file_user_name_size', 'user_id', 'name', 'size'),  # per-user name/size duplicate GROUP BY
+        Index('idx_file_user_dup_key', 'user_id', 'dup_key'),  # members of a DuplicateGroup
+        Index('idx_file_user_normalized_name_size', 'user_id', 'normalized_name', 'size'),  # copy variants
+        Index('idx_file_user_name_stem', 'user_id', 'name_stem'),  # members of a NameStem
         Index('idx_file_last_modified', 'last_modified'),
         Index('idx_file_size', 'size'),
         Index('idx_file_path', 'path'),
         Index('idx_file_user_modified', 'user_id', 'last_modified'),
         Index('idx_file_url', 'url'),  # Index for URL lookups
+        Index('idx_file_user_size_hash', 'user_id', 'size', 'hash'),  # exact-duplicate GROUP BY
+        # cross-provider GROUP BY, one per algorithm providers share
+        Index('idx_file_user_size_sha256', 'user_id', 'size', 'sha256_hash'),
+        Index('idx_file_user_size_sha1', 'user_id', 'size', 'sha1_hash'),
+        Index('idx_file_user_size_md5', 'user_id', 'size', 'md5_hash'),
+    )
+
+class DuplicateGroup(Base):
+    """
+    A set of a user's files that share a duplicate key: the content hash when there is one,
+    otherwise name + size. Rows exist only while the key has two or more live files and are
+    kept current by backend.services.duplicate_index_service whenever files are written.
+    """
+    __tablename__ = "duplicate_groups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    dup_key = Column(String(40), nullable=False)
+    key_type = Column(String(20), nullable=False)  # hash, name_size
+    name = Column(String(500), nullable=True)  # a member's name, for display
+    size = Column(BigInteger, nullable=False)
+    hash = Column(String(128), nullable=True)
+    member_count = Column(Integer, nullable=False)
+    image_count = Column(Integer, nullable=False, default=0)
+    provider_count = Column(Integer, nullable=False, default=1)
+    providers = Column(JSON, nullable=True)  # {provider: members}
+    wasted_bytes = Column(BigInteger, nullable=False)  # size * (member_count - 1)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index('uq_duplicate_group_user_key', 'user_id', 'dup_key', unique=True),
+        Index('idx_duplicate_group_user_wasted', 'user_id', 'wasted_bytes', 'id'),  # keyset pages, biggest savings first
+    )
+
+class NameStem(Base):
+    """
+    A distinct name stem among a user's files and the near-duplicate cluster it belongs to.
+    Rows are added, and clusters merged, by backend.services.similar_files_service whenever
+    files are written; a cluster is identified by the smallest id among its stems.
+    """
+    __tablename__ = "name_stems"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    stem = Column(String(500), nullable=False)
+    cluster_id = Column(Integer, nullable=True)  # null only until the row's own id is known
+
+    __table_args__ = (
+        Index('uq_name_stem_user_stem', 'user_id', 'stem', unique=True),
+        Index('idx_name_stem_user_cluster', 'user_id', 'cluster_id'),  # keyset pages of clusters
     )
 
+class NameStemBucket(Base):
+    """One MinHash LSH band of a NameStem; stems sharing a bucket are compared."""
+    __tablename__ = "name_stem_buckets"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bucket = Column(String(16), primary_key=True)  # digest of (band, band values)
+    stem_id = Column(Integer, ForeignKey("name_stems.id"), primary_key=True)
+
 class Subscription(Base):
     __tablename__ = "subscriptions"
     
@@ -0,0 +1,159 @@
+"""
+Name similarity primitives for near-duplicate file names (see
+backend.services.similar_files_service, which stores and pages the clusters).
+
+A name is reduced to a normalized stem (the canonical name from
+backend.filename_normalization, without its extension and with separators collapsed) and
+shingled into character trigrams. A one-permutation MinHash signature of
+SIMILAR_MINHASH_BANDS x SIMILAR_MINHASH_ROWS values is cut into bands; stems that share a
+band share an LSH bucket and become candidates, and only candidates are compared with the
+exact trigram Jaccard similarity. Buckets larger than SIMILAR_MAX_BUCKET_SIZE are generic
+stems ("img", "scan") and are skipped.
+"""
+import hashlib
+import os
+import random
+import re
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from zlib import crc32
+from backend.config import SIMILAR_MINHASH_BANDS, SIMILAR_MINHASH_ROWS, SIMILAR_MAX_BUCKET_SIZE
+from backend.filename_normalization import normalize_filename
+
+SEPARATORS = re.compile(r"[\s_\-.]+")
+
+def normalize_name(name: Optional[str]) -> str:
+    """'Copy of Holiday_Photo (2).JPG' -> 'holiday photo'."""
+    stem = os.path.splitext(normalize_filename(name))[0]
+    return SEPARATORS.sub(" ", stem).strip()
+
+def trigrams(stem: str) -> FrozenSet[str]:
+    padded = f" {stem} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if a or b else 1.0
+
+class MinHasher:
+    """
+    One-permutation MinHash: each shingle hash goes to one of bands x rows bins and every bin
+    keeps its minimum; an empty bin borrows the next non-empty bin's minimum together with its
+    distance (densification). One pass over the shingles gives the whole signature, instead of
+    one pass per permutation. CRC-32 keeps signatures identical across worker processes,
+    unlike the per-process salted hash().
+    """
+
+    def __init__(self, bands: int, rows: int, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        self.size = bands * rows
+        self.seed = random.Random(seed).getrandbits(32)
+
+    def band_keys(self, shingles: FrozenSet[str]) -> List[Tuple[int, Tuple[Any, ...]]]:
+        size, seed = self.size, self.seed
+        bins: List[Any] = [None] * size
+        for shingle in shingles:
+            value, index = divmod(crc32(shingle.encode(), seed), size)
+            if bins[index] is None or value < bins[index]:
+                bins[index] = value
+        signature = list(bins)
+        for index in range(size):
+            if bins[index] is None:
+                for distance in range(1, size):
+                    borrowed = bins[(index + distance) % size]
+                    if borrowed is not None:
+                        signature[index] = (borrowed, distance)
+                        break
+        rows = self.rows
+        return [(band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+class UnionFind:
+    """Disjoint sets over any integers; the smallest member is a set's root."""
+
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        root = i
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while i != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+_hasher = MinHasher(SIMILAR_MINHASH_BANDS, SIMILAR_MINHASH_ROWS)
+
+def stem_buckets(stem: str) -> List[str]:
+    """The stem's LSH bucket keys, one per band."""
+    return [hashlib.sha1(repr(key).encode()).hexdigest()[:16] for key in _hasher.band_keys(trigrams(stem))]
+
+def cluster_stems(stems: Sequence[str], threshold: float, shingles: Optional[Sequence[FrozenSet[str]]] = None) -> UnionFind:
+    """
+    Joins every pair of stems that share an LSH bucket and reach ``threshold``; the sets are
+    over positions in ``stems``.
+    """
+    shingles = [trigrams(stem) for stem in stems] if shingles is None else shingles
+    buckets: Dict[str, List[int]] = defaultdict(list)
+    for index, stem in enumerate(stems):
+        for key in stem_buckets(stem):
+            buckets[key].append(index)
+
+    clusters = UnionFind()
+    for bucket in buckets.values():
+        if len(bucket) < 2 or len(bucket) > SIMILAR_MAX_BUCKET_SIZE:
+            continue
+        # Every pair in the bucket not already joined is checked
+        for position, index in enumerate(bucket):
+            for other in bucket[:position]:
+                if clusters.find(other) != clusters.find(index) and jaccard(shingles[other], shingles[index]) >= threshold:
+                    clusters.union(other, index)
+    return clusters
+
+def similar_name_groups(rows, threshold: float) -> List[Dict[str, Any]]:
+    """
+    Clusters (file_id, name) rows into groups of near-duplicate names. Each group is
+    {"key", "files": [(file_id, score)]} where score is the member's similarity to the
+    group's shortest stem; groups whose members all have the same name are left to the
+    duplicate listings.
+    """
+    stem_ids: Dict[str, int] = {}
+    stems: List[str] = []
+    members: List[List[Tuple[int, str]]] = []
+    for file_id, name in rows:
+        stem = normalize_name(name)
+        if not stem:
+            continue
+        index = stem_ids.get(stem)
+        if index is None:
+            index = stem_ids[stem] = len(stems)
+            stems.append(stem)
+            members.append([])
+        members[index].append((file_id, name))
+
+    shingles = [trigrams(stem) for stem in stems]
+    clusters = cluster_stems(stems, threshold, shingles)
+    grouped: Dict[int, List[int]] = defaultdict(list)
+    for index in range(len(stems)):
+        grouped[clusters.find(index)].append(index)
+
+    groups = []
+    for indexes in grouped.values():
+        files = [f for index in indexes for f in members[index]]
+        if len(files) < 2 or len({name for _, name in files}) < 2:
+            continue
+        key = min((stems[index] for index in indexes), key=lambda stem: (len(stem), stem))
+        key_shingles = trigrams(key)
+        scored = sorted(
+            ((file_id, round(100 * jaccard(key_shingles, shingles[index]))) for index in indexes for file_id, _ in members[index]),
+            key=lambda item: (-item[1], item[0]),
+        )
+        groups.append({"key": key, "files": scored})
+    groups.sort(key=lambda group: (group["key"], group["files"][0][0]))
+    return groups
@@ -3,25 +3,26 @@ from fastapi import HTTPException
 from datetime import datetime, timezone, timedelta
 from collections import defaultdict
 import os
-from typing import List, Dict, Any, Optional
+import threading
+import concurrent.futures
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from backend.helpers import debug_log
 from backend.config import MICROSOFT_CLIENT_ID, MICROSOFT_CLIENT_SECRET, MICROSOFT_REDIRECT_URI
 from backend.models import CloudConnection
+from backend.http_client import http_request
+from backend.rate_limiter import ProviderLimiter, get_limiter, parse_retry_after, backoff_delay, log_throttle, should_retry, THROTTLE_STATUS_CODES
+from backend.config import THROTTLE_MAX_RETRIES, TOKEN_REFRESH_SKEW_SECONDS, GRAPH_PAGE_SIZE, GRAPH_PREFETCH_WORKERS
+from jose import jwt
+from backend.folder_walker import FolderWalker
 from sqlalchemy.orm import Session
-import concurrent.futures
 
 # Microsoft Graph API constants
 GRAPH_API_BASE_URL = "https://graph.microsoft.com/v1.0"
 TOKEN_URL = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
 REQUIRED_SCOPES = "Files.ReadWrite.All User.Read offline_access"
 
-def refresh_onedrive_token(connection: CloudConnection, db: Session) -> None:
-    """
-    Refreshes the OneDrive access token and updates the database.
-    Raises HTTPException on failure.
-    """
-    debug_log("Attempting to refresh OneDrive token.")
-    data = {
+def _token_refresh_request_data(connection: CloudConnection) -> Dict[str, str]:
+    return {
         "client_id": MICROSOFT_CLIENT_ID,
         "client_secret": MICROSOFT_CLIENT_SECRET,
         "grant_type": "refresh_token",
@@ -29,28 +30,139 @@ def refresh_onedrive_token(connection: CloudConnection, db: Session) -> None:
         "redirect_uri": MICROSOFT_REDIRECT_URI,
         "scope": REQUIRED_SCOPES,
     }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-
-    resp = requests.post(TOKEN_URL, data=data, headers=headers)
 
-    if resp.status_code != 200:
-        error_details = resp.json()
-        debug_log(f"Failed to refresh OneDrive token. Status: {resp.status_code}, Response: {error_details}")
-        raise HTTPException(
-            status_code=401,
-            detail=f"Token refresh failed: {error_details.get('error_description', 'No error description.')}"
-        )
-
-    new_token_data = resp.json()
+def _token_refresh_error(status_code: int, error_details: Dict[str, Any]) -> HTTPException:
+    debug_log(f"Failed to refresh OneDrive token. Status: {status_code}, Response: {error_details}")
+    return HTTPException(
+        status_code=401,
+        detail=f"Token refresh failed: {error_details.get('error_description', 'No error description.')}"
+    )
+
+def token_expiry_from_response(token_data: Dict[str, Any]) -> Optional[datetime]:
+    """Converts the token endpoint's relative expires_in into an absolute token_expires_at."""
+    expires_in = token_data.get("expires_in")
+    if not expires_in:
+        return None
+    return datetime.now(timezone.utc) + timedelta(seconds=int(expires_in))
+
+def _apply_refreshed_token(connection: CloudConnection, new_token_data: Dict[str, Any]) -> None:
     connection.access_token = new_token_data['access_token']
+    connection.token_expires_at = token_expiry_from_response(new_token_data)
     if 'refresh_token' in new_token_data:
         # Microsoft may issue a new refresh token which should be used from now on
         connection.refresh_token = new_token_data['refresh_token']
 
+def refresh_onedrive_token(connection: CloudConnection, db: Session) -> None:
+    """
+    Refreshes the OneDrive access token and updates the database.
+    Raises HTTPException on failure.
+    """
+    debug_log("Attempting to refresh OneDrive token.")
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+    resp = http_request("POST", TOKEN_URL, data=_token_refresh_request_data(connection), headers=headers)
+
+    if resp.status_code != 200:
+        raise _token_refresh_error(resp.status_code, resp.json())
+
+    _apply_refreshed_token(connection, resp.json())
+
     db.add(connection)
     db.commit()
     debug_log("Token refreshed and updated in DB successfully.")
 
+# One lock per connection id so concurrent callers in this process share a single refresh
+_refresh_locks: Dict[Any, threading.Lock] = defaultdict(threading.Lock)
+_refresh_locks_guard = threading.Lock()
+
+def _refresh_lock_for(connection: CloudConnection) -> threading.Lock:
+    with _refresh_locks_guard:
+        return _refresh_locks[connection.id or id(connection)]
+
+def token_is_expiring(connection: CloudConnection) -> bool:
+    expires_at = connection.token_expires_at
+    if expires_at is None:
+        return False
+    if expires_at.tzinfo is None:
+        # SQLite hands timezone-aware columns back naive; they are stored in UTC
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at - timedelta(seconds=TOKEN_REFRESH_SKEW_SECONDS) <= datetime.now(timezone.utc)
+
+def _reload_connection_tokens(connection: CloudConnection, db: Session) -> None:
+    """
+    Re-reads the connection row, locking it (SELECT ... FOR UPDATE on Postgres) so that a
+    refresh running in another worker process finishes before we decide whether to refresh.
+    """
+    if connection.id is None:
+        return
+    stored = db.query(CloudConnection).filter(CloudConnection.id == connection.id).with_for_update().populate_existing().first()
+    if stored is not None and stored is not connection:
+        connection.access_token = stored.access_token
+        connection.refresh_token = stored.refresh_token
+        connection.token_expires_at = stored.token_expires_at
+
+def ensure_fresh_onedrive_token(connection: CloudConnection, db: Session, failed_token: Optional[str] = None) -> None:
+    """
+    Single-flight token refresh. Callers that saw a 401 pass the token that failed; callers
+    refreshing proactively pass nothing. Whoever gets the per-connection lock first refreshes;
+    everyone queued behind it (in this process, or in other workers via the row lock) finds a
+    new, unexpired token and returns without another round trip to the token endpoint.
+    """
+    with _refresh_lock_for(connection):
+        _reload_connection_tokens(connection, db)
+        already_refreshed = failed_token is not None and connection.access_token != failed_token
+        if already_refreshed and not token_is_expiring(connection):
+            debug_log(f"Token for connection {connection.id} was refreshed by another caller.")
+            db.commit()  # release the row lock
+            return
+        if failed_token is None and not token_is_expiring(connection):
+            db.commit()
+            return
+        try:
+            refresh_onedrive_token(connection, db)
+        except Exception:
+            db.rollback()  # release the row lock before the error reaches the caller
+            raise
+
+def _graph_tenant_key(connection: CloudConnection) -> str:
+    """
+    Graph throttles per tenant as well as per user. Work/school access tokens are JWTs carrying
+    the tenant id. Personal-account tokens are opaque and personal accounts share no tenant
+    quota, so each such connection gets a tenant bucket of its own; otherwise every
+    outlook.com user would share one rate and one user's Retry-After would stall them all.
+    """
+    try:
+        tenant_id = jwt.get_unverified_claims(connection.access_token).get("tid")
+    except Exception:
+        tenant_id = None
+    return tenant_id or f"conn:{connection.id or id(connection)}"
+
+def get_graph_limiter(connection: CloudConnection) -> ProviderLimiter:
+    return get_limiter("onedrive", _graph_tenant_key(connection), connection.id or id(connection))
+
+def _send_graph_request(method: str, url: str, connection: CloudConnection, headers: Dict[str, str], **kwargs: Any) -> requests.Response:
+    """
+    Sends one Graph call through the connection's rate limiter. 429/503 responses are retried
+    after Retry-After (or exponential backoff) up to THROTTLE_MAX_RETRIES times, unless
+    should_retry rules out resending a non-idempotent call; the last throttled response is
+    returned to the caller if the provider never recovers.
+    """
+    limiter = get_graph_limiter(connection)
+    for attempt in range(THROTTLE_MAX_RETRIES + 1):
+        with limiter.slot():
+            resp = http_request(method, url, headers=headers, **kwargs)
+        if resp.status_code not in THROTTLE_STATUS_CODES:
+            limiter.on_success()
+            return resp
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        delay = backoff_delay(attempt, retry_after)
+        limiter.on_throttle(delay)
+        if attempt == THROTTLE_MAX_RETRIES or not should_retry(method, resp.status_code, retry_after):
+            break
+        log_throttle("onedrive", connection.id, resp.status_code, delay, attempt)
+        # The next slot() waits out the pause that on_throttle put on the shared buckets.
+    return resp
+
 def _make_graph_api_request(
     method: str,
     url: str,
@@ -60,27 +172,36 @@ def _make_graph_api_request(
 ) -> requests.Response:
     """
     Makes a request to the Microsoft Graph API, handling token refresh robustly.
-    On 401, always attempt a token refresh and retry once. If still 401, raise HTTPException.
+    Tokens close to token_expires_at are refreshed before the call. On 401, attempt a
+    (single-flight) token refresh and retry once. If still 401, raise HTTPException.
+    Requests go through the pooled keep-alive session in backend.http_client and are
+    rate limited per tenant and per connection, honoring Retry-After on 429/503.
     Returns the raw requests.Response object.
     """
+    if token_is_expiring(connection):
+        try:
+            ensure_fresh_onedrive_token(connection, db)
+        except HTTPException as e:
+            raise HTTPException(status_code=401, detail=f"Failed to refresh token: {e.detail}. Please reconnect your account.")
+
     headers = {
         "Authorization": f"Bearer {connection.access_token}",
         **kwargs.pop("headers", {})
     }
 
     debug_log(f"Requesting ({method}): {url}")
-    resp = requests.request(method, url, headers=headers, **kwargs)
+    resp = _send_graph_request(method, url, connection, headers, **kwargs)
 
     if resp.status_code == 401:
         try:
-            refresh_onedrive_token(connection, db)
+            ensure_fresh_onedrive_token(connection, db, failed_token=headers["Authorization"][len("Bearer "):])
         except HTTPException as e:
             # Re-raise with a more user-friendly message
             raise HTTPException(status_code=401, detail=f"Failed to refresh token: {e.detail}. Please reconnect your account.")
 
         debug_log("Retrying API call with new token after refresh.")
         headers["Authorization"] = f"Bearer {connection.access_token}"
-        resp = requests.request(method, url, headers=headers, **kwargs)
+        resp = _send_graph_request(method, url, connection, headers, **kwargs)
 
         if resp.status_code == 401:
             # If still unauthorized after refresh, raise immediately
@@ -89,95 +210,146 @@ def _make_graph_api_request(
 
     return resp
 
+FOLDER_SELECT_FIELDS = "id,name,lastModifiedDateTime,size,file,folder,parentReference"
+DELTA_SELECT_FIELDS = "id,name,size,file,parentReference,deleted,lastModifiedDateTime"
+
+def _folder_children_url(folder_id: Optional[str], page_size: Optional[int] = None) -> str:
+    folder_specifier = f"items/{folder_id}/children" if folder_id and folder_id != "root" else "root/children"
+    return f"{GRAPH_API_BASE_URL}/me/drive/{folder_specifier}?$select={FOLDER_SELECT_FIELDS}&$top={page_size or GRAPH_PAGE_SIZE}"
+
+def _map_folder_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    file_type = "folder" if "folder" in item else "file"
+    return {
+        "id": item["id"],
+        "name": item["name"],
+        "type": file_type,
+        "last_modified": item.get("lastModifiedDateTime"),
+        "size": item.get("size"),
+        "path": item.get("parentReference", {}).get("path"),
+        "child_count": item.get("folder", {}).get("childCount")
+    }
+
+def _map_delta_file(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": item["id"],
+        "name": item["name"],
+        "size": item.get("size", 0),
+        "hash": item.get("file", {}).get("hashes", {}).get("quickXorHash"),
+        "path": item.get("parentReference", {}).get("path"),
+        "last_modified": item.get("lastModifiedDateTime")
+    }
+
+def _graph_error_detail(resp) -> str:
+    try:
+        return resp.json().get('error', {}).get('message', resp.text)
+    except ValueError:
+        return resp.text
+
+_prefetch_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_prefetch_executor_lock = threading.Lock()
+
+def _get_prefetch_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        with _prefetch_executor_lock:
+            if _prefetch_executor is None:
+                _prefetch_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=GRAPH_PREFETCH_WORKERS,
+                    thread_name_prefix="graph-prefetch",
+                )
+    return _prefetch_executor
+
+def _fetch_folder_page(connection: CloudConnection, db: Session, url: str) -> Dict[str, Any]:
+    resp = _make_graph_api_request("GET", url, connection, db)
+
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=f"Failed to fetch folder contents: {_graph_error_detail(resp)}")
+
+    return resp.json()
+
+def iter_onedrive_folder_pages(
+    connection: CloudConnection,
+    db: Session,
+    folder_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    prefetch: bool = True
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields the contents of a OneDrive folder one page ($top=page_size items) at a time,
+    following @odata.nextLink until the folder is exhausted. With prefetch, the next page
+    is requested in the background while the caller is still processing the current one.
+    """
+    data = _fetch_folder_page(connection, db, _folder_children_url(folder_id, page_size))
+    pending = None
+    try:
+        while True:
+            next_link = data.get("@odata.nextLink")
+            if next_link and prefetch:
+                pending = _get_prefetch_executor().submit(_fetch_folder_page, connection, db, next_link)
+            yield [_map_folder_item(item) for item in data.get("value", [])]
+            if not next_link:
+                return
+            data = pending.result() if pending else _fetch_folder_page(connection, db, next_link)
+            pending = None
+    finally:
+        if pending is not None:
+            pending.cancel()
+
 def get_onedrive_folder_contents(connection: CloudConnection, db: Session, folder_id: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Fetches the contents of a specific OneDrive folder.
+    Fetches the complete contents of a specific OneDrive folder, across all pages.
     """
-    folder_specifier = f"items/{folder_id}/children" if folder_id and folder_id != "root" else "root/children"
-    graph_url = f"{GRAPH_API_BASE_URL}/me/drive/{folder_specifier}?$select=id,name,lastModifiedDateTime,size,file,folder,parentReference"
+    return [item for page in iter_onedrive_folder_pages(connection, db, folder_id) for item in page]
 
-    resp = _make_graph_api_request("GET", graph_url, connection, db)
+def iter_drive_delta_pages(connection: CloudConnection, db: Session, folder_id: str, delta_link: Optional[str] = None) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Pages through the Graph delta feed for a folder, starting from delta_link when given.
+    Yields (raw items, deltaLink) per page; deltaLink is only set on the final page.
+    A 410 means the stored delta link has expired and a full resync is required.
+    """
+    delta_url = delta_link or f"{GRAPH_API_BASE_URL}/me/drive/items/{folder_id}/delta?select={DELTA_SELECT_FIELDS}"
 
-    if resp.status_code != 200:
-        error_detail = resp.json().get('error', {}).get('message', resp.text)
-        raise HTTPException(status_code=resp.status_code, detail=f"Failed to fetch folder contents: {error_detail}")
+    while delta_url:
+        resp = _make_graph_api_request("GET", delta_url, connection, db)
 
-    data = resp.json()
-    files = []
-    for item in data.get("value", []):
-        file_type = "folder" if "folder" in item else "file"
-        files.append({
-            "id": item["id"],
-            "name": item["name"],
-            "type": file_type,
-            "last_modified": item.get("lastModifiedDateTime"),
-            "size": item.get("size"),
-            "path": item.get("parentReference", {}).get("path")
-        })
-    return files
+        if resp.status_code != 200:
+            raise HTTPException(status_code=resp.status_code, detail=f"Failed to fetch delta changes: {_graph_error_detail(resp)}")
+
+        data = resp.json()
+        yield data.get("value", []), data.get("@odata.deltaLink")
+        delta_url = data.get("@odata.nextLink")
 
 def get_all_files_recursively(connection: CloudConnection, db: Session, folder_ids: List[str]) -> List[Dict[str, Any]]:
     """
     Fetches a flat list of all files from the specified folders using the delta endpoint.
     """
     all_files = []
-    select_fields = "id,name,size,file,parentReference,deleted,lastModifiedDateTime"
 
     for folder_id in folder_ids:
-        delta_url = f"{GRAPH_API_BASE_URL}/me/drive/items/{folder_id}/delta?select={select_fields}"
-        
-        while delta_url:
-            resp = _make_graph_api_request("GET", delta_url, connection, db)
-            
-            if resp.status_code != 200:
-                error_detail = resp.json().get('error', {}).get('message', resp.text)
-                raise HTTPException(status_code=resp.status_code, detail=f"Failed to fetch delta changes: {error_detail}")
-
-            data = resp.json()
-            for item in data.get("value", []):
+        for items, _ in iter_drive_delta_pages(connection, db, folder_id):
+            for item in items:
                 # We only care about files, not folders, and only existing files.
                 if item.get("file") and not item.get("deleted"):
-                    all_files.append({
-                        "id": item["id"],
-                        "name": item["name"],
-                        "size": item.get("size", 0),
-                        "hash": item.get("file", {}).get("hashes", {}).get("quickXorHash"),
-                        "path": item.get("parentReference", {}).get("path"),
-                        "last_modified": item.get("lastModifiedDateTime")
-                    })
-
-            delta_url = data.get("@odata.nextLink")
+                    all_files.append(_map_delta_file(item))
 
     return all_files
 
 def get_all_files_recursively_with_depth(connection: CloudConnection, db: Session, folder_ids: List[str], max_depth: int = 5, use_concurrent: bool = True) -> List[Dict[str, Any]]:
     """
     Recursively fetch all files under the given folders, up to max_depth. Uses concurrency if enabled.
-    Only files are returned; folders are traversed.
+    Only files are returned; folders are traversed breadth-first by the shared FolderWalker,
+    which bounds threads globally and per user.
     """
+    walker = FolderWalker(
+        lambda folder_id: get_onedrive_folder_contents(connection, db, folder_id),
+        folder_ids,
+        max_depth=max_depth,
+        user_key=connection.user_id,
+        max_concurrency=None if use_concurrent else 1,
+    )
     results = []
-    visited = set()
-
-    def _traverse(folder_id: str, depth: int):
-        if depth > max_depth or folder_id in visited:
-            return []
-        visited.add(folder_id)
-        items = get_onedrive_folder_contents(connection, db, folder_id)
-        files = [item for item in items if item["type"] == "file"]
-        folders = [item for item in items if item["type"] == "folder"]
-        sub_results = []
-        if use_concurrent and folders:
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = [executor.submit(_traverse, f["id"], depth + 1) for f in folders]
-                for fut in concurrent.futures.as_completed(futures):
-                    sub_results.extend(fut.result())
-        else:
-            for folder in folders:
-                sub_results.extend(_traverse(folder["id"], depth + 1))
-        return files + sub_results
-
-    for folder_id in folder_ids:
-        results.extend(_traverse(folder_id, 1))
+    for _, _, items in walker.walk():
+        results.extend(item for item in items if item["type"] == "file")
     return results
 
 def create_folder_if_not_exists(connection: CloudConnection, db: Session, parent_id: str, folder_name: str) -> str:
@@ -225,46 +397,25 @@ def move_file(connection: CloudConnection, db: Session, file_id: str, target_fol
 
 def delete_file_batch(connection: CloudConnection, db: Session, file_ids: List[str]) -> List[Dict[str, Any]]:
     """
-    Deletes a list of files using the Graph API's batch endpoint.
-    Returns a list of results for each deletion operation.
+    Deletes a list of files using the Graph API's batch endpoint (see backend.graph_batch).
+    Returns a list of results for each deletion operation, in the order of file_ids.
     """
-    if not file_ids:
-        return []
+    from backend.graph_batch import batch_delete_items
 
-    batch_url = f"{GRAPH_API_BASE_URL}/$batch"
-    
-    # Batch requests are limited to 20 individual requests
-    MAX_BATCH_SIZE = 20
-    all_results = []
-    
-    for i in range(0, len(file_ids), MAX_BATCH_SIZE):
-        chunk_ids = file_ids[i:i + MAX_BATCH_SIZE]
-        
-        batch_requests = []
-        for j, file_id in enumerate(chunk_ids):
-            batch_requests.append({
-                "id": str(j + 1),
-                "method": "DELETE",
-                "url": f"/me/drive/items/{file_id}"
-            })
-
-        body = {"requests": batch_requests}
-        resp = _make_graph_api_request("POST", batch_url, connection, db, json=body)
+    return [
+        {"id": res["id"], "status": res["status"], "success": res["success"]}
+        for res in batch_delete_items(connection, db, file_ids)
+    ]
 
-        if resp.status_code != 200:
-            raise HTTPException(status_code=resp.status_code, detail=f"Batch delete request failed: {resp.text}")
-
-        responses = resp.json().get("responses", [])
-        for res in responses:
-            original_request_index = int(res["id"]) - 1 + i
-            original_file_id = file_ids[original_request_index]
-            all_results.append({
-                "id": original_file_id,
-                "status": res["status"],
-                "success": 200 <= res["status"] < 300
-            })
-
-    return all_results
+def get_onedrive_item_summary(connection: CloudConnection, db: Session, item_id: str) -> Dict[str, Any]:
+    """
+    Fetches one item's metadata. For folders, size is the total size of everything below it.
+    """
+    item_specifier = f"items/{item_id}" if item_id and item_id != "root" else "root"
+    resp = _make_graph_api_request("GET", f"{GRAPH_API_BASE_URL}/me/drive/{item_specifier}?$select={FOLDER_SELECT_FIELDS}", connection, db)
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=f"Failed to fetch item: {_graph_error_detail(resp)}")
+    return _map_folder_item(resp.json())
 
 def get_onedrive_storage_quota(connection: CloudConnection, db: Session) -> Dict[str, Any]:
     """
@@ -0,0 +1,254 @@
+"""
+Asyncio-native Microsoft Graph client built on httpx.
+
+Mirrors the blocking helpers in backend.onedrive_api so routes can await Graph calls
+instead of pinning a threadpool worker for the whole duration of a scan.
+"""
+import asyncio
+import httpx
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, List, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from backend.helpers import debug_log
+from backend.config import HTTP_TIMEOUT, ASYNC_HTTP_MAX_CONNECTIONS, ASYNC_HTTP_MAX_KEEPALIVE, ASYNC_GRAPH_CONCURRENCY
+from backend.models import CloudConnection
+from backend.onedrive_api import (
+    GRAPH_API_BASE_URL,
+    DELTA_SELECT_FIELDS,
+    _folder_children_url,
+    _map_folder_item,
+    _map_delta_file,
+    _graph_error_detail,
+    get_graph_limiter,
+    token_is_expiring,
+    ensure_fresh_onedrive_token,
+)
+from backend.rate_limiter import parse_retry_after, backoff_delay, log_throttle, should_retry, THROTTLE_STATUS_CODES
+from backend.config import THROTTLE_MAX_RETRIES
+
+# httpx clients are bound to the event loop they were created on; the application opens
+# this one on startup and closes it on shutdown (see main.py)
+_client: Optional[httpx.AsyncClient] = None
+
+async def open_async_http_client() -> httpx.AsyncClient:
+    """
+    Creates the pooled AsyncClient on the running event loop, replacing a closed one.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        limits = httpx.Limits(
+            max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ASYNC_HTTP_MAX_KEEPALIVE,
+        )
+        _client = httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT)
+    return _client
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the pooled AsyncClient opened on application startup.
+    """
+    if _client is None or _client.is_closed:
+        raise RuntimeError("The async HTTP client is not open; it is created on application startup.")
+    return _client
+
+async def close_async_http_client() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+async def _send_graph_request_async(method: str, url: str, connection: CloudConnection, headers: Dict[str, str], **kwargs: Any) -> httpx.Response:
+    """
+    Async counterpart of _send_graph_request; shares the same per-tenant/per-connection limiter.
+    """
+    limiter = get_graph_limiter(connection)
+    client = get_async_http_client()
+    for attempt in range(THROTTLE_MAX_RETRIES + 1):
+        async with limiter.slot_async():
+            resp = await client.request(method, url, headers=headers, **kwargs)
+        if resp.status_code not in THROTTLE_STATUS_CODES:
+            limiter.on_success()
+            return resp
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        delay = backoff_delay(attempt, retry_after)
+        limiter.on_throttle(delay)
+        if attempt == THROTTLE_MAX_RETRIES or not should_retry(method, resp.status_code, retry_after):
+            break
+        log_throttle("onedrive", connection.id, resp.status_code, delay, attempt)
+    return resp
+
+async def _make_graph_api_request_async(
+    method: str,
+    url: str,
+    connection: CloudConnection,
+    db: Session,
+    **kwargs: Any
+) -> httpx.Response:
+    """
+    Async counterpart of _make_graph_api_request: on 401, refresh the token and retry once.
+    Rate limiting, Retry-After handling and the single-flight token refresh (run in the
+    threadpool, since it takes a lock and commits) are shared with the blocking client.
+    """
+    if token_is_expiring(connection):
+        try:
+            await run_in_threadpool(ensure_fresh_onedrive_token, connection, db)
+        except HTTPException as e:
+            raise HTTPException(status_code=401, detail=f"Failed to refresh token: {e.detail}. Please reconnect your account.")
+
+    headers = {
+        "Authorization": f"Bearer {connection.access_token}",
+        **kwargs.pop("headers", {})
+    }
+
+    debug_log(f"Requesting async ({method}): {url}")
+    resp = await _send_graph_request_async(method, url, connection, headers, **kwargs)
+
+    if resp.status_code == 401:
+        try:
+            await run_in_threadpool(ensure_fresh_onedrive_token, connection, db, headers["Authorization"][len("Bearer "):])
+        except HTTPException as e:
+            raise HTTPException(status_code=401, detail=f"Failed to refresh token: {e.detail}. Please reconnect your account.")
+
+        debug_log("Retrying async API call with new token after refresh.")
+        headers["Authorization"] = f"Bearer {connection.access_token}"
+        resp = await _send_graph_request_async(method, url, connection, headers, **kwargs)
+
+        if resp.status_code == 401:
+            raise HTTPException(status_code=401, detail=f"Graph API 401 after refresh: {_graph_error_detail(resp)}. Please reconnect your account.")
+
+    return resp
+
+async def _fetch_folder_page_async(connection: CloudConnection, db: Session, url: str) -> Dict[str, Any]:
+    resp = await _make_graph_api_request_async("GET", url, connection, db)
+
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=f"Failed to fetch folder contents: {_graph_error_detail(resp)}")
+
+    return resp.json()
+
+async def iter_onedrive_folder_pages_async(
+    connection: CloudConnection,
+    db: Session,
+    folder_id: Optional[str] = None,
+    page_size: Optional[int] = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Async counterpart of iter_onedrive_folder_pages; the next page is fetched as a task
+    while the caller processes the current one.
+    """
+    data = await _fetch_folder_page_async(connection, db, _folder_children_url(folder_id, page_size))
+    pending = None
+    try:
+        while True:
+            next_link = data.get("@odata.nextLink")
+            if next_link:
+                pending = asyncio.ensure_future(_fetch_folder_page_async(connection, db, next_link))
+            yield [_map_folder_item(item) for item in data.get("value", [])]
+            if pending is None:
+                return
+            data = await pending
+            pending = None
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+async def get_onedrive_folder_contents_async(connection: CloudConnection, db: Session, folder_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Fetches the complete contents of a specific OneDrive folder, across all pages.
+    """
+    return [item async for page in iter_onedrive_folder_pages_async(connection, db, folder_id) for item in page]
+
+async def _get_delta_files_async(connection: CloudConnection, db: Session, folder_id: str) -> List[Dict[str, Any]]:
+    files = []
+    delta_url = f"{GRAPH_API_BASE_URL}/me/drive/items/{folder_id}/delta?select={DELTA_SELECT_FIELDS}"
+    while delta_url:
+        resp = await _make_graph_api_request_async("GET", delta_url, connection, db)
+
+        if resp.status_code != 200:
+            raise HTTPException(status_code=resp.status_code, detail=f"Failed to fetch delta changes: {_graph_error_detail(resp)}")
+
+        data = resp.json()
+        for item in data.get("value", []):
+            if item.get("file") and not item.get("deleted"):
+                files.append(_map_delta_file(item))
+        delta_url = data.get("@odata.nextLink")
+    return files
+
+async def get_all_files_recursively_async(connection: CloudConnection, db: Session, folder_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Fetches a flat list of all files from the specified folders using the delta endpoint.
+    Each root folder's delta feed is paged concurrently.
+    """
+    per_folder = await asyncio.gather(*[_get_delta_files_async(connection, db, folder_id) for folder_id in folder_ids])
+    return [f for files in per_folder for f in files]
+
+async def get_all_files_recursively_with_depth_async(
+    connection: CloudConnection,
+    db: Session,
+    folder_ids: List[str],
+    max_depth: int = 5,
+    max_concurrency: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Breadth-first walk of the given folders up to max_depth, listing up to
+    max_concurrency folders at once on the event loop. Only files are returned.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or ASYNC_GRAPH_CONCURRENCY)
+    visited = set()
+    results = []
+
+    async def _list(folder_id: str) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await get_onedrive_folder_contents_async(connection, db, folder_id)
+
+    level = []
+    for folder_id in folder_ids:
+        if folder_id not in visited:
+            visited.add(folder_id)
+            level.append(folder_id)
+
+    depth = 1
+    while level and depth <= max_depth:
+        listings = await asyncio.gather(*[_list(folder_id) for folder_id in level])
+        next_level = []
+        for items in listings:
+            for item in items:
+                if item["type"] == "file":
+                    results.append(item)
+                elif item["id"] not in visited:
+                    visited.add(item["id"])
+                    next_level.append(item["id"])
+        level = next_level
+        depth += 1
+    return results
+
+async def move_file_async(connection: CloudConnection, db: Session, file_id: str, target_folder_id: str) -> Dict[str, Any]:
+    """
+    Moves a file to a different folder.
+    """
+    move_url = f"{GRAPH_API_BASE_URL}/me/drive/items/{file_id}"
+    body = {
+        "parentReference": {
+            "id": target_folder_id
+        }
+    }
+    resp = await _make_graph_api_request_async("PATCH", move_url, connection, db, json=body)
+
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=f"Failed to move file {file_id}: {resp.text}")
+
+    return resp.json()
+
+async def delete_file_batch_async(connection: CloudConnection, db: Session, file_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Async counterpart of delete_file_batch: the same $batch packing, retries and per-item
+    results (see backend.graph_batch), with the batches sent concurrently on the event loop.
+    """
+    # Imported here: graph_batch depends on this module
+    from backend.graph_batch import batch_delete_items_async
+
+    return [
+        {"id": res["id"], "status": res["status"], "success": res["success"]}
+        for res in await batch_delete_items_async(connection, db, file_ids)
+    ]
@@ -0,0 +1,261 @@
+"""
+Throttling-aware rate limiting for provider API calls (Microsoft Graph, Google Drive).
+
+Each call passes through two token buckets, one per tenant and one per connection, and an
+AIMD concurrency window per connection. A 429/503 halves the window and pauses both
+buckets for the server's Retry-After, so every thread backs off together instead of
+hammering the provider. Successful calls grow the window back one slot at a time.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from backend.config import (
+    GRAPH_TENANT_RATE, GRAPH_TENANT_BURST, GRAPH_CONNECTION_RATE, GRAPH_CONNECTION_BURST,
+    GOOGLE_PROJECT_RATE, GOOGLE_PROJECT_BURST, GOOGLE_CONNECTION_RATE, GOOGLE_CONNECTION_BURST,
+    ADAPTIVE_CONCURRENCY_INITIAL, ADAPTIVE_CONCURRENCY_MIN, ADAPTIVE_CONCURRENCY_MAX,
+    THROTTLE_MAX_RETRIES, THROTTLE_MAX_BACKOFF,
+)
+from backend.helpers import debug_log
+
+THROTTLE_STATUS_CODES = (429, 503)
+# Safe to resend after a 503: the provider may have applied the first attempt
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+class TokenBucket:
+    """
+    Classic token bucket. ``reserve()`` takes a token immediately and returns how long the
+    caller must wait before using it, so waiting can happen outside the lock (or on an event loop).
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class AdaptiveConcurrency:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight requests.
+    Waiting threads block on a condition and waiting coroutines on an asyncio.Event set
+    from their own loop, both woken whenever a slot is released or the window grows.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._lock = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _take(self) -> bool:
+        if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def _wake(self) -> None:
+        self._lock.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+        self._async_waiters.clear()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            return self._take()
+
+    def acquire(self) -> None:
+        with self._lock:
+            while not self._take():
+                self._lock.wait()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._take():
+                    return
+                event = asyncio.Event()
+                waiter = (loop, event)
+                self._async_waiters.append(waiter)
+            try:
+                await event.wait()
+            finally:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._wake()
+
+    def on_success(self) -> None:
+        with self._lock:
+            limit = int(self._limit)
+            # One extra slot per "window" of successful calls
+            self._limit = min(self.maximum, self._limit + 1.0 / max(self._limit, 1.0))
+            if int(self._limit) > limit:
+                self._wake()
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self._limit = max(self.minimum, self._limit / 2)
+
+class ProviderLimiter:
+    """
+    Everything a single connection's calls must go through: tenant bucket, connection bucket
+    and the connection's adaptive concurrency window.
+    """
+
+    def __init__(self, tenant_bucket: TokenBucket, connection_bucket: TokenBucket, concurrency: AdaptiveConcurrency):
+        self.tenant_bucket = tenant_bucket
+        self.connection_bucket = connection_bucket
+        self.concurrency = concurrency
+        self.last_throttled_at: Optional[float] = None
+        self.throttle_count = 0
+
+    def _reserve(self) -> float:
+        return max(self.tenant_bucket.reserve(), self.connection_bucket.reserve())
+
+    @contextmanager
+    def slot(self):
+        self.concurrency.acquire()
+        try:
+            delay = self._reserve()
+            if delay > 0:
+                time.sleep(delay)
+            yield
+        finally:
+            self.concurrency.release()
+
+    @asynccontextmanager
+    async def slot_async(self):
+        await self.concurrency.acquire_async()
+        try:
+            delay = self._reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            self.concurrency.release()
+
+    def on_success(self) -> None:
+        self.concurrency.on_success()
+
+    def on_throttle(self, delay: float) -> None:
+        """Shrink the window and hold every caller sharing these buckets for ``delay`` seconds."""
+        self.concurrency.on_throttle()
+        self.tenant_bucket.pause(delay)
+        self.connection_bucket.pause(delay)
+        self.last_throttled_at = time.time()
+        self.throttle_count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": self.concurrency.limit,
+            "in_flight": self.concurrency.in_flight,
+            "throttle_count": self.throttle_count,
+            "last_throttled_at": self.last_throttled_at,
+        }
+
+_PROVIDER_SETTINGS = {
+    "onedrive": (GRAPH_TENANT_RATE, GRAPH_TENANT_BURST, GRAPH_CONNECTION_RATE, GRAPH_CONNECTION_BURST),
+    "googledrive": (GOOGLE_PROJECT_RATE, GOOGLE_PROJECT_BURST, GOOGLE_CONNECTION_RATE, GOOGLE_CONNECTION_BURST),
+}
+_tenant_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_limiters: Dict[Tuple[str, Any], ProviderLimiter] = {}
+_registry_lock = threading.Lock()
+
+def get_limiter(provider: str, tenant_key: str, connection_key: Any) -> ProviderLimiter:
+    """
+    Returns the shared limiter for a connection, creating its buckets on first use.
+    """
+    with _registry_lock:
+        limiter = _limiters.get((provider, connection_key))
+        if limiter is None:
+            tenant_rate, tenant_burst, connection_rate, connection_burst = _PROVIDER_SETTINGS[provider]
+            tenant_bucket = _tenant_buckets.get((provider, tenant_key))
+            if tenant_bucket is None:
+                tenant_bucket = TokenBucket(tenant_rate, tenant_burst)
+                _tenant_buckets[(provider, tenant_key)] = tenant_bucket
+            limiter = ProviderLimiter(
+                tenant_bucket,
+                TokenBucket(connection_rate, connection_burst),
+                AdaptiveConcurrency(ADAPTIVE_CONCURRENCY_INITIAL, ADAPTIVE_CONCURRENCY_MIN, ADAPTIVE_CONCURRENCY_MAX),
+            )
+            _limiters[(provider, connection_key)] = limiter
+        return limiter
+
+def find_limiter(provider: str, connection_key: Any) -> Optional[ProviderLimiter]:
+    return _limiters.get((provider, connection_key))
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header given either as delta-seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    How long to wait before retry number ``attempt`` (0-based). The server's Retry-After wins;
+    otherwise exponential backoff with full jitter, capped at THROTTLE_MAX_BACKOFF.
+    """
+    if retry_after is not None:
+        return min(retry_after, THROTTLE_MAX_BACKOFF)
+    return random.uniform(0, min(THROTTLE_MAX_BACKOFF, 2 ** attempt))
+
+def should_retry(method: str, status_code: int, retry_after: Optional[float], retryable: Tuple[int, ...] = THROTTLE_STATUS_CODES) -> bool:
+    """
+    Whether a response with a ``retryable`` status may be resent. Idempotent methods always
+    may; a POST or PATCH only on 429 with Retry-After, where the provider says it refused the
+    request outright, since a 5xx can arrive after the provider already applied it.
+    """
+    if status_code not in retryable:
+        return False
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    return status_code == 429 and retry_after is not None
+
+def log_throttle(provider: str, connection_key: Any, status_code: int, delay: float, attempt: int) -> None:
+    debug_log(f"{provider} throttled connection {connection_key} with {status_code}; retry {attempt + 1}/{THROTTLE_MAX_RETRIES} in {delay:.1f}s")
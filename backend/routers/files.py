@@ -1,29 +1,18 @@
-from fastapi import APIRouter, Depends, Body, Query, HTTPException, Response
+from fastapi import APIRouter, Depends, Body, Query, HTTPException, Response, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from backend.database import get_db
 from backend.auth import get_current_user
-from backend.models import User, File
-from backend.services.file_service import auto_tag_file_service, search_files_by_tags_service, cleanup_recommendations_service
-from backend.services.duplicates_service import get_duplicate_files_service, get_similar_files_service
-from datetime import datetime
-import requests
+from backend.models import User, File, FileData
+from backend.services.file_service import auto_tag_file_service, search_files_by_tags_service, cleanup_recommendations_service, delete_files_service
+from backend.services.duplicates_service import get_duplicate_files_service, get_copy_variants_service
+from backend.services.similar_files_service import get_similar_files_service
+from backend.services.file_ingest_service import upsert_files_service, ingest_files_stream_service
+from backend.services.file_download_service import proxy_file_download_service, download_cache_stats_service
 from pydantic import BaseModel
 
 router = APIRouter()
 
-class FileData(BaseModel):
-    cloud_id: str
-    name: str
-    size: Optional[int] = None
-    last_modified: Optional[str] = None
-    last_accessed: Optional[str] = None
-    provider: Optional[str] = "onedrive"
-    path: Optional[str] = None
-    tags: Optional[str] = None
-    extra: Optional[Dict[str, Any]] = None
-    url: Optional[str] = None
-
 class UpsertFilesRequest(BaseModel):
     files: List[FileData]
 
@@ -63,42 +52,49 @@ def get_tags(current_user: User = Depends(get_current_user), db: Session = Depen
     return {"tags": sorted(tag_set)}
 
 @router.get("/api/files/duplicates")
-def get_duplicate_files(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return get_duplicate_files_service(current_user, db)
+def get_duplicate_files(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: Optional[int] = Query(None, ge=1, description="Groups per page"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return get_duplicate_files_service(current_user, db, cursor, limit)
+
+@router.get("/api/files/copy-variants")
+def get_copy_variants(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: Optional[int] = Query(None, ge=1, description="Groups per page"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Same-size files whose names differ only by copy markers, case, Unicode form or extension alias"""
+    return get_copy_variants_service(current_user, db, cursor, limit)
 
 @router.get("/api/files/similar")
-def get_similar_files(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return get_similar_files_service(current_user, db)
+def get_similar_files(
+    threshold: Optional[float] = Query(None, gt=0, le=1),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Groups of files with near-identical names; threshold is the name similarity required, at least SIMILAR_NAME_THRESHOLD"""
+    return get_similar_files_service(current_user, db, threshold, cursor, limit)
 
 @router.get("/api/files/{file_id}/download")
-def proxy_file_download(file_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Proxy endpoint for downloading cached files - only for duplicate images feature"""
-    file = db.query(File).filter_by(id=file_id, user_id=current_user.id).first()
-    if not file or not file.url:
-        raise HTTPException(status_code=404, detail="File not found or no cached URL available")
-    
-    # Stream the file from the cached URL
-    try:
-        r = requests.get(file.url, stream=True, timeout=30)
-        if r.status_code != 200:
-            raise HTTPException(status_code=404, detail="Unable to fetch file from cached URL")
-        
-        # Try to detect content type from the response headers
-        content_type = r.headers.get('Content-Type', 'application/octet-stream')
-        return Response(r.content, media_type=content_type)
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail="Failed to fetch file from external source")
+async def proxy_file_download(
+    file_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Proxy endpoint for downloading cached files; streams the body and honours Range/If-None-Match"""
+    return await proxy_file_download_service(current_user, db, file_id, request)
 
-def parse_datetime(dt):
-    if not dt:
-        return None
-    if isinstance(dt, datetime):
-        return dt
-    try:
-        # Handles '2024-09-04T21:47:50Z' and similar
-        return datetime.fromisoformat(dt.replace('Z', '+00:00'))
-    except Exception:
-        return None
+@router.get("/api/files/download-cache/stats")
+def download_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit/miss counters and size of this process's download cache"""
+    return download_cache_stats_service()
 
 @router.post("/api/files/upsert")
 def upsert_files(
@@ -106,33 +102,23 @@ def upsert_files(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    for file_data in request.files:
-        db_file = db.query(File).filter_by(user_id=current_user.id, cloud_id=file_data.cloud_id).first()
-        if not db_file:
-            db_file = File()
-            db_file.user_id = current_user.id
-            db_file.cloud_id = file_data.cloud_id
-            db_file.provider = file_data.provider
-            db_file.name = file_data.name
-        db_file.name = file_data.name
-        db_file.size = file_data.size
-        parsed_modified = parse_datetime(file_data.last_modified)
-        if parsed_modified:
-            db_file.last_modified = parsed_modified
-        parsed_accessed = parse_datetime(file_data.last_accessed)
-        if parsed_accessed:
-            db_file.last_accessed = parsed_accessed
-        db_file.provider = file_data.provider
-        db_file.path = file_data.path
-        db_file.tags = file_data.tags
-        db_file.extra = file_data.extra
-        # Cache URL if provided (for performance)
-        if file_data.url:
-            db_file.url = file_data.url
-        # ... set other fields as needed ...
-        db.add(db_file)
-    db.commit()
-    return {"status": "success"}
+    """Insert or update file metadata in bulk; the response has inserted/updated counts per chunk"""
+    return upsert_files_service(current_user, db, [file_data.model_dump() for file_data in request.files])
+
+@router.post("/api/files/ingest")
+async def ingest_files(
+    request: Request,
+    ingest_id: Optional[str] = Query(None),
+    total: Optional[int] = Query(None, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Streaming variant of /api/files/upsert. The body is NDJSON (one file per line) or a stream of
+    msgpack maps / arrays of maps, and is upserted batch by batch while it uploads. Pass a UUID
+    ingest_id (and the expected total) to poll progress at /api/onedrive/jobs/{ingest_id}/status.
+    """
+    return await ingest_files_stream_service(current_user, db, request, ingest_id, total)
 
 @router.post("/api/files/delete")
 def delete_files(
@@ -140,6 +126,4 @@ def delete_files(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    deleted = db.query(File).filter(File.id.in_(request.ids), File.user_id == current_user.id).delete(synchronize_session=False)
-    db.commit()
-    return {"deleted": deleted} 
\ No newline at end of file
+    return delete_files_service(current_user, db, request.ids) 
\ No newline at end of file
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, Body
+from fastapi import APIRouter, Depends, Body, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from backend.database import get_db
 from backend.auth import get_current_user
 from backend.models import User
@@ -10,11 +10,13 @@ router = APIRouter()
 
 @router.get("/api/images/duplicates")
 def get_duplicate_images(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: Optional[int] = Query(None, ge=1, description="Groups per page"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get duplicate images with metadata (no URLs initially)"""
-    return get_duplicate_images_service(current_user, db)
+    """Get duplicate images with metadata (no URLs initially), one page of groups at a time"""
+    return get_duplicate_images_service(current_user, db, cursor, limit)
 
 @router.post("/api/images/download-urls")
 def get_image_download_urls(
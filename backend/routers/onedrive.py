@@ -1,21 +1,32 @@
-from fastapi import APIRouter, Depends, Request, Header, Body, HTTPException
+from fastapi import APIRouter, Depends, Request, Header, Body, HTTPException, Query
 from sqlalchemy.orm import Session
 from backend.services.onedrive_service import (
     start_onedrive_login,
     handle_onedrive_callback,
     get_onedrive_files_service,
+    stream_onedrive_files_service,
     get_onedrive_duplicates_service,
     smart_organise_service,
     delete_files_service,
     get_onedrive_files_recursive_service,
+    get_onedrive_files_service_async,
+    get_onedrive_files_recursive_service_async,
+    get_onedrive_duplicates_service_async,
+    delete_files_service_async,
+)
+from backend.services.scan_job_service import (
     start_onedrive_scan_job_service,
     get_scan_job_status_service,
-    SCAN_JOBS
+    get_scan_job_result_service,
+    stream_scan_job_events_service,
+    cancel_scan_job_service,
 )
+from backend.services.background_job_service import start_onedrive_job_service
+from backend.services.onedrive_sync_service import sync_onedrive_inventory_service
 from backend.database import get_db
 from typing import Optional, Dict, Any, List
 from backend.config import debug_log
-from backend.auth import get_current_user
+from backend.auth import get_current_user, get_current_user_optional
 from backend.models import User, CloudConnection
 from backend.onedrive_api import get_onedrive_storage_quota
 from pydantic import BaseModel
@@ -32,10 +43,15 @@ class DeleteFilesRequest(BaseModel):
 @router.get("/api/onedrive/files")
 def get_files(
     folder_id: Optional[str] = None,
+    stream: bool = False,
+    page_size: Optional[int] = Query(None, ge=1, le=999),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    debug_log(f"Getting OneDrive files for user {current_user.id}, folder_id: {folder_id}")
+    """List a folder; with stream=true the JSON body is written page by page as Graph returns it"""
+    debug_log(f"Getting OneDrive files for user {current_user.id}, folder_id: {folder_id}, stream: {stream}")
+    if stream:
+        return stream_onedrive_files_service(current_user, db, folder_id or "root", page_size)
     return get_onedrive_files_service(current_user, db, folder_id or "root")
 
 @router.post("/api/onedrive/duplicates")
@@ -46,8 +62,20 @@ def get_duplicates(
 ):
     folder_ids = payload.get("folder_ids", [])
     recursive = payload.get("recursive", False)
+    incremental = payload.get("incremental", False)
     debug_log(f"Getting OneDrive duplicates for user {current_user.id} in folders {folder_ids}")
-    return get_onedrive_duplicates_service(current_user, db, folder_ids, recursive)
+    return get_onedrive_duplicates_service(current_user, db, folder_ids, recursive, incremental)
+
+@router.post("/api/onedrive/sync")
+def sync_inventory(
+    payload: Dict[str, Any] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Incrementally sync the stored file inventory from OneDrive using persisted delta links"""
+    folder_ids = payload.get("folder_ids") or ["root"]
+    full = payload.get("full", False)
+    return sync_onedrive_inventory_service(current_user, db, folder_ids, full)
 
 @router.post("/api/onedrive/delete_files")
 @limiter.limit("30/minute")
@@ -104,18 +132,105 @@ def start_scan_job(
 ):
     folder_ids = payload.get("folder_ids", [])
     max_depth = payload.get("max_depth", 5)
-    return start_onedrive_scan_job_service(current_user, db, folder_ids, max_depth)
+    max_concurrency = payload.get("max_concurrency")
+    return start_onedrive_scan_job_service(current_user, db, folder_ids, max_depth, max_concurrency)
+
+@router.post("/api/onedrive/dedup_job")
+def start_dedup_job(
+    payload: Dict[str, Any] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Background variant of /api/onedrive/duplicates; poll /api/onedrive/jobs/{job_id}/status for the result"""
+    params = {
+        "folder_ids": payload.get("folder_ids", []),
+        "recursive": payload.get("recursive", False),
+        "incremental": payload.get("incremental", False),
+    }
+    return start_onedrive_job_service(current_user, db, "dedup", params)
+
+@router.post("/api/onedrive/organise_job")
+def start_organise_job(
+    options: Dict[str, Any] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Background variant of /api/onedrive/smart_organise"""
+    return start_onedrive_job_service(current_user, db, "organise", {"options": options})
 
+@router.get("/api/onedrive/jobs/{job_id}/status")
 @router.get("/api/onedrive/scan_job/{job_id}/status")
 def get_scan_job_status(job_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     return get_scan_job_status_service(current_user, db, job_id)
 
+@router.get("/api/onedrive/scan_job/{job_id}/events")
+def scan_job_events(
+    job_id: str,
+    last_event_id: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user_optional),
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events progress stream; EventSource cannot send headers, so ?token= is accepted too"""
+    return stream_scan_job_events_service(current_user, db, job_id, last_event_id)
+
+@router.get("/api/onedrive/scan_job/{job_id}/result")
+def get_scan_job_result(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=5000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Page through the files found by a finished scan job"""
+    return get_scan_job_result_service(current_user, db, job_id, offset, limit)
+
+@router.post("/api/onedrive/jobs/{job_id}/cancel")
 @router.post("/api/onedrive/scan_job/{job_id}/cancel")
 def cancel_scan_job(job_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if job_id not in SCAN_JOBS:
-        raise HTTPException(status_code=404, detail="Job not found")
-    SCAN_JOBS[job_id]["cancelled"] = True
-    return {"status": "cancelling", "job_id": job_id}
+    return cancel_scan_job_service(current_user, db, job_id)
+
+# --- Async variants: Graph calls are awaited on the event loop instead of holding a threadpool worker ---
+
+@router.get("/api/onedrive/async/files")
+async def get_files_async(
+    folder_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return await get_onedrive_files_service_async(current_user, db, folder_id or "root")
+
+@router.post("/api/onedrive/async/recursive_files")
+async def get_files_recursive_async(
+    payload: Dict[str, Any] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    folder_ids = payload.get("folder_ids", [])
+    max_depth = payload.get("max_depth", 5)
+    max_concurrency = payload.get("max_concurrency")
+    return await get_onedrive_files_recursive_service_async(current_user, db, folder_ids, max_depth, max_concurrency)
+
+@router.post("/api/onedrive/async/duplicates")
+async def get_duplicates_async(
+    payload: Dict[str, Any] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    folder_ids = payload.get("folder_ids", [])
+    recursive = payload.get("recursive", False)
+    return await get_onedrive_duplicates_service_async(current_user, db, folder_ids, recursive)
+
+@router.post("/api/onedrive/async/delete_files")
+@limiter.limit("30/minute")
+async def delete_files_async(
+    request: Request,
+    payload: DeleteFilesRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not payload.file_ids:
+        raise HTTPException(status_code=400, detail="No file_ids provided for deletion.")
+    return await delete_files_service_async(current_user, db, payload.file_ids)
 
 @router.get("/api/onedrive/storage_quota")
 def get_storage_quota(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
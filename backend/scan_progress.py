@@ -0,0 +1,120 @@
+"""
+Progress, throughput and ETA estimation for folder scans.
+
+Graph reports a folder's ``size`` as the total bytes underneath it and ``folder.childCount``
+as its direct children, so every folder waiting in the frontier carries an exact measure of
+the work left below it. The expected total is bytes already scanned plus the sizes of the
+folders still to be listed. It starts from the root folders' sizes (or the drive's quota.used)
+and shrinks towards the truth as the walk proceeds, e.g. when folders below max_depth are
+dropped. Item counts seeded from childCount serve as the fallback for trees of empty files.
+"""
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from backend.config import SCAN_STALL_SECONDS
+
+_RATE_WINDOW_SECONDS = 30.0
+
+class ScanProgressEstimator:
+    def __init__(self, max_depth: int, state: Optional[Dict[str, Any]] = None):
+        state = state or {}
+        self.max_depth = max_depth
+        self.bytes_done = state.get("bytes_done", 0)
+        self.items_done = state.get("items_done", 0)
+        # folder id -> [bytes below it, direct children], for folders still to be listed
+        self._pending: Dict[str, List[int]] = {k: list(v) for k, v in state.get("pending", {}).items()}
+        self._pending_bytes = sum(size for size, _ in self._pending.values())
+        self._pending_items = sum(count for _, count in self._pending.values())
+        self._samples = deque()
+        self._last_progress_at = time.monotonic()
+        self._sample()
+
+    def seed(self, folder_id: str, size: Optional[int], child_count: Optional[int]) -> None:
+        """Records the expected size of a folder that will be listed (roots, before the walk starts)."""
+        self._set_pending(folder_id, size or 0, child_count or 0)
+
+    def _set_pending(self, folder_id: str, size: int, child_count: int) -> None:
+        self._drop_pending(folder_id)
+        self._pending[folder_id] = [size, child_count]
+        self._pending_bytes += size
+        self._pending_items += child_count
+
+    def _drop_pending(self, folder_id: str) -> None:
+        entry = self._pending.pop(folder_id, None)
+        if entry:
+            self._pending_bytes -= entry[0]
+            self._pending_items -= entry[1]
+
+    def record_listing(self, folder_id: str, depth: int, items: List[Dict[str, Any]]) -> None:
+        """Accounts for one listed folder; its child folders become pending unless at max_depth."""
+        self._drop_pending(folder_id)
+        self.items_done += len(items)
+        for item in items:
+            if item["type"] == "file":
+                self.bytes_done += item.get("size") or 0
+            elif depth < self.max_depth:
+                self._set_pending(item["id"], item.get("size") or 0, item.get("child_count") or 0)
+        self._last_progress_at = time.monotonic()
+        self._sample()
+
+    def _sample(self) -> None:
+        now = time.monotonic()
+        self._samples.append((now, self.items_done, self.bytes_done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > _RATE_WINDOW_SECONDS:
+            self._samples.popleft()
+
+    def _rates(self):
+        if len(self._samples) < 2:
+            return 0.0, 0.0
+        (t0, items0, bytes0), (t1, items1, bytes1) = self._samples[0], self._samples[-1]
+        elapsed = max(time.monotonic(), t1) - t0
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (items1 - items0) / elapsed, (bytes1 - bytes0) / elapsed
+
+    @property
+    def progress(self) -> int:
+        expected_bytes = self.bytes_done + self._pending_bytes
+        if expected_bytes > 0:
+            fraction = self.bytes_done / expected_bytes
+        else:
+            expected_items = self.items_done + self._pending_items
+            fraction = self.items_done / expected_items if expected_items else 0.0
+        return min(99, int(100 * fraction))
+
+    def summary(self, last_throttled_at: Optional[float] = None, throttle_count: int = 0) -> Dict[str, Any]:
+        """
+        Status fields for the job. ``state`` is "throttled" when the provider has been throttling
+        us recently, "stalled" when nothing has completed for SCAN_STALL_SECONDS for any other
+        reason, and "running" otherwise.
+        """
+        items_per_second, bytes_per_second = self._rates()
+        if bytes_per_second > 0 and self._pending_bytes:
+            eta = self._pending_bytes / bytes_per_second
+        elif items_per_second > 0 and self._pending_items:
+            eta = self._pending_items / items_per_second
+        else:
+            eta = None
+        idle = time.monotonic() - self._last_progress_at
+        recently_throttled = last_throttled_at is not None and time.time() - last_throttled_at < SCAN_STALL_SECONDS
+        if recently_throttled:
+            state = "throttled"
+        elif idle >= SCAN_STALL_SECONDS:
+            state = "stalled"
+        else:
+            state = "running"
+        return {
+            "state": state,
+            "items_per_second": round(items_per_second, 1),
+            "bytes_per_second": int(bytes_per_second),
+            "eta_seconds": int(eta) if eta is not None else None,
+            "bytes_scanned": self.bytes_done,
+            "expected_bytes": self.bytes_done + self._pending_bytes,
+            "items_scanned": self.items_done,
+            "expected_items": self.items_done + self._pending_items,
+            "seconds_since_progress": int(idle),
+            "throttle_count": throttle_count,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"bytes_done": self.bytes_done, "items_done": self.items_done, "pending": dict(self._pending)}
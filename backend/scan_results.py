@@ -0,0 +1,127 @@
+"""
+On-disk storage for scan job results.
+
+A running scan appends the files it finds to ``<job_id>.msgpack.partial`` as a stream of
+msgpack objects instead of holding them in memory; the byte offset written so far is part
+of the job checkpoint, so a resumed scan truncates the spool back to it and carries on.
+Finished result files are read a page at a time and evicted least-recently-read first once
+the directory grows past SCAN_RESULT_MAX_BYTES.
+"""
+import os
+import msgpack
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from backend.config import SCAN_RESULT_DIR, SCAN_RESULT_MAX_BYTES
+from backend.helpers import debug_log
+
+RESULT_SUFFIX = ".msgpack"
+PARTIAL_SUFFIX = ".msgpack.partial"
+
+def _ensure_dir() -> None:
+    os.makedirs(SCAN_RESULT_DIR, exist_ok=True)
+
+def result_path(job_id: str) -> str:
+    return os.path.join(SCAN_RESULT_DIR, f"{job_id}{RESULT_SUFFIX}")
+
+def spool_path(job_id: str) -> str:
+    return os.path.join(SCAN_RESULT_DIR, f"{job_id}{PARTIAL_SUFFIX}")
+
+class ScanResultWriter:
+    """
+    Appends result items to a job's spool file. ``offset`` is the checkpointed size of the
+    spool; anything written after it (by a worker that died before checkpointing) is discarded.
+    """
+
+    def __init__(self, job_id: str, offset: int = 0, count: int = 0):
+        _ensure_dir()
+        self.job_id = job_id
+        self.path = spool_path(job_id)
+        self.count = count
+        self.restored = offset > 0 and os.path.exists(self.path) and os.path.getsize(self.path) >= offset
+        if not self.restored:
+            offset = 0
+            self.count = 0
+        self._file = open(self.path, "r+b" if self.restored else "wb")
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self._packer = msgpack.Packer()
+
+    def write(self, items: Iterable[Dict[str, Any]]) -> None:
+        for item in items:
+            self._file.write(self._packer.pack(item))
+            self.count += 1
+
+    def flush(self) -> Tuple[int, int]:
+        """Flushes to disk and returns (offset, count) for the checkpoint."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell(), self.count
+
+    def finish(self) -> str:
+        self.flush()
+        self._file.close()
+        final_path = result_path(self.job_id)
+        os.replace(self.path, final_path)
+        return final_path
+
+    def close(self) -> Tuple[int, int]:
+        """Flushes and closes the spool, keeping it for the job's next run."""
+        position = self.flush()
+        self._file.close()
+        return position
+
+    def discard(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        delete_result(self.path)
+
+def read_result_page(path: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+    """Returns items [offset, offset + limit) without unpacking the rest of the file into memory."""
+    items = []
+    with open(path, "rb") as f:
+        unpacker = msgpack.Unpacker(f, raw=False)
+        for _ in range(offset):
+            try:
+                unpacker.skip()
+            except msgpack.OutOfData:
+                return items
+        for item in unpacker:
+            items.append(item)
+            if len(items) >= limit:
+                break
+    # Reading counts as a use for LRU eviction
+    os.utime(path)
+    return items
+
+def read_all(path: str) -> List[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        return list(msgpack.Unpacker(f, raw=False))
+
+def delete_result(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def enforce_disk_budget() -> int:
+    """
+    Deletes finished result files, least recently read first, until the directory fits in
+    SCAN_RESULT_MAX_BYTES. Spools of running jobs are never evicted. Returns files removed.
+    """
+    if not os.path.isdir(SCAN_RESULT_DIR):
+        return 0
+    entries = []
+    total = 0
+    for name in os.listdir(SCAN_RESULT_DIR):
+        path = os.path.join(SCAN_RESULT_DIR, name)
+        stat = os.stat(path)
+        total += stat.st_size
+        if name.endswith(RESULT_SUFFIX):
+            entries.append((stat.st_mtime, stat.st_size, path))
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= SCAN_RESULT_MAX_BYTES:
+            break
+        delete_result(path)
+        total -= size
+        removed += 1
+    if removed:
+        debug_log(f"Evicted {removed} scan result files to stay under {SCAN_RESULT_MAX_BYTES} bytes")
+    return removed
@@ -0,0 +1,212 @@
+from backend.models import BackgroundJob, User
+from backend.services.onedrive_service import get_active_onedrive_connection, get_onedrive_duplicates_service, smart_organise_service
+from backend.services.scan_job_service import (
+    ACTIVE_STATUSES, RESULT_ITEMS, WORKER_ID, enqueue_job, run_claimed_scan_job, _keep_alive, _now, _plan_limits, _touch_job,
+)
+from backend.job_scheduler import get_scheduler
+from backend.scan_results import ScanResultWriter
+from backend.config import SCAN_JOB_STALE_SECONDS, SCAN_RESULT_INLINE_LIMIT, SCAN_RESULT_TTL_SECONDS, WORKER_PROCESSES
+from backend.helpers import debug_log
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Session
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+
+# pg_advisory_xact_lock(namespace, user_id) held while a worker checks a user's job limit and claims
+CLAIM_LOCK_NAMESPACE = 25
+
+def _run_dedup(user: User, db: Session, params: Dict[str, Any]):
+    return get_onedrive_duplicates_service(
+        user, db, params.get("folder_ids", []), params.get("recursive", False), params.get("incremental", False)
+    )
+
+def _run_organise(user: User, db: Session, params: Dict[str, Any]):
+    return smart_organise_service(user, db, params.get("options", {}))
+
+# Jobs that wrap one synchronous service call; their result is stored like a scan's (see _store_result).
+SERVICE_JOBS: Dict[str, Callable[[User, Session, Dict[str, Any]], Any]] = {
+    "dedup": _run_dedup,
+    "organise": _run_organise,
+}
+JOB_TYPES = ("scan",) + tuple(SERVICE_JOBS)
+
+def start_onedrive_job_service(current_user: User, db: Session, job_type: str, params: Dict[str, Any]):
+    """Queues a duplicate search or smart organise run as a background job. Returns a job_id."""
+    if job_type not in SERVICE_JOBS:
+        raise HTTPException(status_code=400, detail=f"Unknown job type: {job_type}")
+    connection = get_active_onedrive_connection(current_user, db)
+    if not connection:
+        raise HTTPException(status_code=404, detail="Active OneDrive connection not found.")
+    job = BackgroundJob()
+    job.user_id = current_user.id
+    job.connection_id = connection.id
+    job.job_type = job_type
+    job.status = "pending"
+    job.params = params
+    enqueue_job(db, job)
+    return {"job_id": job.id}
+
+def schedule_service_job(job: BackgroundJob, db: Session) -> None:
+    """Runs a service job on this process's scheduler (inline mode)."""
+    job_id = job.id
+    bind = db.get_bind()
+    plan, limits = _plan_limits(db, job.user_id)
+    get_scheduler().submit(
+        job_id,
+        job.user_id,
+        lambda: run_service_job(job_id, bind),
+        plan=plan,
+        limits=limits,
+        interactive=True,
+        heartbeat=lambda: _touch_job(bind, job_id),
+    )
+
+def _store_result(job: BackgroundJob, result: Any) -> None:
+    """
+    Up to SCAN_RESULT_INLINE_LIMIT items of the result's list (RESULT_ITEMS) stay on the job
+    row; a longer list is spooled to disk like a large scan result and paged from
+    /scan_job/{job_id}/result, with only the summary left on the row.
+    """
+    job.expires_at = _now() + timedelta(seconds=SCAN_RESULT_TTL_SECONDS)
+    key = RESULT_ITEMS.get(job.job_type)
+    items = result.get(key) if isinstance(result, dict) else None
+    if not isinstance(items, list):
+        job.result = result
+        return
+    job.result_count = len(items)
+    if len(items) <= SCAN_RESULT_INLINE_LIMIT:
+        job.result = result
+        return
+    writer = ScanResultWriter(job.id)
+    writer.write(items)
+    job.result_path = writer.finish()
+    job.result = {**result, key: None}
+
+def run_service_job(job_id: str, bind) -> None:
+    db = Session(bind=bind)
+    stop = threading.Event()
+    try:
+        job = db.query(BackgroundJob).get(job_id)
+        if job is None:
+            return
+        if job.cancelled:
+            job.status = "cancelled"
+            job.error = "Job was cancelled by user."
+            job.finished_at = _now()
+            db.commit()
+            return
+        user = db.query(User).get(job.user_id)
+        job.status = "running"
+        job.worker_id = WORKER_ID
+        job.heartbeat_at = _now()
+        db.commit()
+        threading.Thread(target=_keep_alive, args=(bind, job_id, stop), daemon=True).start()
+
+        result = SERVICE_JOBS[job.job_type](user, db, job.params or {})
+
+        job = db.query(BackgroundJob).get(job_id)
+        _store_result(job, jsonable_encoder(result))
+        job.status = "complete"
+        job.progress = 100
+        job.finished_at = _now()
+        db.commit()
+    except Exception as e:
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        debug_log(f"Background job {job_id} failed: {error}")
+        db.rollback()
+        job = db.query(BackgroundJob).get(job_id)
+        if job is not None:
+            job.status = "error"
+            job.error = str(error)
+            job.finished_at = _now()
+            db.commit()
+    finally:
+        stop.set()
+        db.close()
+
+def _held_jobs(db: Session, cutoff, user_id: Optional[int] = None) -> Dict[int, int]:
+    """Jobs per user that a live worker has claimed and is heartbeating, running or about to."""
+    query = db.query(BackgroundJob.user_id, func.count(BackgroundJob.id)).filter(
+        BackgroundJob.status.in_(ACTIVE_STATUSES),
+        BackgroundJob.worker_id.isnot(None),
+        BackgroundJob.heartbeat_at >= cutoff,
+    )
+    if user_id is not None:
+        query = query.filter(BackgroundJob.user_id == user_id)
+    return dict(query.group_by(BackgroundJob.user_id).all())
+
+def _at_user_limit(count: int, limits: Dict[str, Any]) -> bool:
+    user_limit = limits.get("concurrent_scans", 1)
+    return user_limit != -1 and count >= user_limit
+
+def _plan_cap(limits: Dict[str, Any]) -> int:
+    # As JobScheduler._plan_cap, over the worker processes of one `python -m backend.worker`
+    return max(1, int(WORKER_PROCESSES * limits.get("scan_pool_share", 1.0)))
+
+def lock_user_claims(db: Session, user_id: int) -> None:
+    """Serialises claims of one user's jobs until the transaction ends (PostgreSQL only)."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"), {"namespace": CLAIM_LOCK_NAMESPACE, "user_id": user_id})
+
+def claim_next_job(db: Session, job_types: List[str] = JOB_TYPES) -> Optional[Tuple[str, str]]:
+    """
+    Claims the highest-priority job that is waiting, or whose worker stopped heartbeating,
+    and returns (job_id, job_type). SKIP LOCKED keeps concurrent workers from queueing on the
+    same row on PostgreSQL; the conditional UPDATE is what guarantees a single owner.
+
+    The plan limits JobScheduler applies inline hold here too: a user's jobs are skipped while
+    live workers hold ``concurrent_scans`` of them, and a plan's jobs while its tier holds its
+    ``scan_pool_share`` of WORKER_PROCESSES. The per-user count is rechecked under a per-user
+    lock; the per-plan one is a best-effort cap, and counts one worker host's pool.
+    """
+    cutoff = _now() - timedelta(seconds=SCAN_JOB_STALE_SECONDS)
+    claimable = (
+        BackgroundJob.job_type.in_(job_types),
+        BackgroundJob.status.in_(ACTIVE_STATUSES),
+        or_(BackgroundJob.worker_id.is_(None), BackgroundJob.heartbeat_at.is_(None), BackgroundJob.heartbeat_at < cutoff),
+    )
+    held = _held_jobs(db, cutoff)
+    plans = {user_id: _plan_limits(db, user_id) for user_id in held}
+    held_per_plan: Dict[str, int] = {}
+    for user_id, count in held.items():
+        held_per_plan[plans[user_id][0]] = held_per_plan.get(plans[user_id][0], 0) + count
+    skipped = {user_id for user_id, count in held.items() if _at_user_limit(count, plans[user_id][1])}
+
+    while True:
+        query = db.query(BackgroundJob.id, BackgroundJob.job_type, BackgroundJob.user_id).filter(*claimable)
+        if skipped:
+            query = query.filter(BackgroundJob.user_id.notin_(skipped))
+        candidate = query.order_by(
+            BackgroundJob.priority.desc(), BackgroundJob.created_at
+        ).with_for_update(skip_locked=True).first()
+        if candidate is None:
+            db.commit()
+            return None
+        plan, limits = plans.get(candidate.user_id) or _plan_limits(db, candidate.user_id)
+        if held_per_plan.get(plan, 0) >= _plan_cap(limits):
+            skipped.add(candidate.user_id)
+            continue
+        lock_user_claims(db, candidate.user_id)
+        if _at_user_limit(_held_jobs(db, cutoff, candidate.user_id).get(candidate.user_id, 0), limits):
+            # Another worker claimed one of this user's jobs since the counts above
+            skipped.add(candidate.user_id)
+            continue
+        break
+
+    claimed = db.query(BackgroundJob).filter(BackgroundJob.id == candidate.id, *claimable).update(
+        {BackgroundJob.worker_id: WORKER_ID, BackgroundJob.heartbeat_at: _now()}, synchronize_session=False
+    )
+    db.commit()
+    return (candidate.id, candidate.job_type) if claimed == 1 else None
+
+def run_job(job_id: str, job_type: str, bind) -> None:
+    """Runs a claimed job to completion (or until a shutdown makes a scan yield)."""
+    if job_type == "scan":
+        run_claimed_scan_job(job_id, bind)
+    elif job_type in SERVICE_JOBS:
+        run_service_job(job_id, bind)
+    else:
+        debug_log(f"Skipping job {job_id} of unknown type {job_type}")
@@ -0,0 +1,226 @@
+"""
+Persistent, incrementally maintained index of duplicate groups (models.DuplicateGroup).
+
+Every file gets a duplicate key: its content hash when the provider gave one, otherwise its
+name and size (empty files have none). File.dup_key stores a digest of that key. Whenever
+files are written (/api/files/upsert and /api/files/ingest, deletes, OneDrive delta syncs)
+the writer calls reindex_files() or refresh_duplicate_groups(), which recount only the keys
+those files left or joined, through idx_file_user_dup_key. A group row exists while its key
+has at least two live files and carries the member count, wasted bytes, image count and
+per-provider counts, so the duplicate endpoints read one page of groups plus their members
+instead of regrouping a user's whole inventory. reindex_files() also keeps File.name_stem
+and the near-duplicate name index current (see similar_files_service).
+
+Groups are recounted in SQL and written with INSERT ... ON CONFLICT DO UPDATE, so concurrent
+writers (a sync, an ingest and an upsert for the same user) never collide on
+uq_duplicate_group_user_key. On PostgreSQL a transaction-scoped advisory lock per user
+serialises the recounts, so the last writer always counts the other writers' committed
+files; SQLite serialises writers on its own. Files stored before the index existed are
+indexed by the d8e2a5c7f314 migration.
+"""
+from backend.models import DuplicateGroup, File
+from backend.helpers import IMAGE_EXTENSIONS, is_image_name
+from backend.config import DUPLICATE_PAGE_SIZE, DUPLICATE_MAX_PAGE_SIZE
+from backend.services.duplicates_service import encode_cursor, decode_cursor
+from backend.services.similar_files_service import index_name_stems, normalize_name
+from sqlalchemy import and_, bindparam, case, delete, func, literal, or_, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import hashlib
+
+KEY_CHUNK_SIZE = 500
+# pg_advisory_xact_lock(namespace, user_id) held while a user's groups are recounted
+GROUP_LOCK_NAMESPACE = 23
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+_JSON_OBJECT_AGG = {"sqlite": func.json_group_object, "postgresql": func.json_object_agg}
+RECOUNTED_COLUMNS = (
+    "user_id", "dup_key", "key_type", "name", "size", "hash",
+    "member_count", "image_count", "provider_count", "providers", "wasted_bytes",
+)
+
+def duplicate_key(name: Optional[str], size: Optional[int], content_hash: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Returns (dup_key, key_type); dup_key is "" for files that can never be duplicates."""
+    if not size or size <= 0:
+        return "", None
+    if content_hash:
+        raw, key_type = f"hash\0{size}\0{content_hash}", "hash"
+    elif name:
+        raw, key_type = f"name_size\0{size}\0{name}", "name_size"
+    else:
+        return "", None
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest(), key_type
+
+def _chunks(values: Sequence[str], size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def duplicate_keys_of(db: Session, user_id: int, *criteria) -> Set[str]:
+    """Keys of the matching files; call before deleting them, then refresh those keys."""
+    rows = db.query(File.dup_key).filter(File.user_id == user_id, File.dup_key.isnot(None), File.dup_key != "", *criteria).distinct()
+    return {dup_key for dup_key, in rows}
+
+def lock_user_groups(db: Session, user_id: int) -> None:
+    """Serialises recounts of one user's groups until the transaction ends (PostgreSQL only)."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"), {"namespace": GROUP_LOCK_NAMESPACE, "user_id": user_id})
+
+def _live_members(user_id: int, keys: Sequence[str]) -> List[Any]:
+    return [File.user_id == user_id, File.dup_key.in_(keys), File.is_deleted.isnot(True)]
+
+def _recount_statement(insert, json_object_agg, user_id: int, keys: Sequence[str]):
+    """INSERT ... SELECT of the keys' group rows, recounted from files, updating existing rows."""
+    is_image = or_(*[func.lower(File.name).like(f"%{ext}") for ext in sorted(IMAGE_EXTENSIONS)])
+    per_provider = select(
+        File.dup_key.label("dup_key"),
+        File.provider.label("provider"),
+        func.count(File.id).label("members"),
+        func.sum(case((is_image, 1), else_=0)).label("images"),
+        func.min(File.name).label("name"),
+        func.max(File.size).label("size"),
+        func.max(File.hash).label("hash"),
+    ).where(*_live_members(user_id, keys)).group_by(File.dup_key, File.provider).subquery()
+    members = func.sum(per_provider.c.members)
+    size = func.max(per_provider.c.size)
+    content_hash = func.max(per_provider.c.hash)
+    recounted = select(
+        literal(user_id),
+        per_provider.c.dup_key,
+        case((content_hash.isnot(None), "hash"), else_="name_size"),
+        func.min(per_provider.c.name),
+        size,
+        content_hash,
+        members,
+        func.sum(per_provider.c.images),
+        func.count(per_provider.c.provider),
+        json_object_agg(per_provider.c.provider, per_provider.c.members),
+        size * (members - 1),
+    ).group_by(per_provider.c.dup_key).having(members > 1)
+    stmt = insert(DuplicateGroup.__table__).from_select(list(RECOUNTED_COLUMNS), recounted)
+    updates = {name: stmt.excluded[name] for name in RECOUNTED_COLUMNS if name not in ("user_id", "dup_key")}
+    updates["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=["user_id", "dup_key"], set_=updates)
+
+def _recount_in_python(db: Session, user_id: int, keys: Sequence[str]) -> None:
+    # Databases without ON CONFLICT: recount in Python with the group rows locked
+    stats: Dict[str, Dict[str, Any]] = {}
+    members = db.query(File.dup_key, File.name, File.size, File.hash, File.provider).filter(*_live_members(user_id, keys))
+    for dup_key, name, size, content_hash, provider in members:
+        entry = stats.setdefault(dup_key, {"name": name, "size": size, "hash": content_hash, "count": 0, "images": 0, "providers": {}})
+        entry["count"] += 1
+        entry["images"] += is_image_name(name)
+        entry["providers"][provider] = entry["providers"].get(provider, 0) + 1
+
+    groups = {
+        g.dup_key: g
+        for g in db.query(DuplicateGroup).filter(DuplicateGroup.user_id == user_id, DuplicateGroup.dup_key.in_(keys)).with_for_update()
+    }
+    for dup_key, entry in stats.items():
+        if entry["count"] < 2:
+            continue
+        group = groups.get(dup_key)
+        if group is None:
+            group = DuplicateGroup(user_id=user_id, dup_key=dup_key)
+            db.add(group)
+        group.key_type = "hash" if entry["hash"] else "name_size"
+        group.name = entry["name"]
+        group.size = entry["size"]
+        group.hash = entry["hash"]
+        group.member_count = entry["count"]
+        group.image_count = entry["images"]
+        group.providers = entry["providers"]
+        group.provider_count = len(entry["providers"])
+        group.wasted_bytes = entry["size"] * (entry["count"] - 1)
+    db.flush()
+
+def refresh_duplicate_groups(db: Session, user_id: int, keys: Iterable[str]) -> None:
+    """Recounts the given keys from their live files, creating, updating or dropping group rows."""
+    keys = sorted(key for key in set(keys) if key)
+    if not keys:
+        return
+    db.flush()
+    lock_user_groups(db, user_id)
+    dialect_name = db.get_bind().dialect.name
+    insert = _INSERTS.get(dialect_name)
+    groups = DuplicateGroup.__table__
+    for chunk in _chunks(keys, KEY_CHUNK_SIZE):
+        still_grouped = select(File.dup_key).where(*_live_members(user_id, chunk)).group_by(File.dup_key).having(func.count(File.id) > 1)
+        db.execute(delete(groups).where(groups.c.user_id == user_id, groups.c.dup_key.in_(chunk), groups.c.dup_key.notin_(still_grouped)))
+        if insert is not None:
+            db.execute(_recount_statement(insert, _JSON_OBJECT_AGG[dialect_name], user_id, chunk))
+        else:
+            _recount_in_python(db, user_id, chunk)
+    # Group rows loaded earlier in this session are stale now
+    for group in [obj for obj in db.identity_map.values() if isinstance(obj, DuplicateGroup)]:
+        db.expire(group)
+
+def reindex_files(db: Session, user_id: int, *criteria) -> int:
+    """
+    Recomputes dup_key and name_stem for the matching files (call after writing them, before
+    commit), refreshes every group they left or joined and indexes their name stems. Returns
+    the number of duplicate keys that changed.
+    """
+    affected = set()
+    stems = set()
+    changes = []
+    changed_keys = 0
+    for file_id, name, size, content_hash, stored, stored_stem in db.query(
+        File.id, File.name, File.size, File.hash, File.dup_key, File.name_stem
+    ).filter(File.user_id == user_id, *criteria):
+        dup_key, _ = duplicate_key(name, size, content_hash)
+        stem = normalize_name(name)
+        affected.update(key for key in (stored, dup_key) if key)
+        stems.add(stem)
+        changed_keys += dup_key != stored
+        if dup_key != stored or stem != stored_stem:
+            changes.append({"file_id": file_id, "new_dup_key": dup_key, "new_name_stem": stem})
+    if changes:
+        files = File.__table__
+        db.execute(files.update().where(files.c.id == bindparam("file_id")).values(
+            dup_key=bindparam("new_dup_key"), name_stem=bindparam("new_name_stem")
+        ), changes)
+    refresh_duplicate_groups(db, user_id, affected)
+    index_name_stems(db, user_id, stems)
+    return changed_keys
+
+def indexed_duplicate_page(
+    db: Session,
+    user_id: int,
+    filters: Sequence[Any] = (),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[Tuple[DuplicateGroup, List[File]]], Optional[str]]:
+    """
+    One page of the user's duplicate groups, most wasted bytes first, with their live member
+    files. ``filters`` are extra DuplicateGroup criteria. Returns (groups, next_cursor).
+    """
+    limit = max(1, min(limit or DUPLICATE_PAGE_SIZE, DUPLICATE_MAX_PAGE_SIZE))
+    criteria = [DuplicateGroup.user_id == user_id] + list(filters)
+    after = decode_cursor(cursor, int, int)
+    if after:
+        criteria.append(or_(
+            DuplicateGroup.wasted_bytes < after[0],
+            and_(DuplicateGroup.wasted_bytes == after[0], DuplicateGroup.id < after[1]),
+        ))
+    groups = db.query(DuplicateGroup).filter(*criteria).order_by(
+        DuplicateGroup.wasted_bytes.desc(), DuplicateGroup.id.desc()
+    ).limit(limit + 1).all()
+    next_cursor = encode_cursor(groups[limit - 1].wasted_bytes, groups[limit - 1].id) if len(groups) > limit else None
+    groups = groups[:limit]
+    members: Dict[str, List[File]] = {}
+    if groups:
+        for f in db.query(File).filter(
+            File.user_id == user_id, File.dup_key.in_([g.dup_key for g in groups]), File.is_deleted.isnot(True)
+        ).order_by(File.id):
+            members.setdefault(f.dup_key, []).append(f)
+    return [(group, members.get(group.dup_key, [])) for group in groups], next_cursor
+
+def group_summary(group: DuplicateGroup) -> Dict[str, Any]:
+    return {
+        "key_type": group.key_type,
+        "hash": group.hash,
+        "size": group.size,
+        "member_count": group.member_count,
+        "wasted_bytes": group.wasted_bytes,
+        "providers": group.providers,
+    }
@@ -1,56 +1,234 @@
+"""
+Duplicate detection done by the database.
+
+Exact duplicates share (size, content hash) and are found through idx_file_user_size_hash.
+Copies held by different providers are matched on an algorithm both providers report
+(cross_provider_hash_groups), since File.hash is quickXorHash for OneDrive and md5 for Drive.
+Name duplicates share (name, size): duplicate_groups_page() runs GROUP BY name, size
+HAVING count(*) > 1 over idx_file_user_name_size and returns the groups a page at a time,
+keyset-paginated in (name, size) order, so each request reads one page worth of index
+entries and rows instead of every File a user owns. duplicate_totals() aggregates the
+same grouping without loading any rows.
+
+Copy variants ("report.docx", "Copy of report (1).docx") share (normalized_name, size);
+copy_variant_groups_page() groups them the same way over idx_file_user_normalized_name_size.
+
+The per-user duplicate endpoints read the precomputed groups kept by
+backend.services.duplicate_index_service instead.
+"""
 from backend.models import File, User, CloudConnection
+from backend.config import DUPLICATE_PAGE_SIZE, DUPLICATE_MAX_PAGE_SIZE
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
-from collections import defaultdict
-
-def get_duplicate_files_service(current_user: User, db: Session):
-    files = db.query(File).filter_by(user_id=current_user.id).all()
-    groups = defaultdict(list)
-    for f in files:
-        key = (f.name, f.size)
-        file_dict = {
-            "id": f.id, 
-            "name": f.name, 
-            "size": f.size, 
-            "provider": f.provider, 
-            "cloud_id": f.cloud_id,
-            "path": getattr(f, 'path', None),
-            "last_modified": f.last_modified.isoformat() if f.last_modified else None
-        }
-        groups[key].append(file_dict)
-    duplicates = [group for group in groups.values() if len(group) > 1]
-    return {"duplicates": duplicates}
-
-def get_similar_files_service(current_user: User, db: Session):
-    files = db.query(File).filter_by(user_id=current_user.id).all()
-    similar_groups = []
-    used = set()
-    for i, f1 in enumerate(files):
-        if f1.id in used:
-            continue
-        group = [{
-            "id": f1.id,
-            "name": f1.name,
-            "size": f1.size,
-            "path": f1.path,
-            "provider": f1.provider,
-            "last_modified": f1.last_modified.isoformat() if f1.last_modified else None
-        }]
-        for f2 in files[i+1:]:
-            if f2.id in used:
-                continue
-            # Simple similarity: substring in name
-            if f1.name != f2.name and (f1.name in f2.name or f2.name in f1.name):
-                group.append({
-                    "id": f2.id,
-                    "name": f2.name,
-                    "size": f2.size,
-                    "path": f2.path,
-                    "provider": f2.provider,
-                    "last_modified": f2.last_modified.isoformat() if f2.last_modified else None
-                })
-                used.add(f2.id)
-        if len(group) > 1:
-            similar_groups.append(group)
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import base64
+import json
+
+def _live_files(user_ids: Sequence[int]) -> list:
+    return [File.user_id.in_(list(user_ids)), File.is_deleted.isnot(True)]
+
+def hash_duplicate_groups(db: Session, user_id: int, provider: Optional[str] = None) -> List[List[File]]:
+    """
+    Groups of a user's non-empty files that share size and content hash, largest files first.
+    Both steps are served by idx_file_user_size_hash: the GROUP BY ... HAVING count(*) > 1
+    finds the groups, and the join back fetches only their members.
+    """
+    filters = _live_files([user_id]) + [File.hash.isnot(None), File.size > 0]
+    if provider:
+        filters.append(File.provider == provider)
+    groups = db.query(File.size.label("size"), File.hash.label("hash")).filter(*filters).group_by(
+        File.size, File.hash
+    ).having(func.count(File.id) > 1).subquery()
+    members = db.query(File).join(groups, and_(File.size == groups.c.size, File.hash == groups.c.hash)).filter(
+        *filters
+    ).order_by(File.size.desc(), File.hash, File.id)
+    return [list(group) for _, group in groupby(members, key=lambda f: (f.size, f.hash))]
+
+# Digests more than one provider reports: Graph sha1Hash/sha256Hash (OneDrive personal) and
+# Drive sha1Checksum/sha256Checksum/md5Checksum. OneDrive for Business only has quickXorHash.
+SHARED_HASH_COLUMNS = ("sha256_hash", "sha1_hash", "md5_hash")
+
+def cross_provider_hash_groups(db: Session, user_id: int) -> List[Tuple[str, List[File]]]:
+    """
+    Groups of a user's files whose content is stored by two or more providers: same size and
+    the same digest in one of SHARED_HASH_COLUMNS. Each algorithm is grouped through its
+    idx_file_user_size_<algorithm> index, and files matched under several algorithms end up
+    in one group. Returns (digest, files) pairs, largest files first.
+    """
+    filters = _live_files([user_id]) + [File.size > 0]
+    files: Dict[int, File] = {}
+    digests: Dict[int, str] = {}
+    parent: Dict[int, int] = {}
+
+    def find(file_id: int) -> int:
+        while parent[file_id] != file_id:
+            parent[file_id] = parent[parent[file_id]]
+            file_id = parent[file_id]
+        return file_id
+
+    for column_name in SHARED_HASH_COLUMNS:
+        column = getattr(File, column_name)
+        groups = db.query(File.size.label("size"), column.label("digest")).filter(*filters, column.isnot(None)).group_by(
+            File.size, column
+        ).having(func.count(func.distinct(File.provider)) > 1).subquery()
+        members = db.query(File).join(groups, and_(File.size == groups.c.size, column == groups.c.digest)).filter(
+            *filters
+        ).order_by(File.size, column, File.id)
+        for digest, group in groupby(members, key=lambda f: getattr(f, column_name)):
+            root = None
             for f in group:
-                used.add(f["id"])
-    return {"similar": similar_groups} 
\ No newline at end of file
+                files[f.id] = f
+                parent.setdefault(f.id, f.id)
+                if root is None:
+                    root = find(f.id)
+                    digests.setdefault(root, digest)
+                else:
+                    other = find(f.id)
+                    if other != root:
+                        parent[other] = root
+                        digests.setdefault(root, digests.get(other, digest))
+
+    grouped: Dict[int, List[File]] = {}
+    for file_id in sorted(files):
+        grouped.setdefault(find(file_id), []).append(files[file_id])
+    return sorted(((digests[root], members) for root, members in grouped.items()), key=lambda item: (-item[1][0].size, item[0]))
+
+def encode_cursor(*values: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+def decode_cursor(cursor: Optional[str], *types: type) -> Optional[Tuple[Any, ...]]:
+    """Parses a cursor made by encode_cursor back into values of the given types."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(cast(value) for cast, value in zip(types, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _name_size_filters(user_ids: Sequence[int], filters: Sequence[Any]) -> list:
+    return _live_files(user_ids) + [File.size.isnot(None)] + list(filters)
+
+def duplicate_groups_page(
+    db: Session,
+    user_ids: Sequence[int],
+    filters: Sequence[Any] = (),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[List[File]], Optional[str]]:
+    """
+    One page of (name, size) duplicate groups among the given users' files, after ``cursor``.
+    ``filters`` are extra File criteria (e.g. image extensions). Returns (groups, next_cursor);
+    next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit or DUPLICATE_PAGE_SIZE, DUPLICATE_MAX_PAGE_SIZE))
+    criteria = _name_size_filters(user_ids, filters)
+    after = decode_cursor(cursor, str, int)
+    if after:
+        criteria.append(or_(File.name > after[0], and_(File.name == after[0], File.size > after[1])))
+    keys = db.query(File.name, File.size).filter(*criteria).group_by(File.name, File.size).having(
+        func.count(File.id) > 1
+    ).order_by(File.name, File.size).limit(limit + 1).all()
+    next_cursor = encode_cursor(*keys[limit - 1]) if len(keys) > limit else None
+    keys = keys[:limit]
+    if not keys:
+        return [], None
+    # name IN (...) is an index seek per name; an OR of (name, size) pairs would scan the user's files
+    wanted = {(name, size) for name, size in keys}
+    members = db.query(File).filter(
+        *_name_size_filters(user_ids, filters),
+        File.name.in_({name for name, _ in keys})
+    ).order_by(File.name, File.size, File.id)
+    members = (f for f in members if (f.name, f.size) in wanted)
+    return [list(group) for _, group in groupby(members, key=lambda f: (f.name, f.size))], next_cursor
+
+def duplicate_totals(db: Session, user_ids: Sequence[int], filters: Sequence[Any] = ()) -> Dict[str, int]:
+    """Number of (name, size) duplicate groups, redundant copies and their bytes, computed in SQL."""
+    grouped = db.query(File.size.label("size"), func.count(File.id).label("copies")).filter(
+        *_name_size_filters(user_ids, filters)
+    ).group_by(File.name, File.size).having(func.count(File.id) > 1).subquery()
+    groups, copies, size = db.query(
+        func.count(),
+        func.coalesce(func.sum(grouped.c.copies - 1), 0),
+        func.coalesce(func.sum(grouped.c.size * (grouped.c.copies - 1)), 0),
+    ).select_from(grouped).one()
+    return {"groups": groups, "duplicate_count": int(copies), "duplicate_size": int(size)}
+
+def copy_variant_groups_page(
+    db: Session,
+    user_ids: Sequence[int],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[List[File]], Optional[str]]:
+    """
+    One page of copy-variant groups: files with the same normalized_name and size under at
+    least two different names (identical names are plain duplicates). Keyset-paginated in
+    (normalized_name, size) order; members are read with one index seek per group.
+    """
+    limit = max(1, min(limit or DUPLICATE_PAGE_SIZE, DUPLICATE_MAX_PAGE_SIZE))
+    criteria = _live_files(user_ids) + [File.normalized_name.isnot(None), File.size.isnot(None)]
+    after = decode_cursor(cursor, str, int)
+    page_criteria = list(criteria)
+    if after:
+        page_criteria.append(or_(
+            File.normalized_name > after[0],
+            and_(File.normalized_name == after[0], File.size > after[1]),
+        ))
+    keys = db.query(File.normalized_name, File.size).filter(*page_criteria).group_by(
+        File.normalized_name, File.size
+    ).having(func.count(func.distinct(File.name)) > 1).order_by(File.normalized_name, File.size).limit(limit + 1).all()
+    next_cursor = encode_cursor(*keys[limit - 1]) if len(keys) > limit else None
+    keys = keys[:limit]
+    if not keys:
+        return [], None
+    wanted = set(keys)
+    members = db.query(File).filter(*criteria, File.normalized_name.in_({name for name, _ in keys})).order_by(
+        File.normalized_name, File.size, File.id
+    )
+    members = (f for f in members if (f.normalized_name, f.size) in wanted)
+    return [list(group) for _, group in groupby(members, key=lambda f: (f.normalized_name, f.size))], next_cursor
+
+def get_copy_variants_service(current_user: User, db: Session, cursor: Optional[str] = None, limit: Optional[int] = None):
+    groups, next_cursor = copy_variant_groups_page(db, [current_user.id], cursor=cursor, limit=limit)
+    variants = [
+        [
+            {
+                "id": f.id,
+                "name": f.name,
+                "normalized_name": f.normalized_name,
+                "size": f.size,
+                "provider": f.provider,
+                "cloud_id": f.cloud_id,
+                "path": getattr(f, 'path', None),
+                "last_modified": f.last_modified.isoformat() if f.last_modified else None
+            }
+            for f in group
+        ]
+        for group in groups
+    ]
+    return {"variants": variants, "next_cursor": next_cursor}
+
+def get_duplicate_files_service(current_user: User, db: Session, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """Pages through the user's indexed duplicate groups, most wasted space first."""
+    from backend.services.duplicate_index_service import indexed_duplicate_page, group_summary
+    page, next_cursor = indexed_duplicate_page(db, current_user.id, cursor=cursor, limit=limit)
+    duplicates = [
+        [
+            {
+                "id": f.id,
+                "name": f.name,
+                "size": f.size,
+                "provider": f.provider,
+                "cloud_id": f.cloud_id,
+                "path": getattr(f, 'path', None),
+                "last_modified": f.last_modified.isoformat() if f.last_modified else None
+            }
+            for f in members
+        ]
+        for _, members in page
+    ]
+    return {"duplicates": duplicates, "groups": [group_summary(group) for group, _ in page], "next_cursor": next_cursor}
@@ -1,48 +1,45 @@
 from typing import List, Dict
 from backend.models import File
+from backend.services.duplicate_index_service import reindex_files
+from backend.services.duplicates_service import cross_provider_hash_groups
 
 class EnhancedDuplicatesService:
     def find_cross_cloud_duplicates(self, user_id: int, db):
         """Find duplicates across all connected clouds"""
-        # Get all files from all clouds (placeholder: implement actual logic)
-        all_files = self.get_all_cloud_files(user_id, db)
-        # Group by hash
-        hash_groups = self.group_by_hash(all_files)
-        # Find cross-cloud duplicates
         cross_cloud_duplicates = []
-        for hash_value, files in hash_groups.items():
-            if len(files) > 1:
-                clouds = set(f['cloud_provider'] for f in files)
-                if len(clouds) > 1:
-                    cross_cloud_duplicates.append({
-                        'hash': hash_value,
-                        'files': files,
-                        'clouds': list(clouds),
-                        'total_size': sum(f['size'] for f in files),
-                        'potential_savings': self.calculate_duplicate_savings(files)
-                    })
+        for digest, members in cross_provider_hash_groups(db, user_id):
+            files = [self.file_dict(f) for f in members]
+            cross_cloud_duplicates.append({
+                'hash': digest,
+                'files': files,
+                'clouds': sorted({f.provider for f in members}),
+                'total_size': sum(f['size'] for f in files),
+                'potential_savings': members[0].size * (len(members) - 1)
+            })
         return cross_cloud_duplicates
 
+    def file_dict(self, f: File) -> Dict:
+        return {
+            'id': f.id,
+            'name': f.name,
+            'size': f.size,
+            'cloud_provider': f.provider,
+            'provider': f.provider,
+            'cloud_id': f.cloud_id,
+            'hash': f.hash,
+            'last_modified': f.last_modified,
+        }
+
     def get_all_cloud_files(self, user_id: int, db) -> List[Dict]:
         files = db.query(File).filter(File.user_id == user_id, File.is_deleted == False).all()
-        return [
-            {
-                'id': f.id,
-                'name': f.name,
-                'size': f.size,
-                'cloud_provider': f.cloud_provider if hasattr(f, 'cloud_provider') else f.provider,
-                'provider': f.provider,
-                'cloud_id': f.cloud_id,
-                'hash': f.hash,
-                'last_modified': f.last_modified,
-            }
-            for f in files
-        ]
+        return [self.file_dict(f) for f in files]
 
     def group_by_hash(self, files: List[Dict]) -> Dict[str, List[Dict]]:
         hash_groups = {}
         for f in files:
             h = f['hash']
+            if not h:
+                continue
             if h not in hash_groups:
                 hash_groups[h] = []
             hash_groups[h].append(f)
@@ -64,6 +61,8 @@ class EnhancedDuplicatesService:
         to_soft_delete = file_ids[1:]
         if to_soft_delete:
             db.query(File).filter(File.id.in_(to_soft_delete)).update({File.is_deleted: True}, synchronize_session=False)
+            for user_id, in db.query(File.user_id).filter(File.id.in_(file_ids)).distinct():
+                reindex_files(db, user_id, File.id.in_(file_ids))
             db.commit()
             # Actually remove from cloud providers
             files = [f for f in duplicate_group['files'] if f['id'] in to_soft_delete]
@@ -0,0 +1,129 @@
+"""
+Streaming proxy for cached file URLs (/api/files/{file_id}/download).
+
+The upstream body is relayed chunk by chunk through the pooled httpx client, so a
+download holds DOWNLOAD_CHUNK_SIZE bytes in memory at a time whatever the file size.
+Range and conditional headers are forwarded as-is and the provider's 206/304/416
+answers are passed back, which lets video players seek and browsers revalidate
+image previews with ETags.
+
+Complete bodies up to DOWNLOAD_CACHE_MAX_FILE_BYTES are written to the download cache
+(backend.download_cache) as they stream; later requests for the same file version are
+served from disk with FileResponse, Range requests included, without contacting the
+provider. Cache reads and writes run in the threadpool so disk I/O never blocks the event
+loop, and a failing cache only loses its entry; the client's download carries on.
+"""
+import anyio
+import httpx
+from typing import Optional
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from backend.models import File, User
+from backend.onedrive_async_api import get_async_http_client
+from backend.services.images_service import refresh_download_urls, url_is_fresh
+from backend.download_cache import CachedDownload, CacheWriter, cache_key, get_download_cache
+from backend.config import DOWNLOAD_CHUNK_SIZE
+from backend.helpers import debug_log
+
+FORWARDED_REQUEST_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+FORWARDED_RESPONSE_HEADERS = (
+    "content-length",
+    "content-range",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+    "cache-control",
+    "content-disposition",
+    "content-encoding",
+)
+PASS_THROUGH_STATUSES = (200, 206, 304, 416)
+
+def _response_headers(upstream: httpx.Response):
+    # The body is relayed byte for byte, so its headers (encoding included) still describe it;
+    # main.py keeps GZipMiddleware away from this route
+    return {name: upstream.headers[name] for name in FORWARDED_RESPONSE_HEADERS if name in upstream.headers}
+
+async def _relay(upstream: httpx.Response, writer: Optional[CacheWriter]):
+    # Closing in finally returns the connection to the pool even when the client goes away mid-file
+    try:
+        async for chunk in upstream.aiter_raw(DOWNLOAD_CHUNK_SIZE):
+            if writer and writer.active:
+                await run_in_threadpool(writer.write, chunk)
+            yield chunk
+        if writer and writer.active:
+            await run_in_threadpool(writer.commit)
+    finally:
+        if writer and writer.active:
+            # Shielded so a cancelled request still removes its partial file
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(writer.abort)
+        await upstream.aclose()
+
+def _serve_cached(cached: CachedDownload, request: Request):
+    etag = f'"{cached.digest}"'
+    headers = {"etag": etag}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"etag": etag})
+    return FileResponse(cached.path, media_type=cached.content_type, headers=headers, stat_result=cached.stat_result)
+
+async def _cache_writer(file: File, upstream: httpx.Response, request_headers) -> Optional[CacheWriter]:
+    """Only whole, unencoded bodies are cached."""
+    if upstream.status_code != 200 or "range" in request_headers or upstream.headers.get("content-encoding", "identity") != "identity":
+        return None
+    length = upstream.headers.get("content-length")
+    return await run_in_threadpool(
+        get_download_cache().writer,
+        cache_key(file),
+        upstream.headers.get("content-type", "application/octet-stream"),
+        int(length) if length and length.isdigit() else None,
+    )
+
+def _get_file(db: Session, user_id: int, file_id: int) -> Optional[File]:
+    return db.query(File).filter_by(id=file_id, user_id=user_id).first()
+
+async def proxy_file_download_service(current_user: User, db: Session, file_id: int, request: Request):
+    # The session is synchronous: every query runs in the threadpool, never on the event loop
+    file = await run_in_threadpool(_get_file, db, current_user.id, file_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found or no cached URL available")
+
+    cached = await run_in_threadpool(get_download_cache().lookup, cache_key(file))
+    if cached:
+        return _serve_cached(cached, request)
+
+    if not url_is_fresh(file):
+        await run_in_threadpool(refresh_download_urls, [file], db, current_user.id)
+    if not file.url:
+        raise HTTPException(status_code=404, detail="File not found or no cached URL available")
+
+    headers = {name: request.headers[name] for name in FORWARDED_REQUEST_HEADERS if name in request.headers}
+    # Ask for the stored bytes so Content-Length and byte ranges refer to the file itself
+    headers["accept-encoding"] = "identity"
+    client = get_async_http_client()
+    try:
+        upstream = await client.send(client.build_request("GET", file.url, headers=headers), stream=True, follow_redirects=True)
+    except httpx.HTTPError as e:
+        debug_log(f"Download proxy for file {file_id} failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch file from external source")
+
+    if upstream.status_code not in PASS_THROUGH_STATUSES:
+        await upstream.aclose()
+        raise HTTPException(status_code=404, detail="Unable to fetch file from cached URL")
+
+    response_headers = _response_headers(upstream)
+    if upstream.status_code in (304, 416):
+        await upstream.aclose()
+        response_headers.pop("content-length", None)
+        return Response(status_code=upstream.status_code, headers=response_headers)
+
+    return StreamingResponse(
+        _relay(upstream, await _cache_writer(file, upstream, headers)),
+        status_code=upstream.status_code,
+        headers=response_headers,
+        media_type=upstream.headers.get("content-type", "application/octet-stream"),
+    )
+
+def download_cache_stats_service():
+    return get_download_cache().stats()
@@ -0,0 +1,264 @@
+"""
+Bulk ingestion of file metadata into the files table.
+
+Rows are written in chunks of FILE_UPSERT_CHUNK_SIZE, each executed as one
+INSERT ... ON CONFLICT (user_id, provider, cloud_id) DO UPDATE with executemany, on PostgreSQL
+and SQLite alike. The statement is compiled once and psycopg2 folds the parameter sets into
+multi-row VALUES pages, so a 100k-file inventory costs a few hundred round trips instead of
+one SELECT per file. Other databases fall back to one SELECT per chunk plus ORM writes. Each
+chunk is committed on its own, so a failure part-way keeps the chunks already written.
+
+/api/files/ingest streams the same rows in as NDJSON or msgpack: records are decoded and
+validated as the body arrives and upserted a chunk at a time, so memory stays flat however
+large the upload is. Progress is recorded on an "ingest" background job row.
+"""
+from backend.models import BackgroundJob, File, FileData, User
+from backend.helpers import parse_datetime, debug_log, hash_columns
+from backend.filename_normalization import normalize_filename
+from backend.services.scan_job_service import WORKER_ID
+from backend.services.duplicate_index_service import reindex_files
+from backend.config import FILE_UPSERT_CHUNK_SIZE, INGEST_MAX_RECORD_BYTES
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+import json
+import msgpack
+import uuid
+
+CONFLICT_COLUMNS = ("user_id", "provider", "cloud_id")
+HASH_COLUMNS = ("hash", "quick_xor_hash", "sha1_hash", "sha256_hash", "md5_hash")
+UPSERT_COLUMNS = ("user_id", "cloud_id", "provider", "name", "normalized_name", "size", "last_modified", "last_accessed", "path", "tags", "extra", "url") + HASH_COLUMNS
+# An upsert without a value for these keeps the stored one
+KEEP_IF_MISSING = ("last_modified", "last_accessed", "url") + HASH_COLUMNS
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def file_row(user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps one incoming file (FileData fields) to a files row."""
+    extra = data.get("extra")
+    return {
+        "user_id": user_id,
+        "cloud_id": data["cloud_id"],
+        "provider": data.get("provider") or "onedrive",
+        "name": data["name"],
+        "normalized_name": normalize_filename(data["name"]),
+        "size": data.get("size"),
+        "last_modified": parse_datetime(data.get("last_modified")),
+        "last_accessed": parse_datetime(data.get("last_accessed")),
+        "path": data.get("path"),
+        "tags": data.get("tags"),
+        "extra": json.dumps(extra) if isinstance(extra, (dict, list)) else extra,
+        "url": data.get("url"),
+        **hash_columns(data.get("hashes")),
+    }
+
+def _existing_keys(db: Session, rows: List[Dict[str, Any]]) -> set:
+    found = db.query(File.provider, File.cloud_id).filter(
+        File.user_id == rows[0]["user_id"],
+        File.cloud_id.in_([row["cloud_id"] for row in rows])
+    )
+    return {(provider, cloud_id) for provider, cloud_id in found}
+
+def _upsert_statement(insert):
+    stmt = insert(File)
+    columns = File.__table__.c
+    updates = {
+        name: func.coalesce(stmt.excluded[name], columns[name]) if name in KEEP_IF_MISSING else stmt.excluded[name]
+        for name in UPSERT_COLUMNS if name not in CONFLICT_COLUMNS
+    }
+    updates["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=list(CONFLICT_COLUMNS), set_=updates)
+
+def _orm_upsert(db: Session, rows: List[Dict[str, Any]]) -> None:
+    stored = {
+        (f.provider, f.cloud_id): f
+        for f in db.query(File).filter(File.user_id == rows[0]["user_id"], File.cloud_id.in_([row["cloud_id"] for row in rows]))
+    }
+    for row in rows:
+        db_file = stored.get((row["provider"], row["cloud_id"])) or File()
+        for name in UPSERT_COLUMNS:
+            if name in KEEP_IF_MISSING and row[name] is None:
+                continue
+            setattr(db_file, name, row[name])
+        db.add(db_file)
+
+def bulk_upsert_files(db: Session, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, int]]:
+    """
+    Upserts files rows for one user. Later rows win over earlier ones with the same key.
+    Returns per-chunk counts: [{"chunk", "rows", "inserted", "updated"}].
+    """
+    unique = list({(row["provider"], row["cloud_id"]): row for row in rows}.values())
+    dialect_name = db.get_bind().dialect.name
+    insert = _INSERTS.get(dialect_name)
+    stmt = _upsert_statement(insert) if insert is not None else None
+    size = FILE_UPSERT_CHUNK_SIZE
+    chunks = []
+    for start in range(0, len(unique), size):
+        chunk = unique[start:start + size]
+        existing = _existing_keys(db, chunk)
+        if stmt is not None:
+            db.execute(stmt, chunk)
+        else:
+            _orm_upsert(db, chunk)
+        reindex_files(db, chunk[0]["user_id"], File.cloud_id.in_([row["cloud_id"] for row in chunk]))
+        db.commit()
+        updated = sum(1 for row in chunk if (row["provider"], row["cloud_id"]) in existing)
+        chunks.append({"chunk": len(chunks), "rows": len(chunk), "inserted": len(chunk) - updated, "updated": updated})
+    return chunks
+
+def upsert_files_service(current_user: User, db: Session, files: List[Dict[str, Any]]):
+    chunks = bulk_upsert_files(db, (file_row(current_user.id, data) for data in files))
+    return {
+        "status": "success",
+        "received": len(files),
+        "inserted": sum(chunk["inserted"] for chunk in chunks),
+        "updated": sum(chunk["updated"] for chunk in chunks),
+        "chunks": chunks,
+    }
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+MSGPACK_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+MAX_REPORTED_ERRORS = 100
+_MSGPACK_FEED_SIZE = 64 * 1024
+
+async def iter_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yields (line number, parsed value or ValueError), holding at most one partial line."""
+    buffer = b""
+    line_number = 0
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > INGEST_MAX_RECORD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Line {line_number + len(lines) + 1} is longer than {INGEST_MAX_RECORD_BYTES} bytes")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as e:
+                    yield line_number, e
+    if buffer.strip():
+        try:
+            yield line_number + 1, json.loads(buffer)
+        except ValueError as e:
+            yield line_number + 1, e
+
+async def iter_msgpack(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (record number, value) from a stream of msgpack objects. Each object is either a
+    record or an array of records, so clients can send the inventory in chunks.
+    """
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=INGEST_MAX_RECORD_BYTES + _MSGPACK_FEED_SIZE)
+    record_number = 0
+    async for chunk in stream:
+        for start in range(0, len(chunk), _MSGPACK_FEED_SIZE):
+            try:
+                unpacker.feed(chunk[start:start + _MSGPACK_FEED_SIZE])
+            except msgpack.BufferFull:
+                raise HTTPException(status_code=413, detail=f"Record {record_number + 1} is larger than {INGEST_MAX_RECORD_BYTES} bytes")
+            try:
+                for value in unpacker:
+                    for record in value if isinstance(value, list) else [value]:
+                        record_number += 1
+                        yield record_number, record
+            except (ValueError, msgpack.UnpackException) as e:
+                raise HTTPException(status_code=400, detail=f"Malformed msgpack after record {record_number}: {e}")
+
+def _validate(user_id: int, record: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    if isinstance(record, ValueError):
+        return None, f"invalid JSON: {record}"
+    if not isinstance(record, dict):
+        return None, "expected an object"
+    try:
+        data = FileData.model_validate(record)
+    except ValidationError as e:
+        first = e.errors()[0]
+        return None, f"{'.'.join(str(part) for part in first['loc'])}: {first['msg']}"
+    return file_row(user_id, data.model_dump()), None
+
+def _start_ingest_job(db: Session, user_id: int, ingest_id: Optional[str], expected: Optional[int]) -> str:
+    if ingest_id and db.query(BackgroundJob.id).filter(BackgroundJob.id == ingest_id).first():
+        raise HTTPException(status_code=409, detail="An ingest with this id already exists")
+    job = BackgroundJob()
+    job.id = ingest_id or str(uuid.uuid4())
+    job.user_id = user_id
+    job.job_type = "ingest"
+    job.status = "running"
+    job.params = {"expected_rows": expected}
+    job.worker_id = WORKER_ID
+    job.heartbeat_at = datetime.now(timezone.utc)
+    db.add(job)
+    db.commit()
+    return job.id
+
+def _write_batch(db: Session, job_id: str, rows: List[Dict[str, Any]], summary: Dict[str, Any], expected: Optional[int]) -> None:
+    for chunk in bulk_upsert_files(db, rows):
+        summary["inserted"] += chunk["inserted"]
+        summary["updated"] += chunk["updated"]
+        summary["batches"] += 1
+    _record_progress(db, job_id, summary, expected)
+
+def _record_progress(db: Session, job_id: str, summary: Dict[str, Any], expected: Optional[int], status: Optional[str] = None, error: Optional[str] = None) -> None:
+    job = db.query(BackgroundJob).get(job_id)
+    job.files_found = summary["inserted"] + summary["updated"]
+    job.stats = {key: summary[key] for key in ("received", "inserted", "updated", "invalid", "batches")}
+    if expected:
+        job.progress = min(99, int(100 * summary["received"] / expected))
+    job.heartbeat_at = datetime.now(timezone.utc)
+    if status is not None:
+        job.status = status
+        job.error = error
+        job.finished_at = job.heartbeat_at
+        if status == "complete":
+            job.progress = 100
+    db.commit()
+
+async def ingest_files_stream_service(current_user: User, db: Session, request: Request, ingest_id: Optional[str] = None, expected: Optional[int] = None):
+    """
+    Upserts an NDJSON or msgpack inventory while it is being uploaded. Invalid records are
+    skipped and reported; everything else is written in FILE_UPSERT_CHUNK_SIZE batches. Poll
+    /api/onedrive/jobs/{ingest_id}/status (with a client-chosen ingest_id) to follow progress.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        records = iter_ndjson(request.stream())
+    elif content_type in MSGPACK_TYPES:
+        records = iter_msgpack(request.stream())
+    else:
+        raise HTTPException(status_code=415, detail="Send application/x-ndjson or application/x-msgpack")
+    if ingest_id:
+        try:
+            ingest_id = str(uuid.UUID(ingest_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ingest_id must be a UUID")
+
+    job_id = await run_in_threadpool(_start_ingest_job, db, current_user.id, ingest_id, expected)
+    summary = {"received": 0, "inserted": 0, "updated": 0, "invalid": 0, "batches": 0, "errors": []}
+    batch = []
+    try:
+        async for position, record in records:
+            summary["received"] += 1
+            row, error = _validate(current_user.id, record)
+            if error:
+                summary["invalid"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    summary["errors"].append({"record": position, "error": error})
+                continue
+            batch.append(row)
+            if len(batch) >= FILE_UPSERT_CHUNK_SIZE:
+                await run_in_threadpool(_write_batch, db, job_id, batch, summary, expected)
+                batch = []
+        if batch:
+            await run_in_threadpool(_write_batch, db, job_id, batch, summary, expected)
+    except (HTTPException, ClientDisconnect) as e:
+        detail = e.detail if isinstance(e, HTTPException) else "Upload interrupted"
+        debug_log(f"Ingest {job_id} stopped after {summary['received']} records: {detail}")
+        await run_in_threadpool(_record_progress, db, job_id, summary, expected, "error", str(detail))
+        raise
+    await run_in_threadpool(_record_progress, db, job_id, summary, expected, "complete")
+    return {"status": "success", "job_id": job_id, **summary}
@@ -1,6 +1,7 @@
 from backend.models import File, User
+from backend.services.duplicate_index_service import duplicate_keys_of, refresh_duplicate_groups
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 from fastapi import HTTPException
 
 def auto_tag_file_service(current_user: User, db: Session, file_id: int):
@@ -29,4 +30,11 @@ def cleanup_recommendations_service(current_user: User, db: Session):
     from datetime import datetime, timedelta
     cutoff = datetime.utcnow() - timedelta(days=180)
     files = db.query(File).filter_by(user_id=current_user.id).filter(File.last_accessed < cutoff).all()
-    return [{"id": f.id, "name": f.name, "last_accessed": f.last_accessed} for f in files] 
\ No newline at end of file
+    return [{"id": f.id, "name": f.name, "last_accessed": f.last_accessed} for f in files] 
+
+def delete_files_service(current_user: User, db: Session, ids: List[int]):
+    keys = duplicate_keys_of(db, current_user.id, File.id.in_(ids))
+    deleted = db.query(File).filter(File.id.in_(ids), File.user_id == current_user.id).delete(synchronize_session=False)
+    refresh_duplicate_groups(db, current_user.id, keys)
+    db.commit()
+    return {"deleted": deleted}
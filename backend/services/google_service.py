@@ -12,6 +12,43 @@ from datetime import datetime, timezone
 import os
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from backend.rate_limiter import get_limiter, parse_retry_after, backoff_delay, log_throttle, THROTTLE_STATUS_CODES
+from backend.config import THROTTLE_MAX_RETRIES
+
+# Drive reports quota exhaustion as 403 with one of these reasons rather than 429
+GOOGLE_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+def _is_google_throttle(error: HttpError) -> bool:
+    if error.resp.status in THROTTLE_STATUS_CODES:
+        return True
+    if error.resp.status == 403:
+        try:
+            reasons = {detail.get("reason") for detail in error.error_details or []}
+        except Exception:
+            reasons = set()
+        return bool(reasons & GOOGLE_RATE_LIMIT_REASONS)
+    return False
+
+def execute_google_request(connection: CloudConnection, request):
+    """
+    Executes a googleapiclient request through the connection's rate limiter.
+    Throttled calls (429, 503, or 403 rate-limit reasons) are retried after Retry-After
+    or exponential backoff, up to THROTTLE_MAX_RETRIES times.
+    """
+    limiter = get_limiter("googledrive", GOOGLE_CLIENT_ID or "default", connection.id or id(connection))
+    for attempt in range(THROTTLE_MAX_RETRIES + 1):
+        try:
+            with limiter.slot():
+                result = request.execute()
+            limiter.on_success()
+            return result
+        except HttpError as e:
+            if not _is_google_throttle(e) or attempt == THROTTLE_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, parse_retry_after(e.resp.get("retry-after")))
+            limiter.on_throttle(delay)
+            log_throttle("googledrive", connection.id, e.resp.status, delay, attempt)
 
 def google_login_service(session_id, authorization, db: Session):
     debug_log("/auth/google/login called")
@@ -227,11 +264,11 @@ def get_google_files_service(current_user, db, folder_id):
     page_token = None
     while True:
         query = f"'{folder_id}' in parents and trashed = false"
-        results = service.files().list(
+        results = execute_google_request(connection, service.files().list(
             q=query,
             fields="nextPageToken, files(id, name, mimeType, size, modifiedTime, iconLink, webViewLink, parents)",
             pageToken=page_token
-        ).execute()
+        ))
         files.extend(results.get('files', []))
         page_token = results.get('nextPageToken')
         if not page_token:
@@ -256,7 +293,7 @@ def get_google_files_service(current_user, db, folder_id):
     visited = set()
     while current_id and current_id != 'root' and current_id not in visited:
         visited.add(current_id)
-        meta = service.files().get(fileId=current_id, fields="id, name, parents").execute()
+        meta = execute_google_request(connection, service.files().get(fileId=current_id, fields="id, name, parents"))
         path.insert(0, {"id": meta["id"], "name": meta["name"]})
         parents = meta.get("parents")
         if parents:
@@ -1,10 +1,11 @@
-from backend.models import File, User, CloudConnection
+from backend.models import File, User, CloudConnection, DuplicateGroup
 from sqlalchemy.orm import Session
-from collections import defaultdict
-import requests
-from backend.onedrive_api import _make_graph_api_request
-
-IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.heic'}
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from backend.graph_batch import batch_get_download_urls
+from backend.services.duplicate_index_service import indexed_duplicate_page, group_summary
+from backend.helpers import is_image_name
+from backend.config import DOWNLOAD_URL_TTL_SECONDS, DOWNLOAD_URL_REFRESH_SKEW_SECONDS
 
 def get_onedrive_access_token(user_id, db):
     conn = db.query(CloudConnection).filter(
@@ -16,91 +17,99 @@ def get_onedrive_access_token(user_id, db):
         return conn.access_token
     return None
 
-def fetch_onedrive_download_url(cloud_id, db, user_id):
-    """Fetch download URL from OneDrive Graph API with robust token refresh and DB update"""
+def get_duplicate_images_service(current_user: User, db: Session, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """Get duplicate images with on-demand URL fetching and caching"""
+    page, next_cursor = indexed_duplicate_page(db, current_user.id, filters=[DuplicateGroup.image_count >= 2], cursor=cursor, limit=limit)
+    duplicates = [
+        [
+            {
+                "id": f.id,
+                "cloud_id": f.cloud_id,
+                "provider": f.provider,
+                "name": f.name,
+                "size": f.size,
+                "path": getattr(f, 'path', None),
+                "last_modified": f.last_modified.isoformat() if f.last_modified is not None else None,
+                "has_cached_url": url_is_fresh(f)  # Indicate if a usable URL is already cached
+            }
+            for f in members if is_image_name(f.name)
+        ]
+        for _, members in page
+    ]
+    return {"duplicates": duplicates, "groups": [group_summary(group) for group, _ in page], "next_cursor": next_cursor}
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        # SQLite hands timezone-aware columns back naive; they are stored in UTC
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def url_is_fresh(f: File, now: Optional[datetime] = None) -> bool:
+    """A cached OneDrive URL is usable until DOWNLOAD_URL_REFRESH_SKEW_SECONDS before it expires."""
+    if not f.url:
+        return False
+    if f.provider != 'onedrive':
+        # Other providers' URLs are not pre-authenticated and carry no expiry
+        return True
+    expires_at = _as_utc(f.url_expires_at)
+    now = now or datetime.now(timezone.utc)
+    return expires_at is not None and expires_at - timedelta(seconds=DOWNLOAD_URL_REFRESH_SKEW_SECONDS) > now
+
+def refresh_download_urls(files: List[File], db: Session, user_id: int) -> Dict[int, str]:
+    """
+    Re-fetches download URLs for OneDrive files whose cached URL is missing or about to
+    expire, 20 per $batch request with several batches in flight. Updates url/url_expires_at
+    in place (a file that could not be refreshed loses its stale URL) and returns
+    {file_id: error} for the ones that failed.
+    """
+    stale = [f for f in files if f.provider == 'onedrive' and not url_is_fresh(f)]
+    if not stale:
+        return {}
     connection = db.query(CloudConnection).filter(
         CloudConnection.user_id == user_id,
         CloudConnection.provider == 'onedrive',
         CloudConnection.is_active == True
     ).first()
     if not connection:
-        print(f"[DEBUG] No active OneDrive connection for user_id={user_id}")
-        return None
-    url = f"https://graph.microsoft.com/v1.0/me/drive/items/{cloud_id}"
-    resp = _make_graph_api_request("GET", url, connection, db)
-    if resp.status_code == 200:
-        data = resp.json()
-        return data.get("@microsoft.graph.downloadUrl")
-    else:
-        print(f"[DEBUG] Failed to fetch download URL for cloud_id={cloud_id}. Status: {resp.status_code}, Response: {resp.text}")
-    return None
-
-def get_duplicate_images_service(current_user: User, db: Session):
-    """Get duplicate images with on-demand URL fetching and caching"""
-    files = db.query(File).filter_by(user_id=current_user.id).all()
-    image_files = [f for f in files if any(f.name.lower().endswith(ext) for ext in IMAGE_EXTENSIONS)]
-    groups = defaultdict(list)
-    
-    for f in image_files:
-        key = (f.name, f.size)
-        groups[key].append({
-            "id": f.id,
-            "cloud_id": f.cloud_id,
-            "provider": f.provider,
-            "name": f.name,
-            "size": f.size,
-            "path": getattr(f, 'path', None),
-            "last_modified": f.last_modified.isoformat() if f.last_modified is not None else None,
-            "has_cached_url": f.url is not None  # Indicate if URL is already cached
-        })
-    
-    duplicates = [group for group in groups.values() if len(group) > 1]
-    return {"duplicates": duplicates}
+        return {f.id: "No active OneDrive connection" for f in stale}
+    fetched = batch_get_download_urls(connection, db, [f.cloud_id for f in stale])
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=DOWNLOAD_URL_TTL_SECONDS)
+    errors = {}
+    for f in stale:
+        result = fetched[f.cloud_id]
+        f.url = result["url"]
+        f.url_expires_at = expires_at if result["url"] else None
+        if not result["url"]:
+            errors[f.id] = f"Failed to fetch download URL (status {result['status']})"
+    db.commit()
+    return errors
 
 def get_image_download_urls_service(file_ids: list, current_user: User, db: Session):
-    """Fetch download URLs for specific image files on-demand"""
+    """Fetch download URLs for specific image files on-demand; stale OneDrive URLs are refreshed in one $batch pass"""
     files = db.query(File).filter(
         File.id.in_(file_ids),
         File.user_id == current_user.id
     ).all()
-    
+
+    fresh = {f.id for f in files if url_is_fresh(f)}
+    errors = refresh_download_urls(files, db, current_user.id)
+
     results = []
     for f in files:
-        # Check if we already have a cached URL
-        if f.url:
+        if f.id in errors:
+            results.append({"id": f.id, "url": None, "error": errors[f.id]})
+        elif f.url:
             results.append({
                 "id": f.id,
                 "url": f.url,
-                "cached": True
+                "cached": f.id in fresh,
+                "expires_at": f.url_expires_at.isoformat() if f.url_expires_at is not None else None
             })
-            continue
-        
-        # Fetch new URL if needed
-        if f.provider == 'onedrive':
-            download_url = fetch_onedrive_download_url(f.cloud_id, db, current_user.id)
-            if download_url:
-                # Cache the URL in the database
-                f.url = download_url
-                db.add(f)
-                results.append({
-                    "id": f.id,
-                    "url": download_url,
-                    "cached": False
-                })
-            else:
-                results.append({
-                    "id": f.id,
-                    "url": None,
-                    "error": "Failed to fetch download URL"
-                })
         else:
             results.append({
                 "id": f.id,
                 "url": None,
                 "error": f"Provider {f.provider} not supported for URL fetching"
             })
-    
-    # Commit any cached URLs
-    db.commit()
-    
-    return {"urls": results} 
\ No newline at end of file
+
+    return {"urls": results}
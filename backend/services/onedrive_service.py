@@ -1,5 +1,5 @@
 import uuid
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from datetime import datetime, timezone
 from backend.auth import decode_access_token
 from backend.models import CloudConnection, User
@@ -8,20 +8,35 @@ import os
 from backend.config import MICROSOFT_CLIENT_ID, MICROSOFT_CLIENT_SECRET, MICROSOFT_REDIRECT_URI, sessions
 from backend.helpers import debug_log
 from fastapi import HTTPException
-from backend.onedrive_api import get_onedrive_folder_contents, get_all_files_recursively, create_folder_if_not_exists, move_file, delete_file_batch, get_all_files_recursively_with_depth
+from backend.onedrive_api import token_expiry_from_response, get_onedrive_folder_contents, iter_onedrive_folder_pages, get_all_files_recursively, create_folder_if_not_exists, delete_file_batch, get_all_files_recursively_with_depth
+from backend.onedrive_async_api import (
+    get_onedrive_folder_contents_async,
+    get_all_files_recursively_async,
+    get_all_files_recursively_with_depth_async,
+    delete_file_batch_async,
+)
+from backend.graph_batch import batch_create_folders, batch_move_items
+from backend.services.onedrive_sync_service import sync_onedrive_inventory, get_inventory_duplicates
 from collections import defaultdict
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-import threading
-import time
+from starlette.concurrency import run_in_threadpool
+import itertools
+import json
 
-# In-memory job store for scan jobs (for demo; replace with persistent store for production)
-SCAN_JOBS = {}
+def get_active_onedrive_connection(current_user: User, db: Session) -> Optional[CloudConnection]:
+    return db.query(CloudConnection).filter(
+        CloudConnection.user_id == current_user.id,
+        CloudConnection.provider == 'onedrive',
+        CloudConnection.is_active == True
+    ).first()
 
-def get_onedrive_duplicates_service(current_user: User, db: Session, folder_ids: List[str], recursive: bool):
+def get_onedrive_duplicates_service(current_user: User, db: Session, folder_ids: List[str], recursive: bool, incremental: bool = False):
     """
     Finds duplicate files in specific OneDrive folders.
     If 'recursive' is True, it will be handled by the delta query.
+    If 'incremental' is True, the stored inventory is brought up to date from the persisted
+    delta links instead of re-enumerating the drive; otherwise the folders are fully resynced.
     """
     debug_log(f"Starting duplicate scan for user: {current_user.id} in folders: {folder_ids}")
 
@@ -35,8 +50,10 @@ def get_onedrive_duplicates_service(current_user: User, db: Session, folder_ids:
         raise HTTPException(status_code=403, detail="Active OneDrive connection not found for this user.")
 
     try:
-        # The 'recursive' flag is implicitly handled by the delta query starting from a folder
-        all_files = get_all_files_recursively(connection, db, folder_ids)
+        # The 'recursive' flag is implicitly handled by the delta query starting from a folder.
+        # Either way the enumerated files and their hashes are persisted, and duplicates are
+        # found with an indexed GROUP BY over the stored inventory.
+        sync_onedrive_inventory(connection, db, folder_ids, full=not incremental)
     except HTTPException as e:
         if e.status_code == 401:
             # A 401 from the API layer after a refresh attempt means the refresh token is invalid.
@@ -44,6 +61,11 @@ def get_onedrive_duplicates_service(current_user: User, db: Session, folder_ids:
             raise HTTPException(status_code=403, detail="OneDrive refresh token is invalid. Please reconnect your account.")
         raise e
 
+    duplicates = get_inventory_duplicates(connection, db, folder_ids)
+    debug_log(f"Found {len(duplicates)} groups of duplicate files for user {current_user.id}")
+    return {"duplicates": duplicates}
+
+def _group_duplicates_by_hash(all_files: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
     # Step 1: Group files by size
     files_by_size = defaultdict(list)
     for f in all_files:
@@ -67,6 +89,25 @@ def get_onedrive_duplicates_service(current_user: User, db: Session, folder_ids:
             if len(hash_group) > 1:
                 duplicates.append(hash_group)
     
+    return duplicates
+
+async def get_onedrive_duplicates_service_async(current_user: User, db: Session, folder_ids: List[str], recursive: bool):
+    """
+    Async variant of get_onedrive_duplicates_service; the delta feeds are paged on the event loop.
+    """
+    debug_log(f"Starting async duplicate scan for user: {current_user.id} in folders: {folder_ids}")
+    connection = await run_in_threadpool(get_active_onedrive_connection, current_user, db)
+    if not connection or not connection.access_token:
+        raise HTTPException(status_code=403, detail="Active OneDrive connection not found for this user.")
+
+    try:
+        all_files = await get_all_files_recursively_async(connection, db, folder_ids)
+    except HTTPException as e:
+        if e.status_code == 401:
+            raise HTTPException(status_code=403, detail="OneDrive refresh token is invalid. Please reconnect your account.")
+        raise e
+
+    duplicates = _group_duplicates_by_hash(all_files)
     debug_log(f"Found {len(duplicates)} groups of duplicate files for user {current_user.id}")
     return {"duplicates": duplicates}
 
@@ -117,6 +158,10 @@ def delete_files_service(current_user: User, db: Session, file_ids: List[str]):
         debug_log(f"An unexpected error occurred during batch delete: {e}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred during file deletion.")
 
+def _batch_error_detail(result: Dict[str, Any]) -> str:
+    body = result.get("body") or {}
+    return body.get("error", {}).get("message") or f"status {result['status']}"
+
 def smart_organise_service(current_user: User, db: Session, options: Dict[str, Any]):
     strategy = options.get("strategy")
     
@@ -138,22 +183,40 @@ def smart_organise_service(current_user: User, db: Session, options: Dict[str, A
             base_folder_id = create_folder_if_not_exists(connection, db, "root", "Smartly Organized")
             
             summary = {"moved": 0, "errors": 0, "details": []}
-            category_folders = {}
-            
+            files_by_category = defaultdict(list)
             for file in all_files:
-                category = get_file_category(file["name"])
-                
-                if category not in category_folders:
-                    category_folder_id = create_folder_if_not_exists(connection, db, base_folder_id, category)
-                    category_folders[category] = category_folder_id
-                
-                try:
-                    move_file(connection, db, file["id"], category_folders[category])
+                files_by_category[get_file_category(file["name"])].append(file)
+
+            # 3. Look up existing category folders once, then create the missing ones in one batch.
+            # OneDrive names are case-insensitive, so an existing "images" folder is reused for Images.
+            category_folders = {
+                item["name"].casefold(): item["id"]
+                for item in get_onedrive_folder_contents(connection, db, base_folder_id)
+                if item["type"] == "folder"
+            }
+            missing = [category for category in files_by_category if category.casefold() not in category_folders]
+            for category, result in batch_create_folders(connection, db, base_folder_id, missing).items():
+                if result["success"]:
+                    category_folders[category.casefold()] = result["body"]["id"]
+                    continue
+                for file in files_by_category[category]:
+                    summary["errors"] += 1
+                    summary["details"].append(f"Failed to move {file['name']}: could not create folder {category} ({_batch_error_detail(result)})")
+
+            # 4. Move every file with batched PATCH requests
+            to_move = [
+                (file, category)
+                for category, files in files_by_category.items() if category.casefold() in category_folders
+                for file in files
+            ]
+            results = batch_move_items(connection, db, [(file["id"], category_folders[category.casefold()]) for file, category in to_move])
+            for (file, category), result in zip(to_move, results):
+                if result["success"]:
                     summary["moved"] += 1
                     summary["details"].append(f"Moved {file['name']} to {category}")
-                except HTTPException as move_error:
+                else:
                     summary["errors"] += 1
-                    summary["details"].append(f"Failed to move {file['name']}: {move_error.detail}")
+                    summary["details"].append(f"Failed to move {file['name']}: {_batch_error_detail(result)}")
             
             return summary
             
@@ -234,6 +297,7 @@ def handle_onedrive_callback(request, code, state, db):
     token_json = token_resp.json()
     access_token = token_json.get("access_token")
     refresh_token = token_json.get("refresh_token")
+    token_expires_at = token_expiry_from_response(token_json)
     if not access_token:
         raise HTTPException(status_code=400, detail="No access token in response")
 
@@ -285,6 +349,7 @@ def handle_onedrive_callback(request, code, state, db):
             connection.provider = "onedrive"
             connection.access_token = access_token
             connection.refresh_token = refresh_token
+            connection.token_expires_at = token_expires_at
             connection.provider_user_id = provider_user_id
             connection.provider_user_email = provider_user_email
             connection.is_active = True
@@ -294,6 +359,7 @@ def handle_onedrive_callback(request, code, state, db):
             debug_log("Existing OneDrive connection found. Updating tokens.")
             connection.access_token = access_token
             connection.refresh_token = refresh_token or connection.refresh_token
+            connection.token_expires_at = token_expires_at
             connection.provider_user_id = provider_user_id
             connection.provider_user_email = provider_user_email
             connection.is_active = True
@@ -333,6 +399,45 @@ def get_onedrive_files_service(current_user: User, db: Session, folder_id: str =
         debug_log(f"An unexpected error occurred during file fetch: {e}")
         raise HTTPException(status_code=500, detail="An unexpected server error occurred.")
 
+def stream_onedrive_files_service(current_user: User, db: Session, folder_id: str = None, page_size: Optional[int] = None) -> StreamingResponse:
+    """
+    Streams a folder listing as {"files": [...]}, one Graph page at a time, so very large
+    folders are never held in memory. The first page is fetched before the response starts
+    so connection and auth errors still surface as normal HTTP errors; an error on a later
+    page ends the array and is reported in an "error" field.
+    """
+    connection = get_active_onedrive_connection(current_user, db)
+    if not connection:
+        raise HTTPException(status_code=404, detail="Active OneDrive connection not found.")
+
+    # The request's session is closed before a streaming body is sent, so the stream gets its own.
+    stream_db = Session(bind=db.get_bind())
+    stream_connection = stream_db.query(CloudConnection).get(connection.id)
+    pages = iter_onedrive_folder_pages(stream_connection, stream_db, folder_id, page_size)
+    try:
+        first_page = next(pages)
+    except BaseException:
+        stream_db.close()
+        raise
+
+    def _body():
+        count = 0
+        try:
+            yield '{"files": ['
+            for page in itertools.chain([first_page], pages):
+                for item in page:
+                    yield ("," if count else "") + json.dumps(item)
+                    count += 1
+            yield "]}"
+        except HTTPException as e:
+            debug_log(f"Streaming folder {folder_id} stopped after {count} items: {e.status_code}: {e.detail}")
+            yield "], " + json.dumps({"error": e.detail})[1:]
+        finally:
+            pages.close()
+            stream_db.close()
+
+    return StreamingResponse(_body(), media_type="application/json")
+
 def get_onedrive_files_recursive_service(current_user: User, db: Session, folder_ids: List[str], max_depth: int = 5, concurrent: bool = True):
     """
     Recursively fetch all files under the given folders, up to max_depth, using async/concurrent requests if enabled.
@@ -347,72 +452,36 @@ def get_onedrive_files_recursive_service(current_user: User, db: Session, folder
     all_files = get_all_files_recursively_with_depth(connection, db, folder_ids, max_depth, concurrent)
     return {"files": all_files, "note": f"Depth={max_depth}, concurrent={concurrent}"}
 
-def start_onedrive_scan_job_service(current_user: User, db: Session, folder_ids: List[str], max_depth: int = 5):
+async def get_onedrive_files_service_async(current_user: User, db: Session, folder_id: str = None):
+    debug_log(f"get_onedrive_files_service_async: user_id={current_user.id}, folder_id={folder_id}")
+    connection = await run_in_threadpool(get_active_onedrive_connection, current_user, db)
+    if not connection:
+        raise HTTPException(status_code=404, detail="Active OneDrive connection not found.")
+    files = await get_onedrive_folder_contents_async(connection, db, folder_id)
+    return {"files": files}
+
+async def get_onedrive_files_recursive_service_async(current_user: User, db: Session, folder_ids: List[str], max_depth: int = 5, max_concurrency: Optional[int] = None):
     """
-    Starts a background job to recursively scan for files. Returns a job_id.
-    Tracks progress as folders are traversed. Supports cancellation and improved progress reporting.
+    Recursively fetch all files under the given folders, up to max_depth, listing folders concurrently on the event loop.
     """
-    connection = db.query(CloudConnection).filter(
-        CloudConnection.user_id == current_user.id,
-        CloudConnection.provider == 'onedrive',
-        CloudConnection.is_active == True
-    ).first()
+    connection = await run_in_threadpool(get_active_onedrive_connection, current_user, db)
     if not connection:
         raise HTTPException(status_code=404, detail="Active OneDrive connection not found.")
-    job_id = str(uuid.uuid4())
-    SCAN_JOBS[job_id] = {
-        "status": "pending",
-        "progress": 0,
-        "result": None,
-        "error": None,
-        "folders_visited": 0,
-        "files_found": 0,
-        "cancelled": False
-    }
-    def job():
-        try:
-            SCAN_JOBS[job_id]["status"] = "running"
-            folders_visited = set()
-            files_found = []
-            def progress_traverse(folder_id: str, depth: int):
-                if SCAN_JOBS[job_id]["cancelled"]:
-                    raise Exception("Job cancelled by user.")
-                if depth > max_depth or folder_id in folders_visited:
-                    return []
-                folders_visited.add(folder_id)
-                items = get_onedrive_folder_contents(connection, db, folder_id)
-                files = [item for item in items if item["type"] == "file"]
-                folders = [item for item in items if item["type"] == "folder"]
-                files_found.extend(files)
-                # Update progress
-                SCAN_JOBS[job_id]["folders_visited"] = len(folders_visited)
-                SCAN_JOBS[job_id]["files_found"] = len(files_found)
-                SCAN_JOBS[job_id]["progress"] = min(99, int(100 * len(folders_visited) / (len(folders_visited) + len(folders) + 1)))
-                sub_results = []
-                for folder in folders:
-                    sub_results.extend(progress_traverse(folder["id"], depth + 1))
-                return files + sub_results
-            all_files = []
-            for folder_id in folder_ids:
-                all_files.extend(progress_traverse(folder_id, 1))
-            SCAN_JOBS[job_id]["result"] = all_files
-            SCAN_JOBS[job_id]["status"] = "complete"
-            SCAN_JOBS[job_id]["progress"] = 100
-        except Exception as e:
-            if str(e) == "Job cancelled by user.":
-                SCAN_JOBS[job_id]["status"] = "cancelled"
-                SCAN_JOBS[job_id]["error"] = "Job was cancelled by user."
-            else:
-                SCAN_JOBS[job_id]["status"] = "error"
-                SCAN_JOBS[job_id]["error"] = str(e)
-    threading.Thread(target=job, daemon=True).start()
-    return {"job_id": job_id}
-
-def get_scan_job_status_service(current_user: User, db: Session, job_id: str):
+    all_files = await get_all_files_recursively_with_depth_async(connection, db, folder_ids, max_depth, max_concurrency)
+    return {"files": all_files, "note": f"Depth={max_depth}, async=True"}
+
+async def delete_files_service_async(current_user: User, db: Session, file_ids: List[str]):
     """
-    Returns the status and result of a scan job.
+    Deletes a list of files for the given user, sending the Graph batches concurrently.
     """
-    job = SCAN_JOBS.get(job_id)
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-    return job 
\ No newline at end of file
+    debug_log(f"Service deleting files {file_ids} for user {current_user.id} (async)")
+    connection = await run_in_threadpool(get_active_onedrive_connection, current_user, db)
+    if not connection or not connection.access_token:
+        raise HTTPException(status_code=403, detail="Active OneDrive connection not found.")
+
+    results = await delete_file_batch_async(connection, db, file_ids)
+    successful_deletes = [res for res in results if res["success"]]
+    failed_deletes = [res for res in results if not res["success"]]
+    if failed_deletes:
+        return {"status": "partial_success", "deleted": len(successful_deletes), "errors": failed_deletes}
+    return {"status": "success", "deleted": len(successful_deletes)}
@@ -0,0 +1,254 @@
+from backend.models import File, FileSyncRoot, CloudConnection, DriveDeltaState, User
+from backend.onedrive_api import iter_drive_delta_pages
+from backend.services.duplicates_service import hash_duplicate_groups
+from backend.services.duplicate_index_service import duplicate_keys_of, refresh_duplicate_groups, reindex_files
+from backend.helpers import debug_log, parse_datetime, hash_columns
+from backend.filename_normalization import normalize_filename
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+import json
+
+PROVIDER = "onedrive"
+CHUNK_SIZE = 500
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def _load_extra(extra: Optional[str]) -> Dict[str, Any]:
+    try:
+        data = json.loads(extra) if extra else {}
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def _apply_file_changes(db: Session, user_id: int, root_folder_id: str, items: List[Dict[str, Any]]) -> int:
+    """
+    Upserts one delta page of file items into the inventory. Returns the number of rows written.
+    Delta responses never carry parentReference.path, so each file records the synced roots
+    it was seen under (FileSyncRoot) instead.
+    """
+    if not items:
+        return 0
+    existing = {
+        f.cloud_id: f
+        for f in db.query(File).filter(
+            File.user_id == user_id,
+            File.provider == PROVIDER,
+            File.cloud_id.in_([item["id"] for item in items])
+        )
+    }
+    for item in items:
+        db_file = existing.get(item["id"])
+        if not db_file:
+            db_file = File()
+            db_file.user_id = user_id
+            db_file.cloud_id = item["id"]
+            db_file.provider = PROVIDER
+            existing[item["id"]] = db_file
+        db_file.name = item["name"]
+        db_file.normalized_name = normalize_filename(item["name"])
+        db_file.size = item.get("size", 0)
+        parsed_modified = parse_datetime(item.get("lastModifiedDateTime"))
+        if parsed_modified:
+            db_file.last_modified = parsed_modified
+        for column, value in hash_columns(item.get("file", {}).get("hashes")).items():
+            setattr(db_file, column, value)
+        if db_file.extra:
+            extra = _load_extra(db_file.extra)
+            extra.pop("hashes", None)
+            db_file.extra = json.dumps(extra)
+        db.add(db_file)
+    db.flush()
+    _add_sync_root(db, user_id, root_folder_id, sorted({existing[item["id"]].id for item in items}))
+    reindex_files(db, user_id, File.provider == PROVIDER, File.cloud_id.in_(list(existing)))
+    return len(items)
+
+def _add_sync_root(db: Session, user_id: int, root_folder_id: str, file_ids: List[int]) -> None:
+    rows = [{"user_id": user_id, "root_folder_id": root_folder_id, "file_id": file_id} for file_id in file_ids]
+    insert = _INSERTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        db.execute(insert(FileSyncRoot.__table__).on_conflict_do_nothing(), rows)
+        return
+    known = {file_id for file_id, in db.query(FileSyncRoot.file_id).filter(
+        FileSyncRoot.user_id == user_id, FileSyncRoot.root_folder_id == root_folder_id, FileSyncRoot.file_id.in_(file_ids)
+    )}
+    db.execute(FileSyncRoot.__table__.insert(), [row for row in rows if row["file_id"] not in known])
+
+def _under_roots(user_id: int, root_folder_ids: List[str]):
+    return select(FileSyncRoot.file_id).where(FileSyncRoot.user_id == user_id, FileSyncRoot.root_folder_id.in_(root_folder_ids))
+
+def _delete_files(db: Session, user_id: int, cloud_ids: List[str]) -> int:
+    deleted = 0
+    for i in range(0, len(cloud_ids), CHUNK_SIZE):
+        criteria = (File.provider == PROVIDER, File.cloud_id.in_(cloud_ids[i:i + CHUNK_SIZE]))
+        keys = duplicate_keys_of(db, user_id, *criteria)
+        file_ids = select(File.id).where(File.user_id == user_id, *criteria)
+        db.query(FileSyncRoot).filter(FileSyncRoot.file_id.in_(file_ids)).delete(synchronize_session=False)
+        deleted += db.query(File).filter(File.user_id == user_id, *criteria).delete(synchronize_session=False)
+        refresh_duplicate_groups(db, user_id, keys)
+    return deleted
+
+def _iter_synced_files(db: Session, user_id: int, root_folder_ids: List[str]):
+    """Yields stored files that were synced under any of the given roots."""
+    query = db.query(File).filter(File.user_id == user_id, File.provider == PROVIDER, File.id.in_(_under_roots(user_id, root_folder_ids)))
+    return query.order_by(File.id).yield_per(1000)
+
+def _drop_unseen(db: Session, user_id: int, root_folder_id: str, seen_ids: set) -> int:
+    """After a full sync, forget rows under this root that no longer exist on the drive."""
+    stale = [
+        (file_id, cloud_id)
+        for file_id, cloud_id in db.query(File.id, File.cloud_id).filter(
+            File.user_id == user_id, File.provider == PROVIDER, File.id.in_(_under_roots(user_id, [root_folder_id]))
+        )
+        if cloud_id not in seen_ids
+    ]
+    orphaned = []
+    for i in range(0, len(stale), CHUNK_SIZE):
+        chunk = dict(stale[i:i + CHUNK_SIZE])
+        db.query(FileSyncRoot).filter(
+            FileSyncRoot.user_id == user_id, FileSyncRoot.root_folder_id == root_folder_id, FileSyncRoot.file_id.in_(list(chunk))
+        ).delete(synchronize_session=False)
+        # Files still seen under another synced root are kept
+        elsewhere = {file_id for file_id, in db.query(FileSyncRoot.file_id).filter(FileSyncRoot.file_id.in_(list(chunk)))}
+        orphaned += [cloud_id for file_id, cloud_id in chunk.items() if file_id not in elsewhere]
+    return _delete_files(db, user_id, orphaned)
+
+def _sync_root(connection: CloudConnection, db: Session, state: DriveDeltaState, full: bool) -> Dict[str, int]:
+    """
+    Applies one root folder's delta feed to the stored inventory, page by page.
+    On a full sync every file seen is recorded so rows that vanished from the drive can be removed.
+
+    Graph reports a deleted folder without its descendants, and only files are stored, so
+    "folder_deleted" is set when an incremental feed deletes a folder, or an item with no stored
+    row (deleted items may lack the folder facet); the caller then resyncs the root in full.
+    """
+    upserted = 0
+    deleted = 0
+    folder_deleted = False
+    seen_ids = set() if full else None
+    delta_link = None
+
+    for items, page_delta_link in iter_drive_delta_pages(connection, db, state.root_folder_id, None if full else state.delta_link):
+        # The deleted facet may be an empty object, so test for the key rather than its truthiness.
+        files = [item for item in items if "file" in item and "deleted" not in item]
+        removed = [item["id"] for item in items if "deleted" in item]
+        upserted += _apply_file_changes(db, connection.user_id, state.root_folder_id, files)
+        removed_files = _delete_files(db, connection.user_id, removed)
+        deleted += removed_files
+        folder_deleted = folder_deleted or removed_files < len(removed) or any("deleted" in item and "folder" in item for item in items)
+        if seen_ids is not None:
+            seen_ids.update(item["id"] for item in files)
+        # Commit per page so a long sync never holds one huge transaction. Replaying a page is idempotent.
+        db.commit()
+        delta_link = page_delta_link or delta_link
+
+    if seen_ids is not None:
+        deleted += _drop_unseen(db, connection.user_id, state.root_folder_id, seen_ids)
+
+    state.delta_link = delta_link
+    state.last_synced_at = datetime.now(timezone.utc)
+    db.add(state)
+    db.commit()
+    return {"upserted": upserted, "deleted": deleted, "folder_deleted": folder_deleted and not full}
+
+def _find_delta_state(db: Session, connection_id: int, folder_id: str) -> Optional[DriveDeltaState]:
+    return db.query(DriveDeltaState).filter_by(connection_id=connection_id, root_folder_id=folder_id).first()
+
+def _delta_state(db: Session, connection_id: int, folder_id: str) -> DriveDeltaState:
+    """The root's delta state, created on its first sync."""
+    state = _find_delta_state(db, connection_id, folder_id)
+    if state:
+        return state
+    state = DriveDeltaState()
+    state.connection_id = connection_id
+    state.root_folder_id = folder_id
+    db.add(state)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent first sync of the same root created it first
+        db.rollback()
+        state = _find_delta_state(db, connection_id, folder_id)
+    return state
+
+def sync_onedrive_inventory(connection: CloudConnection, db: Session, folder_ids: List[str], full: bool = False) -> Dict[str, Any]:
+    """
+    Brings the stored File inventory for the given OneDrive folders up to date.
+    Uses the persisted delta link per (connection, root folder) when one exists, so only
+    adds, modifications and deletions since the last sync are fetched. Falls back to a
+    full enumeration when no link is stored, when full=True, when Graph expires the link (410),
+    or after the incremental feed deleted a folder.
+    """
+    summary = {"folders": [], "upserted": 0, "deleted": 0}
+    for folder_id in folder_ids or ["root"]:
+        state = _delta_state(db, connection.id, folder_id)
+        mode = "incremental" if state.delta_link and not full else "full"
+        try:
+            counts = _sync_root(connection, db, state, full=(mode == "full"))
+        except HTTPException as e:
+            if e.status_code != 410 or mode == "full":
+                raise e
+            debug_log(f"Delta link for connection {connection.id}, folder {folder_id} expired; running full resync.")
+            mode = "full"
+            counts = _sync_root(connection, db, state, full=True)
+        if counts.pop("folder_deleted"):
+            # Forget the deleted folder's descendants, which the delta feed never lists
+            debug_log(f"A folder under {folder_id} was deleted for connection {connection.id}; running full resync.")
+            mode = "full"
+            resync = _sync_root(connection, db, state, full=True)
+            resync.pop("folder_deleted")
+            counts = {key: counts[key] + resync[key] for key in counts}
+
+        summary["folders"].append({"folder_id": folder_id, "mode": mode, **counts})
+        summary["upserted"] += counts["upserted"]
+        summary["deleted"] += counts["deleted"]
+    debug_log(f"OneDrive inventory sync for user {connection.user_id}: {summary}")
+    return summary
+
+def _inventory_file(f: File) -> Dict[str, Any]:
+    return {
+        "id": f.cloud_id,
+        "name": f.name,
+        "size": f.size or 0,
+        "hash": f.hash,
+        "path": f.path,
+        "last_modified": f.last_modified.isoformat() if f.last_modified else None
+    }
+
+def get_inventory_files(connection: CloudConnection, db: Session, folder_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Returns stored files under the given synced roots, shaped like get_all_files_recursively output.
+    """
+    return [_inventory_file(f) for f in _iter_synced_files(db, connection.user_id, folder_ids or ["root"])]
+
+def get_inventory_duplicates(connection: CloudConnection, db: Session, folder_ids: List[str]) -> List[List[Dict[str, Any]]]:
+    """
+    Exact duplicates among stored files under the given synced roots. Candidate groups come from
+    the indexed (user_id, size, hash) GROUP BY; only their members are checked against the roots.
+    """
+    groups = hash_duplicate_groups(db, connection.user_id, provider=PROVIDER)
+    candidates = sorted({f.id for group in groups for f in group})
+    synced = set()
+    for i in range(0, len(candidates), CHUNK_SIZE):
+        synced.update(file_id for file_id, in db.execute(
+            _under_roots(connection.user_id, folder_ids or ["root"]).where(FileSyncRoot.file_id.in_(candidates[i:i + CHUNK_SIZE]))
+        ))
+    duplicates = []
+    for group in groups:
+        members = [f for f in group if f.id in synced]
+        if len(members) > 1:
+            duplicates.append([_inventory_file(f) for f in members])
+    return duplicates
+
+def sync_onedrive_inventory_service(current_user: User, db: Session, folder_ids: List[str], full: bool = False):
+    connection = db.query(CloudConnection).filter(
+        CloudConnection.user_id == current_user.id,
+        CloudConnection.provider == 'onedrive',
+        CloudConnection.is_active == True
+    ).first()
+    if not connection or not connection.access_token:
+        raise HTTPException(status_code=403, detail="Active OneDrive connection not found for this user.")
+    return sync_onedrive_inventory(connection, db, folder_ids, full)
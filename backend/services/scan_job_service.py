@@ -0,0 +1,700 @@
+from backend.models import BackgroundJob, CloudConnection, User
+from backend.onedrive_api import get_onedrive_folder_contents, get_onedrive_item_summary, get_onedrive_storage_quota
+from backend.rate_limiter import find_limiter
+from backend.scan_progress import ScanProgressEstimator
+from backend.folder_walker import FolderWalker
+from backend.job_scheduler import get_scheduler, job_priority
+from backend.services.subscription_service import SubscriptionService
+from backend.config import (
+    SCAN_JOB_CONCURRENCY, SCAN_CHECKPOINT_INTERVAL, SCAN_JOB_STALE_SECONDS, SCAN_RESULT_INLINE_LIMIT,
+    SCAN_RESULT_TTL_SECONDS, SCAN_RESULT_PAGE_SIZE, SCAN_RESULT_PURGE_SECONDS, SCAN_EVENT_INTERVAL, SCAN_EVENT_KEEPALIVE,
+    SCAN_EVENT_DB_POLL_SECONDS, JOB_EXECUTION_MODE,
+)
+from backend.job_events import JobEventChannel, open_channel, get_channel, close_channel, format_sse
+from backend.scan_results import ScanResultWriter, spool_path, read_result_page, read_all, delete_result, enforce_disk_budget
+from backend.helpers import debug_log
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Optional
+import asyncio
+import os
+import socket
+import threading
+import time
+
+# Live state of the jobs running in this process, keyed by job id. The background_jobs table
+# is the source of truth; this only saves a DB round trip when the poll lands on the same worker.
+SCAN_JOBS: Dict[str, Dict[str, Any]] = {}
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+ACTIVE_STATUSES = ("pending", "running")
+# In queue mode the API never runs or resumes jobs itself; backend.worker processes claim them.
+RUN_JOBS_IN_API = JOB_EXECUTION_MODE != "queue"
+
+# Set when a worker process is shutting down: running scans checkpoint and release their claim.
+_shutdown = threading.Event()
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        # SQLite hands timezone-aware columns back naive; they are stored in UTC
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def _result_expired(job: BackgroundJob) -> bool:
+    expires_at = _as_utc(job.expires_at)
+    return expires_at is not None and expires_at <= _now()
+
+def _job_payload(job: BackgroundJob) -> Dict[str, Any]:
+    """
+    Status poll response. Small results are returned inline under "result"; larger ones
+    are fetched page by page from /api/onedrive/scan_job/{job_id}/result.
+    """
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": job.progress or 0,
+        "result": None if _result_expired(job) else job.result,
+        "result_count": job.result_count,
+        "result_expired": _result_expired(job),
+        "error": job.error,
+        "folders_visited": job.folders_visited or 0,
+        "files_found": job.files_found or 0,
+        "cancelled": bool(job.cancelled),
+        "estimate": job.stats,
+    }
+
+def _live_estimate(live: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    estimator = live.get("estimator")
+    if estimator is None:
+        return None
+    limiter = find_limiter("onedrive", live.get("connection_id"))
+    if limiter is None:
+        return estimator.summary()
+    return estimator.summary(limiter.last_throttled_at, limiter.throttle_count)
+
+def _live_payload(job_id: str, live: Dict[str, Any]) -> Dict[str, Any]:
+    """Status of a job running in this process; the estimate is computed now so a stall shows up."""
+    payload = {k: v for k, v in live.items() if k not in ("user_id", "connection_id", "estimator")}
+    return {
+        "job_id": job_id,
+        "result": None,
+        **payload,
+        "estimate": _live_estimate(live),
+        "queue_position": get_scheduler().queue_position(job_id),
+    }
+
+def _progress_payload(state: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: state.get(key) for key in ("status", "progress", "folders_visited", "files_found", "estimate")}
+
+def _publish_progress(channel: JobEventChannel, live: Dict[str, Any], new_files: List[Dict[str, Any]]) -> None:
+    if new_files:
+        channel.publish("files", {"files": new_files})
+    channel.publish("progress", _progress_payload({**live, "estimate": _live_estimate(live)}))
+
+def _seed_estimator(estimator: ScanProgressEstimator, connection: CloudConnection, db: Session, folder_ids: List[str]) -> None:
+    """Primes the expected totals from the root folders' sizes, or the drive's quota.used."""
+    for folder_id in folder_ids:
+        try:
+            summary = get_onedrive_item_summary(connection, db, folder_id)
+            estimator.seed(folder_id, summary.get("size"), summary.get("child_count"))
+        except HTTPException as e:
+            debug_log(f"Could not size folder {folder_id} for progress estimation: {e.detail}")
+            if folder_id == "root":
+                try:
+                    estimator.seed(folder_id, get_onedrive_storage_quota(connection, db).get("used"), None)
+                except HTTPException:
+                    pass
+
+def _get_user_job(db: Session, current_user: User, job_id: str) -> BackgroundJob:
+    job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id, BackgroundJob.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _claim_job(db: Session, job_id: str) -> bool:
+    """
+    Atomically takes ownership of a job whose owner stopped heartbeating. Only one worker's
+    UPDATE can match, so a stale job is never resumed twice.
+    """
+    cutoff = _now() - timedelta(seconds=SCAN_JOB_STALE_SECONDS)
+    claimed = db.query(BackgroundJob).filter(
+        BackgroundJob.id == job_id,
+        BackgroundJob.status.in_(ACTIVE_STATUSES),
+        (BackgroundJob.heartbeat_at.is_(None)) | (BackgroundJob.heartbeat_at < cutoff)
+    ).update({BackgroundJob.worker_id: WORKER_ID, BackgroundJob.heartbeat_at: _now()}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+def _resume_abandoned(db: Session, job: BackgroundJob) -> bool:
+    """
+    Resumes a job here if its worker stopped heartbeating (inline mode only). Scans resume
+    from their checkpoint and dedup/organise jobs run again; jobs driven by a request, like
+    ingests, cannot be resumed and are failed instead.
+    """
+    if not (RUN_JOBS_IN_API and _is_stale(job) and _claim_job(db, job.id)):
+        return False
+    db.refresh(job)
+    # Imported here: the job runners depend on this module
+    from backend.services.background_job_service import SERVICE_JOBS, schedule_service_job
+    if job.job_type == "scan":
+        _schedule_job(job, db)
+    elif job.job_type in SERVICE_JOBS:
+        schedule_service_job(job, db)
+    else:
+        job.status = "error"
+        job.error = "Job was interrupted."
+        job.finished_at = _now()
+        db.commit()
+        return False
+    return True
+
+def _is_stale(job: BackgroundJob) -> bool:
+    if job.status not in ACTIVE_STATUSES or job.id in SCAN_JOBS:
+        return False
+    heartbeat = _as_utc(job.heartbeat_at)
+    if heartbeat is None:
+        return True
+    return heartbeat < _now() - timedelta(seconds=SCAN_JOB_STALE_SECONDS)
+
+def _run_scan_job(job_id: str, bind) -> bool:
+    """
+    Runs (or resumes) a scan job on a scheduler thread. Folders are listed concurrently
+    (params["max_concurrency"] at a time, within the per-user traversal limit), but results
+    are consumed on this thread only, so the counters, spool and checkpoints need no locking.
+    Sessions are not thread-safe, so every folder listing opens its own short-lived session
+    (_list_folder); job bookkeeping uses another, so checkpoint commits never touch a session
+    a listing thread is using.
+
+    Returns True when the scheduler asked the job to make way for a higher-priority one; the
+    job has then checkpointed and goes back to "pending" to be picked up again.
+    """
+    db = Session(bind=bind)
+    graph_db = Session(bind=bind)
+    live = SCAN_JOBS[job_id]
+    channel = open_channel(job_id)
+    scheduler = get_scheduler()
+    writer = None
+    job = None
+    yielded = False
+    stop = threading.Event()
+    try:
+        job = db.query(BackgroundJob).get(job_id)
+        # Checkpoints only land between listings; heartbeat from the side for the whole run
+        job.worker_id = WORKER_ID
+        job.heartbeat_at = _now()
+        db.commit()
+        threading.Thread(target=_keep_alive, args=(bind, job_id, stop), daemon=True).start()
+        connection = graph_db.query(CloudConnection).get(job.connection_id) if job.connection_id else None
+        if connection is None:
+            raise Exception("OneDrive connection no longer exists.")
+
+        params = job.params or {}
+        checkpoint = job.checkpoint or {}
+        writer = ScanResultWriter(job_id, checkpoint.get("spool_offset", 0), checkpoint.get("spool_count", 0))
+        if checkpoint and not writer.restored:
+            # The spool did not survive (e.g. resumed on another host without a shared SCAN_RESULT_DIR)
+            debug_log(f"Scan job {job_id} has no usable result spool; restarting the walk")
+            checkpoint = {}
+        folders_visited = (job.folders_visited or 0) if checkpoint else 0
+        if checkpoint:
+            debug_log(f"Resuming scan job {job_id} with {len(checkpoint.get('frontier', []))} folders left")
+
+        estimator = ScanProgressEstimator(params.get("max_depth", 5), checkpoint.get("estimator"))
+        if not checkpoint:
+            _seed_estimator(estimator, connection, graph_db, params.get("folder_ids", []))
+        live["estimator"] = estimator
+        live["connection_id"] = connection.id
+
+        connection_id = connection.id
+        walker = FolderWalker(
+            lambda folder_id: _list_folder(bind, connection_id, folder_id),
+            params.get("folder_ids", []),
+            max_depth=params.get("max_depth", 5),
+            user_key=connection.user_id,
+            max_concurrency=params.get("max_concurrency") or SCAN_JOB_CONCURRENCY,
+            should_stop=lambda: live["cancelled"] or scheduler.should_yield(job_id) or _shutdown.is_set(),
+            frontier=checkpoint.get("frontier"),
+            visited=checkpoint.get("visited"),
+        )
+
+        job.status = live["status"] = "running"
+        job.heartbeat_at = _now()
+        db.commit()
+        last_checkpoint = time.monotonic()
+        last_publish = time.monotonic()
+        new_files = []
+        _publish_progress(channel, live, [])
+
+        for folder_id, depth, items in walker.walk():
+            files = [item for item in items if item["type"] == "file"]
+            writer.write(files)
+            new_files.extend(files)
+            folders_visited += 1
+            live["folders_visited"] = folders_visited
+            live["files_found"] = writer.count
+            estimator.record_listing(folder_id, depth, items)
+            live["progress"] = estimator.progress
+
+            if time.monotonic() - last_publish >= SCAN_EVENT_INTERVAL:
+                _publish_progress(channel, live, new_files)
+                new_files = []
+                last_publish = time.monotonic()
+
+            if time.monotonic() - last_checkpoint >= SCAN_CHECKPOINT_INTERVAL:
+                spool_offset, spool_count = writer.flush()
+                _save_checkpoint(db, job, live, {
+                    **walker.snapshot(),
+                    "spool_offset": spool_offset,
+                    "spool_count": spool_count,
+                    "estimator": estimator.snapshot(),
+                })
+                last_checkpoint = time.monotonic()
+
+        _publish_progress(channel, live, new_files)
+        walk_state = walker.snapshot()
+        if not live["cancelled"] and (scheduler.should_yield(job_id) or _shutdown.is_set()) and walk_state["frontier"]:
+            spool_offset, spool_count = writer.close()
+            _save_checkpoint(db, job, live, {
+                **walk_state,
+                "spool_offset": spool_offset,
+                "spool_count": spool_count,
+                "estimator": estimator.snapshot(),
+            })
+            job.status = live["status"] = "pending"
+            if _shutdown.is_set():
+                # Hand the job straight back to the queue instead of waiting for it to go stale
+                job.worker_id = None
+                job.heartbeat_at = None
+            db.commit()
+            debug_log(f"Scan job {job_id} yielded with {len(walk_state['frontier'])} folders left")
+            yielded = True
+            return True
+        if live["cancelled"]:
+            writer.discard()
+            job.status = live["status"] = "cancelled"
+            job.error = live["error"] = "Job was cancelled by user."
+        else:
+            _store_result(job, writer)
+            job.status = live["status"] = "complete"
+            job.progress = live["progress"] = 100
+        job.folders_visited = folders_visited
+        job.files_found = writer.count
+        job.stats = _live_estimate(live)
+        job.checkpoint = None
+        job.finished_at = _now()
+        db.commit()
+        enforce_disk_budget()
+    except Exception as e:
+        debug_log(f"Scan job {job_id} failed: {e}")
+        if writer is not None:
+            writer.discard()
+        db.rollback()
+        job = db.query(BackgroundJob).get(job_id)
+        if job is not None:
+            job.status = "error"
+            job.error = str(e)
+            job.checkpoint = None
+            job.finished_at = _now()
+            db.commit()
+    finally:
+        stop.set()
+        # A job that yielded is queued again, so it keeps its live state and event channel
+        if not yielded:
+            try:
+                done = _job_payload(job) if job is not None else {"job_id": job_id, "status": "error", "error": "Job not found"}
+                done.pop("result", None)
+            except Exception:
+                done = {"job_id": job_id, "status": "error", "error": "Scan job stopped unexpectedly."}
+            channel.publish("done", done)
+            close_channel(job_id)
+            # Finished jobs are served from the database; only running and queued jobs stay in memory.
+            SCAN_JOBS.pop(job_id, None)
+        graph_db.close()
+        db.close()
+    return False
+
+def _list_folder(bind, connection_id: int, folder_id: str) -> List[Dict[str, Any]]:
+    """One folder listing on a walker thread, with its own session for the token refresh it may commit."""
+    db = Session(bind=bind)
+    try:
+        connection = db.query(CloudConnection).get(connection_id)
+        if connection is None:
+            raise Exception("OneDrive connection no longer exists.")
+        return get_onedrive_folder_contents(connection, db, folder_id)
+    finally:
+        db.close()
+
+def _store_result(job: BackgroundJob, writer: ScanResultWriter) -> None:
+    """Small results go into the job row (readable from any host); large ones stay on disk."""
+    path = writer.finish()
+    job.result_count = writer.count
+    job.expires_at = _now() + timedelta(seconds=SCAN_RESULT_TTL_SECONDS)
+    if writer.count <= SCAN_RESULT_INLINE_LIMIT:
+        job.result = read_all(path)
+        delete_result(path)
+    else:
+        job.result_path = path
+
+# The list a service job's result is paged over; the rest of the result is a summary
+RESULT_ITEMS = {"dedup": "duplicates", "organise": "details"}
+
+def result_items(job: BackgroundJob) -> List[Any]:
+    """The pageable part of a job's inline result: the files of a scan, the list of a service job."""
+    if isinstance(job.result, dict):
+        return job.result.get(RESULT_ITEMS.get(job.job_type)) or []
+    return job.result or []
+
+def _save_checkpoint(db: Session, job: BackgroundJob, live: Dict[str, Any], checkpoint: Dict[str, Any]) -> None:
+    db.refresh(job, attribute_names=["cancelled"])
+    if job.cancelled:
+        # Cancelled through another worker
+        live["cancelled"] = True
+    job.checkpoint = checkpoint
+    job.progress = live["progress"]
+    job.folders_visited = live["folders_visited"]
+    job.files_found = live["files_found"]
+    job.stats = _live_estimate(live)
+    job.heartbeat_at = _now()
+    db.commit()
+
+def _plan_limits(db: Session, user_id: int):
+    subscriptions = SubscriptionService()
+    subscription = subscriptions.get_user_subscription(db, user_id)
+    plan = subscription.plan_type if subscription else "free"
+    return plan, subscriptions.get_plan_limits(db, plan)
+
+def _touch_job(bind, job_id: str) -> None:
+    """Heartbeat for a job waiting in this process's queue, so no other worker claims it."""
+    db = Session(bind=bind)
+    try:
+        db.query(BackgroundJob).filter(BackgroundJob.id == job_id, BackgroundJob.status == "pending").update(
+            {BackgroundJob.heartbeat_at: _now(), BackgroundJob.worker_id: WORKER_ID}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def _keep_alive(bind, job_id: str, stop: threading.Event) -> None:
+    """
+    Heartbeat for a job this worker is running. Slow listings, throttle backoff and service
+    calls without checkpoints would otherwise let the job go stale and be run twice.
+    """
+    while not stop.wait(SCAN_JOB_STALE_SECONDS / 3):
+        db = Session(bind=bind)
+        try:
+            db.query(BackgroundJob).filter(
+                BackgroundJob.id == job_id,
+                BackgroundJob.status.in_(ACTIVE_STATUSES),
+                BackgroundJob.worker_id == WORKER_ID,
+            ).update({BackgroundJob.heartbeat_at: _now()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+def _init_live_state(job: BackgroundJob) -> None:
+    SCAN_JOBS[job.id] = {
+        "user_id": job.user_id,
+        "status": job.status,
+        "progress": job.progress or 0,
+        "error": None,
+        "folders_visited": job.folders_visited or 0,
+        "files_found": job.files_found or 0,
+        "cancelled": bool(job.cancelled),
+    }
+    open_channel(job.id)
+
+def _schedule_job(job: BackgroundJob, db: Session, interactive: bool = False) -> None:
+    """
+    Queues a job on the process-wide scheduler. Scans a user has just started are interactive;
+    resumed ones are background work that paid-tier interactive scans may preempt.
+    """
+    job_id = job.id
+    bind = db.get_bind()
+    plan, limits = _plan_limits(db, job.user_id)
+    _init_live_state(job)
+    get_scheduler().submit(
+        job_id,
+        job.user_id,
+        lambda: _run_scan_job(job_id, bind),
+        plan=plan,
+        limits=limits,
+        interactive=interactive,
+        heartbeat=lambda: _touch_job(bind, job_id),
+    )
+
+def start_onedrive_scan_job_service(current_user: User, db: Session, folder_ids: List[str], max_depth: int = 5, max_concurrency: Optional[int] = None):
+    """
+    Starts a background job to recursively scan for files. Returns a job_id.
+    The job is stored in background_jobs and checkpointed while it runs, so status can be
+    polled from any worker and an interrupted scan resumes from its last checkpoint.
+    """
+    connection = db.query(CloudConnection).filter(
+        CloudConnection.user_id == current_user.id,
+        CloudConnection.provider == 'onedrive',
+        CloudConnection.is_active == True
+    ).first()
+    if not connection:
+        raise HTTPException(status_code=404, detail="Active OneDrive connection not found.")
+    job = BackgroundJob()
+    job.user_id = current_user.id
+    job.connection_id = connection.id
+    job.job_type = "scan"
+    job.status = "pending"
+    job.params = {"folder_ids": folder_ids, "max_depth": max_depth, "max_concurrency": max_concurrency}
+    enqueue_job(db, job)
+    return {"job_id": job.id}
+
+def enqueue_job(db: Session, job: BackgroundJob) -> None:
+    """
+    Saves a new job a user has just asked for. Inline, this process schedules it at once;
+    in queue mode it is left unclaimed for a worker process, highest priority first.
+    """
+    _, limits = _plan_limits(db, job.user_id)
+    job.priority = job_priority(limits, interactive=True)
+    if RUN_JOBS_IN_API:
+        job.worker_id = WORKER_ID
+        job.heartbeat_at = _now()
+    db.add(job)
+    db.commit()
+    if RUN_JOBS_IN_API:
+        if job.job_type == "scan":
+            _schedule_job(job, db, interactive=True)
+        else:
+            # Imported here: the job runners depend on this module
+            from backend.services.background_job_service import schedule_service_job
+            schedule_service_job(job, db)
+
+def run_claimed_scan_job(job_id: str, bind) -> bool:
+    """Runs a scan claimed by a worker process (see backend.worker) on the calling thread."""
+    db = Session(bind=bind)
+    try:
+        job = db.query(BackgroundJob).get(job_id)
+        if job is None:
+            return False
+        _init_live_state(job)
+    finally:
+        db.close()
+    return _run_scan_job(job_id, bind)
+
+def request_shutdown() -> None:
+    _shutdown.set()
+
+def get_scan_job_status_service(current_user: User, db: Session, job_id: str):
+    """
+    Returns the status and result of a scan job. A job whose worker stopped heartbeating
+    is resumed by whichever worker serves the poll.
+    """
+    live = SCAN_JOBS.get(job_id)
+    if live and live["user_id"] == current_user.id:
+        return _live_payload(job_id, live)
+
+    job = _get_user_job(db, current_user, job_id)
+    abandoned_by = job.worker_id
+    if _resume_abandoned(db, job):
+        debug_log(f"Job {job.id} was abandoned by {abandoned_by}; resumed on {WORKER_ID}")
+    return _job_payload(job)
+
+def _poll_job_row(bind, user_id: int, job_id: str) -> Optional[Dict[str, Any]]:
+    """Reads a job's state with a short-lived session, resuming it here if it was abandoned."""
+    db = Session(bind=bind)
+    try:
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id, BackgroundJob.user_id == user_id).first()
+        if job is None:
+            return None
+        _resume_abandoned(db, job)
+        payload = _job_payload(job)
+        payload.pop("result", None)
+        return payload
+    finally:
+        db.close()
+
+def stream_scan_job_events_service(current_user: User, db: Session, job_id: str, last_event_id: Optional[str] = None) -> StreamingResponse:
+    """
+    Server-Sent Events stream of a scan job: "progress" (counters), "files" (batches of newly
+    found files) and a final "done" carrying the job status. When the job runs on this worker
+    events are pushed as they happen; otherwise the job row is followed every
+    SCAN_EVENT_DB_POLL_SECONDS, so clients never need to poll the status endpoint.
+    """
+    _get_user_job(db, current_user, job_id)
+    bind = db.get_bind()
+    user_id = current_user.id
+    try:
+        last_seq = int(last_event_id) if last_event_id else 0
+    except ValueError:
+        last_seq = 0
+
+    async def _events():
+        nonlocal last_seq
+        last_progress = None
+        while True:
+            channel = get_channel(job_id)
+            if channel is not None:
+                wake = channel.subscribe()
+                try:
+                    while True:
+                        wake.clear()
+                        for seq, event_type, data in channel.events_since(last_seq):
+                            last_seq = seq
+                            yield format_sse(event_type, data, seq)
+                            if event_type == "done":
+                                return
+                        try:
+                            await asyncio.wait_for(wake.wait(), SCAN_EVENT_KEEPALIVE)
+                        except asyncio.TimeoutError:
+                            # Nothing finished for a while; refresh the estimate so a stall is visible
+                            live = SCAN_JOBS.get(job_id)
+                            if live is not None:
+                                yield format_sse("progress", _progress_payload({**live, "estimate": _live_estimate(live)}))
+                            else:
+                                yield ": keep-alive\n\n"
+                finally:
+                    channel.unsubscribe(wake)
+
+            payload = await run_in_threadpool(_poll_job_row, bind, user_id, job_id)
+            if payload is None:
+                yield format_sse("done", {"job_id": job_id, "status": "error", "error": "Job not found"})
+                return
+            if payload["status"] not in ACTIVE_STATUSES:
+                yield format_sse("done", payload)
+                return
+            progress = _progress_payload(payload)
+            if progress != last_progress:
+                yield format_sse("progress", progress)
+                last_progress = progress
+            await asyncio.sleep(SCAN_EVENT_DB_POLL_SECONDS)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def get_scan_job_result_service(current_user: User, db: Session, job_id: str, offset: int = 0, limit: Optional[int] = None):
+    """
+    Returns one page of a finished scan's files. Works for both inline and spilled results.
+    """
+    job = _get_user_job(db, current_user, job_id)
+    if job.status != "complete":
+        raise HTTPException(status_code=409, detail=f"Scan job is {job.status}, not complete")
+    limit = limit or SCAN_RESULT_PAGE_SIZE
+    if _result_expired(job):
+        raise HTTPException(status_code=410, detail="Scan result has expired. Please run the scan again.")
+
+    if job.result is not None and not job.result_path:
+        files = result_items(job)[offset:offset + limit]
+    else:
+        try:
+            files = read_result_page(job.result_path, offset, limit) if job.result_path else None
+        except FileNotFoundError:
+            files = None
+        if files is None:
+            raise HTTPException(status_code=410, detail="Scan result is no longer stored. Please run the scan again.")
+
+    total = job.result_count if job.result_count is not None else len(result_items(job))
+    next_offset = offset + len(files)
+    return {
+        "job_id": job.id,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "files": files,
+        "next_offset": next_offset if next_offset < total else None,
+    }
+
+def purge_expired_scan_results(db: Session) -> int:
+    """Drops stored results (rows and spill files) whose retention period has passed."""
+    expired = db.query(BackgroundJob).filter(
+        BackgroundJob.expires_at.isnot(None),
+        BackgroundJob.expires_at <= _now(),
+        (BackgroundJob.result.isnot(None)) | (BackgroundJob.result_path.isnot(None))
+    ).all()
+    for job in expired:
+        delete_result(job.result_path)
+        job.result = None
+        job.result_path = None
+    db.commit()
+    return len(expired)
+
+def _purge_periodically(bind, stop: threading.Event) -> None:
+    while not stop.wait(SCAN_RESULT_PURGE_SECONDS):
+        db = Session(bind=bind)
+        try:
+            purged = purge_expired_scan_results(db)
+            enforce_disk_budget()
+            if purged:
+                debug_log(f"Purged {purged} expired job results")
+        except Exception as e:
+            debug_log(f"Could not purge expired job results: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+_purger_stop = threading.Event()
+_purger: Optional[threading.Thread] = None
+
+def start_result_purger(bind) -> None:
+    """
+    Purges expired results every SCAN_RESULT_PURGE_SECONDS on a daemon thread, so results
+    do not outlive their TTL until the next restart. Worker processes purge in their poll loop.
+    """
+    global _purger
+    if _purger is not None and _purger.is_alive():
+        return
+    _purger_stop.clear()
+    _purger = threading.Thread(target=_purge_periodically, args=(bind, _purger_stop), name="result-purger", daemon=True)
+    _purger.start()
+
+def stop_result_purger() -> None:
+    _purger_stop.set()
+
+def cancel_scan_job_service(current_user: User, db: Session, job_id: str):
+    job = _get_user_job(db, current_user, job_id)
+    job.cancelled = True
+    if job.id in SCAN_JOBS and get_scheduler().cancel(job.id):
+        # Still queued here; finish it now rather than waiting for a worker to pick it up
+        job.status = "cancelled"
+        job.error = "Job was cancelled by user."
+        job.checkpoint = None
+        job.finished_at = _now()
+        db.commit()
+        delete_result(spool_path(job.id))
+        channel = get_channel(job.id)
+        if channel is not None:
+            done = _job_payload(job)
+            done.pop("result", None)
+            channel.publish("done", done)
+        close_channel(job.id)
+        SCAN_JOBS.pop(job.id, None)
+        return {"status": "cancelled", "job_id": job_id}
+    if job.id in SCAN_JOBS:
+        SCAN_JOBS[job.id]["cancelled"] = True
+    elif _is_stale(job):
+        # Nobody is running it, so there is nothing to wait for
+        job.status = "cancelled"
+        job.error = "Job was cancelled by user."
+        job.finished_at = _now()
+    db.commit()
+    return {"status": "cancelling", "job_id": job_id}
+
+def resume_interrupted_scan_jobs(db: Session) -> int:
+    """
+    Called at startup: resumes jobs of every type left running or pending by a worker that
+    went away, and purges expired results. In queue mode resuming is left to the worker
+    processes.
+    """
+    purge_expired_scan_results(db)
+    enforce_disk_budget()
+    if not RUN_JOBS_IN_API:
+        return 0
+    resumed = 0
+    for job in db.query(BackgroundJob).filter(BackgroundJob.status.in_(ACTIVE_STATUSES)).all():
+        resumed += _resume_abandoned(db, job)
+    if resumed:
+        debug_log(f"Resumed {resumed} interrupted jobs on {WORKER_ID}")
+    return resumed
@@ -0,0 +1,179 @@
+"""
+Near-duplicate file names (/api/files/similar).
+
+Each file's normalized name stem (backend.name_similarity) is kept in File.name_stem. Every
+distinct stem of a user is a NameStem row and its MinHash LSH buckets are NameStemBucket
+rows. Whenever files are written, duplicate_index_service.reindex_files() hands their stems
+to index_name_stems(): a new stem is compared with the exact trigram Jaccard similarity
+against every stem it shares a bucket with, and the clusters of those reaching
+SIMILAR_NAME_THRESHOLD are merged. A write costs work in proportion to its new stems'
+buckets, not to the size of the inventory.
+
+Listings page through clusters by cluster_id. Each cluster is regrouped from its live files
+when read (similar_name_groups), which applies a stricter requested threshold and splits a
+cluster whose linking stem has since been renamed or deleted. On PostgreSQL a
+transaction-scoped advisory lock per user serialises index updates. Files stored before the
+index existed are indexed by the a1d5c8e3f427 migration.
+"""
+from backend.models import File, NameStem, NameStemBucket, User
+from backend.config import DUPLICATE_PAGE_SIZE, DUPLICATE_MAX_PAGE_SIZE, SIMILAR_NAME_THRESHOLD, SIMILAR_MAX_BUCKET_SIZE
+from backend.name_similarity import UnionFind, jaccard, normalize_name, similar_name_groups, stem_buckets, trigrams
+from backend.services.duplicates_service import encode_cursor, decode_cursor
+from fastapi import HTTPException
+from sqlalchemy import and_, bindparam, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from itertools import groupby
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+STEM_CHUNK_SIZE = 500
+# pg_advisory_xact_lock(namespace, user_id) held while a user's stems are indexed
+STEM_LOCK_NAMESPACE = 24
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def _chunks(values: Sequence[Any], size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def lock_user_stems(db: Session, user_id: int) -> None:
+    """Serialises index updates of one user's stems until the transaction ends (PostgreSQL only)."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"), {"namespace": STEM_LOCK_NAMESPACE, "user_id": user_id})
+
+def _insert_ignoring_existing(db: Session, table, index_elements: List[str], rows: List[Dict[str, Any]]) -> None:
+    insert = _INSERTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        db.execute(insert(table).on_conflict_do_nothing(index_elements=index_elements), rows)
+    else:
+        db.execute(table.insert(), rows)
+
+def index_name_stems(db: Session, user_id: int, stems: Iterable[str]) -> int:
+    """
+    Adds a NameStem (and its buckets) for each stem the user does not have yet and merges
+    the clusters of the stems it matches. Call after writing files, before commit. Returns
+    the number of new stems.
+    """
+    stems = sorted({stem for stem in stems if stem})
+    if not stems:
+        return 0
+    db.flush()
+    lock_user_stems(db, user_id)
+    new = []
+    for chunk in _chunks(stems, STEM_CHUNK_SIZE):
+        known = {stem for stem, in db.query(NameStem.stem).filter(NameStem.user_id == user_id, NameStem.stem.in_(chunk))}
+        new += [stem for stem in chunk if stem not in known]
+    if not new:
+        return 0
+
+    table = NameStem.__table__
+    _insert_ignoring_existing(db, table, ["user_id", "stem"], [{"user_id": user_id, "stem": stem} for stem in new])
+    # Every new stem starts out as a cluster of its own
+    db.execute(table.update().where(table.c.user_id == user_id, table.c.cluster_id.is_(None)).values(cluster_id=table.c.id))
+    ids: Dict[str, int] = {}
+    for chunk in _chunks(new, STEM_CHUNK_SIZE):
+        ids.update(db.query(NameStem.stem, NameStem.id).filter(NameStem.user_id == user_id, NameStem.stem.in_(chunk)))
+
+    buckets = {stem: set(stem_buckets(stem)) for stem in new}
+    _insert_ignoring_existing(db, NameStemBucket.__table__, ["user_id", "bucket", "stem_id"], [
+        {"user_id": user_id, "bucket": bucket, "stem_id": ids[stem]} for stem, keys in buckets.items() for bucket in sorted(keys)
+    ])
+    bucket_members: Dict[str, List[int]] = defaultdict(list)
+    for chunk in _chunks(sorted(set().union(*buckets.values())), STEM_CHUNK_SIZE):
+        for bucket, stem_id in db.query(NameStemBucket.bucket, NameStemBucket.stem_id).filter(
+            NameStemBucket.user_id == user_id, NameStemBucket.bucket.in_(chunk)
+        ):
+            bucket_members[bucket].append(stem_id)
+    candidates = {
+        stem: {other for bucket in keys if len(bucket_members[bucket]) <= SIMILAR_MAX_BUCKET_SIZE for other in bucket_members[bucket]} - {ids[stem]}
+        for stem, keys in buckets.items()
+    }
+
+    known_stems: Dict[int, Tuple[FrozenSet[str], int]] = {}
+    for chunk in _chunks(sorted(set(ids.values()).union(*candidates.values())), STEM_CHUNK_SIZE):
+        for stem_id, stem, cluster_id in db.query(NameStem.id, NameStem.stem, NameStem.cluster_id).filter(NameStem.id.in_(chunk)):
+            known_stems[stem_id] = (trigrams(stem), cluster_id)
+    clusters = UnionFind()
+    for stem in new:
+        shingles, cluster_id = known_stems[ids[stem]]
+        for other in candidates[stem]:
+            other_shingles, other_cluster = known_stems[other]
+            if clusters.find(cluster_id) != clusters.find(other_cluster) and jaccard(shingles, other_shingles) >= SIMILAR_NAME_THRESHOLD:
+                clusters.union(cluster_id, other_cluster)
+    merges = [{"old_cluster": cluster_id, "new_cluster": clusters.find(cluster_id)} for cluster_id in list(clusters.parent)]
+    merges = [merge for merge in merges if merge["old_cluster"] != merge["new_cluster"]]
+    if merges:
+        db.execute(table.update().where(
+            table.c.user_id == user_id, table.c.cluster_id == bindparam("old_cluster")
+        ).values(cluster_id=bindparam("new_cluster")), merges)
+    return len(new)
+
+def _live_stem_files():
+    return and_(File.user_id == NameStem.user_id, File.name_stem == NameStem.stem, File.is_deleted.isnot(True))
+
+def similar_groups_page(
+    db: Session,
+    user_id: int,
+    threshold: float,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Groups from the next clusters after ``cursor``, regrouped at ``threshold``, until at least
+    ``limit`` groups are collected (a cluster is never split across pages). Returns
+    (groups, next_cursor).
+    """
+    limit = max(1, min(limit or DUPLICATE_PAGE_SIZE, DUPLICATE_MAX_PAGE_SIZE))
+    after = decode_cursor(cursor, int)
+    last = after[0] if after else 0
+    groups: List[Dict[str, Any]] = []
+    more = True
+    while more and len(groups) < limit:
+        clusters = [cluster_id for cluster_id, in db.query(NameStem.cluster_id).join(File, _live_stem_files()).filter(
+            NameStem.user_id == user_id, NameStem.cluster_id > last
+        ).group_by(NameStem.cluster_id).having(func.count(func.distinct(File.name)) > 1).order_by(NameStem.cluster_id).limit(limit + 1)]
+        more = len(clusters) > limit
+        clusters = clusters[:limit]
+        rows = db.query(NameStem.cluster_id, File.id, File.name).join(File, _live_stem_files()).filter(
+            NameStem.user_id == user_id, NameStem.cluster_id.in_(clusters)
+        ).order_by(NameStem.cluster_id, File.id) if clusters else []
+        for position, (cluster_id, members) in enumerate(groupby(rows, key=lambda row: row[0])):
+            groups += similar_name_groups([(file_id, name) for _, file_id, name in members], threshold)
+            last = cluster_id
+            if len(groups) >= limit:
+                more = more or position + 1 < len(clusters)
+                break
+    return groups, encode_cursor(last) if more else None
+
+def get_similar_files_service(
+    current_user: User,
+    db: Session,
+    threshold: Optional[float] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    threshold = SIMILAR_NAME_THRESHOLD if threshold is None else threshold
+    # The stored clusters were built at SIMILAR_NAME_THRESHOLD, so a request can only tighten it
+    if not SIMILAR_NAME_THRESHOLD <= threshold <= 1:
+        raise HTTPException(status_code=400, detail=f"threshold must be between {SIMILAR_NAME_THRESHOLD} and 1")
+    page, next_cursor = similar_groups_page(db, current_user.id, threshold, cursor, limit)
+
+    ids = [file_id for group in page for file_id, _ in group["files"]]
+    files = {f.id: f for f in db.query(File).filter(File.id.in_(ids))} if ids else {}
+    similar = [
+        [
+            {
+                "id": f.id,
+                "name": f.name,
+                "size": f.size,
+                "path": f.path,
+                "provider": f.provider,
+                "last_modified": f.last_modified.isoformat() if f.last_modified else None,
+                "similarityScore": score,
+            }
+            for f, score in ((files.get(file_id), score) for file_id, score in group["files"])
+            if f is not None
+        ]
+        for group in page
+    ]
+    return {"similar": similar, "next_cursor": next_cursor}
@@ -4,6 +4,7 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from backend.models import User, File, CloudConnection, StorageAnalysis, FileUsagePattern, OptimizationRecommendation
 from backend.services.cost_calculator_service import CostCalculatorService
+from backend.services.duplicates_service import duplicate_groups_page, duplicate_totals
 from collections import defaultdict
 import os
 
@@ -35,9 +36,7 @@ class StorageAnalysisService:
         
         for connection in connections:
             provider = connection.provider
-            provider_files = [f for f in files if f.cloud_provider == provider]
-            
-            analysis = self._analyze_provider_storage(provider_files)
+            analysis = self._analyze_provider_storage(user_id, provider)
             cloud_analysis[provider] = analysis
             
             # Add to totals
@@ -58,13 +57,15 @@ class StorageAnalysisService:
             'recommendations': self.generate_recommendations(user_id)
         }
     
-    def _analyze_provider_storage(self, files: List[File]) -> Dict[str, Any]:
+    def _analyze_provider_storage(self, user_id: int, provider: str) -> Dict[str, Any]:
         """Analyze storage for a specific cloud provider"""
-        total_size = sum(f.size or 0 for f in files)
-        total_files = len(files)
+        total_files, total_size = self.db.query(func.count(File.id), func.coalesce(func.sum(File.size), 0)).filter(
+            File.user_id == user_id,
+            File.provider == provider
+        ).one()
         
         # Find duplicates
-        duplicate_analysis = self._find_duplicates(files)
+        duplicate_analysis = self._find_duplicates(user_id, provider)
         
         # Calculate potential savings
         potential_savings = self.cost_calculator.calculate_storage_cost(
@@ -78,37 +79,34 @@ class StorageAnalysisService:
             'duplicate_size': duplicate_analysis['duplicate_size'],
             'duplicate_count': duplicate_analysis['duplicate_count'],
             'potential_savings': potential_savings,
-            'duplicate_groups': duplicate_analysis['groups']
+            'duplicate_group_count': duplicate_analysis['group_count'],
+            'duplicate_groups': duplicate_analysis['groups'],
+            'duplicate_groups_next_cursor': duplicate_analysis['next_cursor']
         }
     
-    def _find_duplicates(self, files: List[File]) -> Dict[str, Any]:
-        """Find duplicate files based on name and size"""
-        file_groups = defaultdict(list)
-        
-        for file in files:
-            # Group by name and size (simple deduplication)
-            key = f"{file.name}_{file.size}"
-            file_groups[key].append(file)
-        
-        duplicate_size = 0
-        duplicate_count = 0
-        duplicate_groups = []
+    def _find_duplicates(self, user_id: int, provider: Optional[str] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Find duplicate files based on name and size. The counts cover every group; 'groups' is
+        one page of them, after ``cursor``, and 'next_cursor' fetches the next (None on the last).
+        """
+        filters = [File.provider == provider] if provider else []
+        totals = duplicate_totals(self.db, [user_id], filters)
+        groups, next_cursor = duplicate_groups_page(self.db, [user_id], filters, cursor=cursor)
         
-        for key, group in file_groups.items():
-            if len(group) > 1:
-                duplicate_size += (group[0].size or 0) * (len(group) - 1)
-                duplicate_count += len(group) - 1
-                duplicate_groups.append({
-                    'key': key,
+        return {
+            'duplicate_size': totals['duplicate_size'],
+            'duplicate_count': totals['duplicate_count'],
+            'group_count': totals['groups'],
+            'next_cursor': next_cursor,
+            'groups': [
+                {
+                    'key': f"{group[0].name}_{group[0].size}",
                     'files': group,
                     'size': group[0].size or 0,
                     'count': len(group)
-                })
-        
-        return {
-            'duplicate_size': duplicate_size,
-            'duplicate_count': duplicate_count,
-            'groups': duplicate_groups
+                }
+                for group in groups
+            ]
         }
     
     def _analyze_file_types(self, files: List[File]) -> Dict[str, Any]:
@@ -219,12 +217,14 @@ class StorageAnalysisService:
             })
         
         # Find duplicate files
-        duplicate_groups = self._find_duplicates(files)['groups']
+        duplicates = self._find_duplicates(user_id)
+        duplicate_groups = duplicates['groups']
         if duplicate_groups:
+            # file_ids covers the first page of groups; the description counts them all
             recommendations.append({
                 'type': 'delete',
                 'title': 'Remove Duplicates',
-                'description': f'Found {len(duplicate_groups)} groups of duplicate files',
+                'description': f"Found {duplicates['group_count']} groups of duplicate files",
                 'potential_savings': duplicate_groups[0]['size'] * (duplicate_groups[0]['count'] - 1) / (1024**3),
                 'priority': 5,
                 'file_ids': [f.id for group in duplicate_groups for f in group['files'][1:]]  # Keep first, delete rest
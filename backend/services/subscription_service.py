@@ -99,7 +99,10 @@ class SubscriptionService:
                 "files_per_month": 1000,
                 "api_calls_per_month": 1000,
                 "retention_days": 30,
-                "features": ["basic_deduplication", "simple_analytics"]
+                "features": ["basic_deduplication", "simple_analytics"],
+                "concurrent_scans": 1,
+                "scan_priority": 0,
+                "scan_pool_share": 0.5  # Free-tier scans never hold more than half the scheduler pool
             },
             "pro": {
                 "storage_limit_gb": 1000,
@@ -107,7 +110,10 @@ class SubscriptionService:
                 "files_per_month": -1,  # Unlimited
                 "api_calls_per_month": 10000,
                 "retention_days": 365,
-                "features": ["advanced_ai", "cross_cloud_deduplication", "priority_support"]
+                "features": ["advanced_ai", "cross_cloud_deduplication", "priority_support"],
+                "concurrent_scans": 2,
+                "scan_priority": 10,
+                "scan_pool_share": 1.0
             },
             "business": {
                 "storage_limit_gb": 10000,
@@ -115,7 +121,10 @@ class SubscriptionService:
                 "files_per_month": -1,
                 "api_calls_per_month": 100000,
                 "retention_days": 1095,
-                "features": ["team_collaboration", "advanced_analytics", "custom_rules", "api_access"]
+                "features": ["team_collaboration", "advanced_analytics", "custom_rules", "api_access"],
+                "concurrent_scans": 4,
+                "scan_priority": 20,
+                "scan_pool_share": 1.0
             },
             "enterprise": {
                 "storage_limit_gb": -1,  # Unlimited
@@ -123,7 +132,10 @@ class SubscriptionService:
                 "files_per_month": -1,
                 "api_calls_per_month": -1,
                 "retention_days": -1,  # Unlimited
-                "features": ["custom_ai_models", "advanced_security", "compliance_tools", "dedicated_support"]
+                "features": ["custom_ai_models", "advanced_security", "compliance_tools", "dedicated_support"],
+                "concurrent_scans": -1,  # Unlimited
+                "scan_priority": 30,
+                "scan_pool_share": 1.0
             }
         }
         
@@ -1,9 +1,10 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func
 from datetime import datetime, timedelta
 from backend.models import User, File, CloudConnection
 from backend.services.subscription_service import SubscriptionService
+from backend.services.duplicates_service import duplicate_groups_page
 
 class TeamService:
     def __init__(self, db: Session):
@@ -116,8 +117,8 @@ class TeamService:
             "optimization_opportunities": optimization_opportunities
         }
     
-    def get_shared_workspace(self, team_id: str, user_id: int) -> Dict[str, Any]:
-        """Get shared workspace for the team"""
+    def get_shared_workspace(self, team_id: str, user_id: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get shared workspace for the team; shared files come a page at a time, after ``cursor``"""
         # Check if user is team member
         if not self._is_team_member(team_id, user_id):
             raise ValueError("User is not a team member")
@@ -127,7 +128,7 @@ class TeamService:
         member_ids = [member["user_id"] for member in team_members]
         
         # Get shared files (files that might be duplicates across team members)
-        shared_files = self._find_shared_files(member_ids)
+        shared_files, next_cursor = self._find_shared_files(member_ids, cursor)
         
         # Get recent team activity
         recent_activity = self._get_team_activity(team_id)
@@ -135,6 +136,7 @@ class TeamService:
         return {
             "team_id": team_id,
             "shared_files": shared_files,
+            "shared_files_next_cursor": next_cursor,
             "recent_activity": recent_activity,
             "members": team_members
         }
@@ -254,32 +256,20 @@ class TeamService:
         else:
             return "other"
     
-    def _find_shared_files(self, member_ids: List[int]) -> List[Dict[str, Any]]:
-        """Find files that might be shared across team members"""
-        # Get all files from team members
-        all_files = self.db.query(File).filter(File.user_id.in_(member_ids)).all()
+    def _find_shared_files(self, member_ids: List[int], cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Find files that might be shared across team members: one page of name/size groups and the next cursor"""
+        groups, next_cursor = duplicate_groups_page(self.db, member_ids, cursor=cursor)
         
-        # Group files by name and size to find potential duplicates
-        file_groups = {}
-        for file in all_files:
-            key = f"{file.name}_{file.size}"
-            if key not in file_groups:
-                file_groups[key] = []
-            file_groups[key].append(file)
-        
-        # Find groups with multiple files (potential duplicates)
-        shared_files = []
-        for key, files in file_groups.items():
-            if len(files) > 1:
-                shared_files.append({
-                    "name": files[0].name,
-                    "size": files[0].size,
-                    "count": len(files),
-                    "owners": [f.user_id for f in files],
-                    "total_size_gb": (files[0].size or 0) * len(files) / (1024**3)
-                })
-        
-        return shared_files
+        return [
+            {
+                "name": files[0].name,
+                "size": files[0].size,
+                "count": len(files),
+                "owners": [f.user_id for f in files],
+                "total_size_gb": (files[0].size or 0) * len(files) / (1024**3)
+            }
+            for files in groups
+        ], next_cursor
     
     def _get_team_activity(self, team_id: str) -> List[Dict[str, Any]]:
         """Get recent team activity"""
@@ -3,6 +3,7 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 import uuid
 import sys
 import os
@@ -13,7 +14,7 @@ engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": Fal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Import models and routers
-from backend.models import Base as DBBase, User
+from backend.models import Base as DBBase, User, File, DuplicateGroup, BackgroundJob, CloudConnection, DriveDeltaState, FileSyncRoot, NameStem, NameStemBucket, Subscription
 from backend.auth import get_password_hash, create_access_token, get_current_user
 from backend.routers import (
     ai, analytics, auth_router, cloud, files, google, images, onedrive, rules, user, subscription
@@ -36,20 +37,20 @@ def test_app():
     app.include_router(subscription.router)
     return app
 
-@pytest.fixture(scope="session", autouse=True)
+@pytest.fixture(scope="session")
 def setup_database():
     DBBase.metadata.create_all(bind=engine)
     yield
     DBBase.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
-def db_session():
+def db_session(setup_database):
     db = SessionLocal()
     yield db
     db.close()
 
 @pytest.fixture(scope="function")
-def client(test_app):
+def client(test_app, override_dependencies):
     return TestClient(test_app)
 
 @pytest.fixture(scope="function")
@@ -74,7 +75,7 @@ def user_token(test_user):
     token = create_access_token({"sub": str(test_user.id)})
     return token
 
-@pytest.fixture(scope="function", autouse=True)
+@pytest.fixture(scope="function")
 def override_dependencies(test_app, test_user, db_session):
     # Override get_db
     def _get_db_override():
@@ -83,4 +84,46 @@ def override_dependencies(test_app, test_user, db_session):
     from backend.database import get_db
     test_app.dependency_overrides[get_db] = _get_db_override
     yield
-    test_app.dependency_overrides.clear() 
\ No newline at end of file
+    test_app.dependency_overrides.clear()
+
+# Service tests run against a private in-memory database holding only the tables services
+# write to (users.preferences is JSONB, which SQLite cannot create)
+SERVICE_TABLES = (File, DuplicateGroup, BackgroundJob, CloudConnection, DriveDeltaState, FileSyncRoot, NameStem, NameStemBucket, Subscription)
+
+@pytest.fixture(scope="function")
+def make_memory_session():
+    sessions = []
+    def _make():
+        memory_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        for model in SERVICE_TABLES:
+            model.__table__.create(memory_engine)
+        session = sessionmaker(bind=memory_engine)()
+        sessions.append(session)
+        return session
+    yield _make
+    for session in sessions:
+        session.close()
+
+@pytest.fixture(scope="function")
+def memory_db(make_memory_session):
+    return make_memory_session()
+
+@pytest.fixture(scope="function")
+def file_db(tmp_path):
+    # For tests that commit from several threads at once: the in-memory database is one shared connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'service.db'}", connect_args={"check_same_thread": False})
+    for model in SERVICE_TABLES:
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+@pytest.fixture(scope="function")
+def make_user():
+    # Unsaved users: services only read current_user.id
+    def _make(user_id=1):
+        user = User()
+        user.id = user_id
+        return user
+    return _make
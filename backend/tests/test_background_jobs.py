@@ -0,0 +1,99 @@
+from datetime import timedelta
+from backend import scan_results
+from backend.models import BackgroundJob
+from backend.services import background_job_service, scan_job_service
+from backend.services.background_job_service import claim_next_job, _store_result
+from backend.services.subscription_service import SubscriptionService
+from backend.services.scan_job_service import _now, get_scan_job_result_service, resume_interrupted_scan_jobs
+
+def _job(db, job_id, priority=0, job_type="scan", user_id=1, **kwargs):
+    db.add(BackgroundJob(id=job_id, user_id=user_id, job_type=job_type, status="pending", priority=priority, **kwargs))
+    db.commit()
+
+def test_jobs_are_claimed_once_in_priority_order(mocker, memory_db):
+    db = memory_db
+    mocker.patch.object(background_job_service, "WORKER_PROCESSES", 8)
+    _job(db, "low", priority=0, user_id=1)
+    _job(db, "high", priority=15, user_id=2)
+    _job(db, "organise", priority=5, job_type="organise", user_id=3)
+
+    assert claim_next_job(db) == ("high", "scan")
+    assert claim_next_job(db) == ("organise", "organise")
+    assert claim_next_job(db, ["dedup"]) is None
+    assert claim_next_job(db) == ("low", "scan")
+    assert claim_next_job(db) is None
+
+def test_jobs_of_dead_workers_are_claimed_again(mocker, memory_db):
+    db = memory_db
+    _job(db, "abandoned", worker_id="gone:1", heartbeat_at=_now() - timedelta(hours=1))
+    _job(db, "alive", worker_id="busy:2", heartbeat_at=_now(), user_id=2)
+    mocker.patch.object(background_job_service, "WORKER_ID", "me:3")
+    mocker.patch.object(background_job_service, "WORKER_PROCESSES", 8)
+
+    assert claim_next_job(db) == ("abandoned", "scan")
+    assert claim_next_job(db) is None
+    assert db.query(BackgroundJob).get("abandoned").worker_id == "me:3"
+
+def test_queue_claims_respect_per_user_and_per_plan_limits(mocker, memory_db):
+    db = memory_db
+    plans = SubscriptionService()
+    # Two worker processes: free-tier jobs may hold one of them
+    mocker.patch.object(background_job_service, "WORKER_PROCESSES", 2)
+    mocker.patch.object(background_job_service, "_plan_limits", side_effect=lambda db, user_id: (
+        ("pro", plans.get_plan_limits(db, "pro")) if user_id == 3 else ("free", plans.get_plan_limits(db, "free"))
+    ))
+    _job(db, "first", priority=5, user_id=1)
+    _job(db, "second", priority=5, user_id=1)
+    _job(db, "other", priority=0, user_id=2)
+    _job(db, "paid", priority=0, user_id=3)
+
+    assert claim_next_job(db) == ("first", "scan")
+    # User 1 is at concurrent_scans and the free tier at its pool share; the pro user goes ahead
+    assert claim_next_job(db) == ("paid", "scan")
+    assert claim_next_job(db) is None
+
+    db.query(BackgroundJob).filter_by(id="first").update({"status": "complete"})
+    db.commit()
+    # Of the free-tier jobs, the higher-priority one of user 1 is next again
+    assert claim_next_job(db) == ("second", "scan")
+    assert claim_next_job(db) is None
+
+def test_startup_resumes_abandoned_jobs_of_every_type(memory_db, mocker, tmp_path):
+    db = memory_db
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    mocker.patch.object(scan_job_service, "RUN_JOBS_IN_API", True)
+    schedule_scan = mocker.patch.object(scan_job_service, "_schedule_job")
+    schedule_service = mocker.patch.object(background_job_service, "schedule_service_job")
+    stale = _now() - timedelta(hours=1)
+    for job_id, job_type in (("scan", "scan"), ("dedup", "dedup"), ("organise", "organise"), ("ingest", "ingest")):
+        _job(db, job_id, job_type=job_type, worker_id="gone:1", heartbeat_at=stale)
+    _job(db, "busy", job_type="dedup", worker_id="busy:2", heartbeat_at=_now())
+
+    assert resume_interrupted_scan_jobs(db) == 3
+    assert [call.args[0].id for call in schedule_scan.call_args_list] == ["scan"]
+    assert sorted(call.args[0].id for call in schedule_service.call_args_list) == ["dedup", "organise"]
+    ingest = db.query(BackgroundJob).get("ingest")
+    assert (ingest.status, ingest.error) == ("error", "Job was interrupted.")
+
+def test_large_service_results_are_spooled_and_paged(memory_db, make_user, mocker, tmp_path):
+    db = memory_db
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    mocker.patch.object(background_job_service, "SCAN_RESULT_INLINE_LIMIT", 3)
+    groups = [[{"id": f"{i}a"}, {"id": f"{i}b"}] for i in range(5)]
+    for job_id, found in (("small", groups[:3]), ("large", groups)):
+        _job(db, job_id, job_type="dedup")
+        job = db.query(BackgroundJob).get(job_id)
+        _store_result(job, {"duplicates": found})
+        job.status = "complete"
+    db.commit()
+
+    small = db.query(BackgroundJob).get("small")
+    assert (small.result, small.result_path, small.result_count) == ({"duplicates": groups[:3]}, None, 3)
+    large = db.query(BackgroundJob).get("large")
+    assert large.result == {"duplicates": None} and large.result_count == 5
+
+    page = get_scan_job_result_service(make_user(), db, "large", offset=3, limit=10)
+    assert (page["files"], page["total"], page["next_offset"]) == (groups[3:], 5, None)
+    page = get_scan_job_result_service(make_user(), db, "small", offset=0, limit=2)
+    assert (page["files"], page["next_offset"]) == (groups[:2], 2)
+
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import create_engine, text
+from backend.filename_normalization import NAME_RULES, active_rules, name_rule, normalize_filename
+from backend.models import File
+from backend.services.duplicates_service import get_copy_variants_service
+from backend.services.file_ingest_service import upsert_files_service
+
+def test_default_rules_canonicalize_copy_style_names():
+    for name in ("IMG_001.jpg", "IMG_001 (1).JPEG", "Copy of img_001.jpg", "img_001 - Copy (2).jpg", "IMG_001_copy 2.jpe"):
+        assert normalize_filename(name) == "img_001.jpg"
+    # Years, long numbers and a bare trailing "copy" are part of the name
+    for name in ("Budget (2024).xlsx", "Scan (12345).pdf", "Hard copy.pdf", "Photocopy.pdf"):
+        assert normalize_filename(name) == name.lower()
+    assert normalize_filename("Résumé.PDF") == normalize_filename("Résumé.pdf") == "résumé.pdf"
+    assert normalize_filename("(1).txt") == "(1).txt"
+    assert normalize_filename("Report.docx", active_rules(["case"])) == "report.docx"
+
+def test_rules_are_pluggable(mocker):
+    mocker.patch.dict(NAME_RULES)
+
+    @name_rule("strip_version")
+    def strip_version(stem, ext):
+        return stem.rsplit("_v", 1)[0], ext
+
+    rules = active_rules(["case", "strip_version"])
+    assert normalize_filename("Plan_v3.md", rules) == "plan.md"
+    with pytest.raises(ValueError):
+        active_rules(["case", "no_such_rule"])
+
+def test_copy_variants_are_grouped_by_normalized_name_and_size(memory_db, make_user):
+    db = memory_db
+    upsert_files_service(make_user(), db, [
+        {"cloud_id": "r1", "name": "report.docx", "size": 10},
+        {"cloud_id": "r2", "name": "Copy of report.docx", "size": 10},
+        {"cloud_id": "r3", "name": "report (1).docx", "size": 11},  # an edited version, not a copy
+        {"cloud_id": "s1", "name": "same.txt", "size": 5},
+        {"cloud_id": "s2", "name": "same.txt", "size": 5},  # exact duplicates are listed elsewhere
+        {"cloud_id": "p0-2", "name": "Photo0 - Copy.JPEG", "size": 0},
+    ] + [{"cloud_id": f"p{i}-{c}", "name": f"photo{i}{suffix}.jpg", "size": i} for i in range(5) for c, suffix in enumerate(["", " (1)"])])
+    assert db.query(File).filter_by(cloud_id="r2").one().normalized_name == "report.docx"
+
+    first = get_copy_variants_service(make_user(), db, limit=4)
+    second = get_copy_variants_service(make_user(), db, first["next_cursor"], limit=4)
+    groups = [sorted(f["name"] for f in group) for group in first["variants"] + second["variants"]]
+    assert groups == [
+        ["Photo0 - Copy.JPEG", "photo0 (1).jpg", "photo0.jpg"],
+        ["photo1 (1).jpg", "photo1.jpg"],
+        ["photo2 (1).jpg", "photo2.jpg"],
+        ["photo3 (1).jpg", "photo3.jpg"],
+        ["photo4 (1).jpg", "photo4.jpg"],
+        ["Copy of report.docx", "report.docx"],
+    ]
+    assert second["next_cursor"] is None
+
+def test_variant_grouping_uses_the_normalized_name_index(memory_db):
+    db = memory_db
+    plan = " ".join(str(row) for row in db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT normalized_name, size FROM files WHERE user_id = 1 AND normalized_name IS NOT NULL "
+        "AND size IS NOT NULL GROUP BY normalized_name, size HAVING count(DISTINCT name) > 1 ORDER BY normalized_name, size LIMIT 101"
+    )))
+    assert "idx_file_user_normalized_name_size" in plan and "TEMP B-TREE FOR GROUP BY" not in plan
@@ -0,0 +1,54 @@
+import os
+from types import SimpleNamespace
+from backend.download_cache import DownloadCache, cache_key
+
+def _store(cache, key, body, content_type="image/jpeg"):
+    writer = cache.writer(key, content_type, len(body))
+    writer.write(body)
+    writer.commit()
+
+def test_identical_content_is_stored_once(tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=1000)
+    _store(cache, "a", b"x" * 100)
+    _store(cache, "b", b"x" * 100)
+
+    first, second = cache.lookup("a"), cache.lookup("b")
+    assert first.path == second.path and first.content_type == "image/jpeg"
+    assert (cache.stats()["entries"], cache.stats()["bytes"], cache.stats()["stores"]) == (1, 100, 1)
+    assert cache.lookup("c") is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (2, 1)
+
+def test_least_recently_used_blobs_are_evicted(tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=250)
+    _store(cache, "a", b"a" * 100)
+    _store(cache, "b", b"b" * 100)
+    cache.lookup("a")
+    _store(cache, "c", b"c" * 100)
+
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") and cache.lookup("c")
+    assert (cache.stats()["bytes"], cache.stats()["evictions"]) == (200, 1)
+
+    # A fresh instance (restart, another worker) picks up what is on disk
+    assert DownloadCache(str(tmp_path), max_bytes=250).lookup("c").digest == cache.lookup("c").digest
+
+def test_oversized_and_aborted_bodies_are_not_kept(tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=1000, max_file_bytes=50)
+    assert cache.writer("big", "video/mp4", 51) is None
+
+    writer = cache.writer("unknown-length", "video/mp4")
+    writer.write(b"x" * 40)
+    writer.write(b"x" * 40)
+    writer.commit()
+    writer = cache.writer("disconnected", "image/png")
+    writer.write(b"x" * 10)
+    writer.abort()
+
+    assert cache.lookup("unknown-length") is None and cache.lookup("disconnected") is None
+    assert os.listdir(cache.tmp_dir) == []
+
+def test_cache_key_changes_with_the_file_version():
+    file = SimpleNamespace(user_id=1, provider="onedrive", cloud_id="c1", size=10, last_modified="2024-01-01")
+    before = cache_key(file)
+    file.size = 11
+    assert cache_key(file) != before
@@ -0,0 +1,104 @@
+from backend.models import DuplicateGroup, File
+from backend.services import duplicate_index_service
+from backend.services.duplicates_service import get_duplicate_files_service
+from backend.services.enhanced_duplicates_service import EnhancedDuplicatesService
+from backend.services.file_ingest_service import upsert_files_service
+from backend.services.file_service import delete_files_service
+from backend.services.images_service import get_duplicate_images_service
+from backend.services.onedrive_sync_service import _apply_file_changes, _delete_files
+
+def _groups(db, user_id=1):
+    return {
+        (g.key_type, g.size): (g.member_count, g.wasted_bytes, g.image_count, g.providers)
+        for g in db.query(DuplicateGroup).filter_by(user_id=user_id)
+    }
+
+def test_upserts_and_deletes_keep_group_counts_current(memory_db, make_user):
+    db = memory_db
+    upsert_files_service(make_user(), db, [
+        {"cloud_id": "a1", "name": "a.jpg", "size": 10, "hashes": {"quickXorHash": "qa"}},
+        {"cloud_id": "a2", "name": "copy of a.jpg", "size": 10, "hashes": {"quickXorHash": "qa"}},
+        {"cloud_id": "n1", "name": "notes.txt", "size": 7},
+        {"cloud_id": "n2", "name": "notes.txt", "size": 7},
+        {"cloud_id": "e1", "name": "empty.txt", "size": 0},
+        {"cloud_id": "e2", "name": "empty.txt", "size": 0},
+    ])
+    assert _groups(db) == {
+        ("hash", 10): (2, 10, 2, {"onedrive": 2}),
+        ("name_size", 7): (2, 7, 0, {"onedrive": 2}),
+    }
+
+    upsert_files_service(make_user(), db, [
+        {"cloud_id": "a3", "name": "a.jpg", "size": 10, "hashes": {"quickXorHash": "qa"}, "provider": "googledrive"},
+        {"cloud_id": "n2", "name": "notes-v2.txt", "size": 7},  # renamed out of its group
+    ])
+    assert _groups(db) == {("hash", 10): (3, 20, 3, {"onedrive": 2, "googledrive": 1})}
+
+    ids = [f.id for f in db.query(File).filter(File.cloud_id.in_(["a1", "a3"]))]
+    assert delete_files_service(make_user(), db, ids) == {"deleted": 2}
+    assert _groups(db) == {}
+
+def test_delta_sync_updates_and_deletes_are_indexed(memory_db):
+    db = memory_db
+    items = [{"id": f"d{i}", "name": "clip.mp4", "size": 100, "file": {"hashes": {"quickXorHash": "qv"}}} for i in range(3)]
+    _apply_file_changes(db, 1, "root", items)
+    db.commit()
+    assert _groups(db) == {("hash", 100): (3, 200, 0, {"onedrive": 3})}
+
+    _delete_files(db, 1, ["d0"])
+    db.commit()
+    assert _groups(db) == {("hash", 100): (2, 100, 0, {"onedrive": 2})}
+
+    _apply_file_changes(db, 1, "root", [{"id": "d1", "name": "clip.mp4", "size": 100, "file": {"hashes": {"quickXorHash": "edited"}}}])
+    db.commit()
+    assert _groups(db) == {}
+
+def test_reads_page_groups_by_wasted_bytes_and_only_touch_changed_keys(mocker, memory_db, make_user):
+    db = memory_db
+    files = [{"cloud_id": f"f{size}-{copy}", "name": f"f{size}.png", "size": size} for size in range(1, 6) for copy in range(size % 3 + 2)]
+    files += [{"cloud_id": "x1", "name": "doc.pdf", "size": 50}, {"cloud_id": "x2", "name": "doc.pdf", "size": 50}]
+    upsert_files_service(make_user(), db, files)
+
+    first = get_duplicate_files_service(make_user(), db, limit=4)
+    second = get_duplicate_files_service(make_user(), db, first["next_cursor"], limit=4)
+    wasted = [g["wasted_bytes"] for g in first["groups"] + second["groups"]]
+    assert wasted == sorted(wasted, reverse=True) and len(wasted) == 6 and second["next_cursor"] is None
+    assert all(len(group) == g["member_count"] for group, g in zip(first["duplicates"], first["groups"]))
+
+    images = get_duplicate_images_service(make_user(), db, limit=100)
+    assert {group[0]["name"] for group in images["duplicates"]} == {f"f{size}.png" for size in range(1, 6)}
+
+    refresh = mocker.spy(duplicate_index_service, "refresh_duplicate_groups")
+    upsert_files_service(make_user(), db, [{"cloud_id": "x3", "name": "doc.pdf", "size": 50}])
+    assert len(refresh.call_args.args[2]) == 1
+    assert _groups(db)[("name_size", 50)][:2] == (3, 100)
+
+def test_cross_cloud_duplicates_read_hash_groups_spanning_providers(mocker, memory_db, make_user):
+    db = memory_db
+    upsert_files_service(make_user(), db, [
+        {"cloud_id": "o1", "name": "a.jpg", "size": 10, "hashes": {"sha1Hash": "S1"}},
+        {"cloud_id": "g1", "name": "a.jpg", "size": 10, "hashes": {"sha1Checksum": "s1"}, "provider": "googledrive"},
+        {"cloud_id": "o2", "name": "b.jpg", "size": 20, "hashes": {"sha1Hash": "S2"}},
+        {"cloud_id": "o3", "name": "b.jpg", "size": 20, "hashes": {"sha1Hash": "S2"}},
+    ])
+    service = EnhancedDuplicatesService()
+    found = service.find_cross_cloud_duplicates(1, db)
+    assert [(d["hash"], d["clouds"], d["potential_savings"]) for d in found] == [("s1", ["googledrive", "onedrive"], 10)]
+
+    mocker.patch.object(service, "delete_from_cloud")
+    service.merge_duplicates(found[0], "onedrive", db)
+    assert service.find_cross_cloud_duplicates(1, db) == []
+
+def test_recount_upserts_over_group_rows_written_elsewhere(memory_db, make_user):
+    db = memory_db
+    upsert_files_service(make_user(), db, [{"cloud_id": f"n{i}", "name": "notes.txt", "size": 7} for i in range(2)])
+    dup_key = db.query(DuplicateGroup.dup_key).scalar()
+    # Another writer's commit left a stale row for the same key
+    db.query(DuplicateGroup).delete()
+    db.execute(DuplicateGroup.__table__.insert().values(
+        user_id=1, dup_key=dup_key, key_type="name_size", size=7, member_count=9, image_count=0, provider_count=1, wasted_bytes=56,
+    ))
+    db.commit()
+
+    upsert_files_service(make_user(), db, [{"cloud_id": "n2", "name": "notes.txt", "size": 7}])
+    assert _groups(db) == {("name_size", 7): (3, 14, 0, {"onedrive": 3})}
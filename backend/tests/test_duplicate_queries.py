@@ -0,0 +1,88 @@
+import random
+from collections import defaultdict
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from backend.models import File
+from backend.services.duplicate_index_service import reindex_files
+from backend.services.duplicates_service import duplicate_groups_page, duplicate_totals, get_duplicate_files_service
+from backend.services.images_service import get_duplicate_images_service
+
+def _add_files(db, user_id, names_sizes):
+    for i, (name, size) in enumerate(names_sizes):
+        db.add(File(user_id=user_id, cloud_id=f"u{user_id}-{i}", provider="onedrive", name=name, size=size))
+    reindex_files(db, user_id)
+    db.commit()
+
+def test_pages_cover_exactly_the_python_grouping(memory_db, make_user):
+    db = memory_db
+    rng = random.Random(7)
+    rows = [(f"file{rng.randint(0, 60)}.{rng.choice(['jpg', 'txt'])}", rng.choice([1, 2, 3])) for _ in range(400)]
+    _add_files(db, 1, rows)
+    _add_files(db, 2, rows[:50])
+    expected = defaultdict(int)
+    for row in rows:
+        expected[row] += 1
+    expected = {key: count for key, count in expected.items() if count > 1}
+
+    seen, cursor, pages = {}, None, 0
+    while True:
+        page = get_duplicate_files_service(make_user(), db, cursor, limit=7)
+        pages += 1
+        for group in page["duplicates"]:
+            key = (group[0]["name"], group[0]["size"])
+            assert key not in seen and all((f["name"], f["size"]) == key for f in group)
+            seen[key] = len(group)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == -(-len(expected) // 7)
+    totals = duplicate_totals(db, [1])
+    assert totals["groups"] == len(expected)
+    assert totals["duplicate_count"] == sum(count - 1 for count in expected.values())
+    assert totals["duplicate_size"] == sum(size * (count - 1) for (_, size), count in expected.items())
+
+def test_images_and_deleted_files_and_team_grouping(memory_db, make_user):
+    db = memory_db
+    _add_files(db, 1, [("A.JPG", 5), ("A.JPG", 5), ("a.txt", 5), ("a.txt", 5), ("b.png", 9), ("b.png", 9)])
+    db.query(File).filter_by(name="b.png").first().is_deleted = True
+    reindex_files(db, 1)
+    db.commit()
+
+    images = get_duplicate_images_service(make_user(), db)
+    assert [[f["name"] for f in group] for group in images["duplicates"]] == [["A.JPG", "A.JPG"]]
+    assert images["next_cursor"] is None
+
+    _add_files(db, 2, [("a.txt", 5)])
+    groups, _ = duplicate_groups_page(db, [1, 2])
+    assert [(g[0].name, sorted({f.user_id for f in g})) for g in groups] == [("A.JPG", [1]), ("a.txt", [1, 2])]
+
+def test_storage_analysis_counts_every_group_and_pages_the_details(mocker, memory_db):
+    from backend.services import duplicates_service
+    from backend.services.storage_analysis_service import StorageAnalysisService
+    db = memory_db
+    mocker.patch.object(duplicates_service, "DUPLICATE_PAGE_SIZE", 2)
+    _add_files(db, 1, [(f"f{i}.txt", 10) for i in range(5)] * 2)
+    service = StorageAnalysisService(db)
+
+    first = service._find_duplicates(1)
+    assert (first["group_count"], first["duplicate_count"], len(first["groups"])) == (5, 5, 2)
+    names, cursor = [g["files"][0].name for g in first["groups"]], first["next_cursor"]
+    while cursor:
+        page = service._find_duplicates(1, cursor=cursor)
+        names += [g["files"][0].name for g in page["groups"]]
+        cursor = page["next_cursor"]
+    assert names == [f"f{i}.txt" for i in range(5)]
+
+def test_grouping_uses_the_user_name_size_index_and_rejects_bad_cursors(memory_db, make_user):
+    db = memory_db
+    plan = " ".join(str(row) for row in db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT name, size FROM files WHERE user_id = 1 AND size IS NOT NULL "
+        "GROUP BY name, size HAVING count(id) > 1 ORDER BY name, size LIMIT 101"
+    )))
+    assert "idx_file_user_name_size" in plan and "TEMP B-TREE" not in plan
+    with pytest.raises(HTTPException) as exc:
+        get_duplicate_files_service(make_user(), db, cursor="not-a-cursor")
+    assert exc.value.status_code == 400
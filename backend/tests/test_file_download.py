@@ -0,0 +1,143 @@
+import asyncio
+import errno
+import io
+import os
+import httpx
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+from backend import download_cache
+from backend.download_cache import DownloadCache
+from backend.models import File
+from backend.services import file_download_service
+from backend.services.file_download_service import proxy_file_download_service
+
+CONTENT = bytes(range(256)) * 1000
+ETAG = '"v1"'
+FRESH = datetime.now(timezone.utc) + timedelta(hours=1)
+
+class UpstreamBody(httpx.AsyncByteStream):
+    """Unread body, like a real network response (bytes content would be pre-read by httpx)."""
+    def __init__(self, content):
+        self.content = content
+
+    async def __aiter__(self):
+        for i in range(0, len(self.content), 10000):
+            yield self.content[i:i + 10000]
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+def _upstream(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/gone":
+        return httpx.Response(403)
+    if request.headers.get("if-none-match") == ETAG:
+        return httpx.Response(304, headers={"etag": ETAG})
+    headers = {"content-type": "video/mp4", "accept-ranges": "bytes", "etag": ETAG}
+    byte_range = request.headers.get("range")
+    if byte_range:
+        start, end = (int(part) for part in byte_range.split("=")[1].split("-"))
+        headers["content-range"] = f"bytes {start}-{end}/{len(CONTENT)}"
+        return httpx.Response(206, headers=headers, stream=UpstreamBody(CONTENT[start:end + 1]))
+    return httpx.Response(200, headers=headers, stream=UpstreamBody(CONTENT))
+
+@pytest.fixture
+def db(memory_db):
+    memory_db.add(File(id=1, user_id=1, cloud_id="c1", provider="onedrive", name="clip.mp4", url="https://files.example/clip.mp4", url_expires_at=FRESH))
+    memory_db.add(File(id=2, user_id=1, cloud_id="c2", provider="onedrive", name="old.mp4", url="https://files.example/gone", url_expires_at=FRESH))
+    memory_db.commit()
+    return memory_db
+
+@pytest.fixture
+def download(mocker, db, make_user):
+    def _download(file_id, headers=None, cache=None):
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(_upstream))
+            mocker.patch.object(file_download_service, "get_async_http_client", return_value=client)
+            mocker.patch.object(file_download_service, "get_download_cache", return_value=cache or DownloadCache(max_bytes=0))
+            response = await proxy_file_download_service(make_user(), db, file_id, FakeRequest(headers))
+            chunks = []
+            if hasattr(response, "body_iterator"):
+                async for chunk in response.body_iterator:
+                    chunks.append(chunk)
+            return response, chunks
+        return asyncio.run(run())
+    return _download
+
+def test_full_download_is_streamed_in_chunks(mocker, download):
+    mocker.patch.object(file_download_service, "DOWNLOAD_CHUNK_SIZE", 64 * 1024)
+    response, chunks = download(1)
+
+    assert response.status_code == 200
+    assert response.media_type == "video/mp4"
+    assert b"".join(chunks) == CONTENT
+    assert max(len(chunk) for chunk in chunks) <= 64 * 1024 and len(chunks) > 1
+    assert response.headers["etag"] == ETAG
+    assert "content-encoding" not in response.headers
+
+def test_range_and_conditional_requests_are_passed_through(download):
+    response, chunks = download(1, {"range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert b"".join(chunks) == CONTENT[100:200]
+
+    response, chunks = download(1, {"if-none-match": ETAG})
+    assert response.status_code == 304
+    assert chunks == []
+
+def test_missing_file_and_upstream_errors_are_404(download):
+    for file_id in (2, 99):
+        with pytest.raises(HTTPException) as exc:
+            download(file_id)
+        assert exc.value.status_code == 404
+
+def test_repeat_downloads_are_served_from_the_disk_cache(download, tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=10 * 1024 * 1024)
+    response, chunks = download(1, cache=cache)
+    assert b"".join(chunks) == CONTENT
+
+    response, _ = download(1, cache=cache)
+    assert response.path == cache.lookup("1:onedrive:c1:None:None").path
+    assert response.media_type == "video/mp4"
+    with open(response.path, "rb") as f:
+        assert f.read() == CONTENT
+    assert (cache.stats()["hits"], cache.stats()["stores"]) == (2, 1)
+
+    # Ranged first requests are relayed but not cached
+    cache = DownloadCache(str(tmp_path / "other"), max_bytes=10 * 1024 * 1024)
+    download(1, {"range": "bytes=0-9"}, cache=cache)
+    assert cache.stats()["stores"] == 0
+
+class FullDisk(io.BytesIO):
+    def write(self, data):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+def test_cache_disk_errors_drop_the_entry_but_not_the_download(mocker, download, tmp_path):
+    cache = DownloadCache(str(tmp_path), max_bytes=10 * 1024 * 1024)
+    add = mocker.patch.object(cache, "_add", side_effect=OSError(errno.ENOSPC, "No space left on device"))
+    response, chunks = download(1, cache=cache)
+    assert b"".join(chunks) == CONTENT and add.call_count == 1
+
+    mocker.patch.object(download_cache.os, "fdopen", side_effect=lambda fd, mode: os.close(fd) or FullDisk())
+    response, chunks = download(1, cache=cache)
+    assert b"".join(chunks) == CONTENT
+
+    assert cache.stats()["stores"] == 0
+    assert os.listdir(cache.tmp_dir) == []
+
+
+def test_download_route_is_not_gzipped():
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+    from backend.main import UNCOMPRESSED_PATHS, SelectiveGZipMiddleware
+
+    app = Starlette(routes=[Route("/api/files/{file_id}/{action}", lambda request: PlainTextResponse("x" * 5000))])
+    app.add_middleware(SelectiveGZipMiddleware, minimum_size=1000, exclude_paths=UNCOMPRESSED_PATHS)
+    client = TestClient(app)
+
+    download = client.get("/api/files/7/download", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in download.headers and download.headers["content-length"] == "5000"
+    assert client.get("/api/files/7/preview", headers={"accept-encoding": "gzip"}).headers["content-encoding"] == "gzip"
@@ -0,0 +1,34 @@
+from backend.models import File
+from backend.services import file_ingest_service
+from backend.services.file_ingest_service import bulk_upsert_files, file_row
+
+def _rows(ids, **fields):
+    return [file_row(1, {"cloud_id": cloud_id, "name": f"{cloud_id}.txt", **fields}) for cloud_id in ids]
+
+def test_chunks_report_inserts_and_updates(mocker, memory_db):
+    mocker.patch.object(file_ingest_service, "FILE_UPSERT_CHUNK_SIZE", 2)
+    db = memory_db
+    bulk_upsert_files(db, _rows(["a", "b"], size=1, url="https://a", last_modified="2024-01-01T00:00:00Z"))
+
+    chunks = bulk_upsert_files(db, _rows(["a", "b", "c", "c"], size=2))
+
+    assert chunks == [
+        {"chunk": 0, "rows": 2, "inserted": 0, "updated": 2},
+        {"chunk": 1, "rows": 1, "inserted": 1, "updated": 0},
+    ]
+    a = db.query(File).filter_by(cloud_id="a").one()
+    assert a.size == 2
+    # Values the update did not carry are kept
+    assert a.url == "https://a"
+    assert a.last_modified is not None
+    assert db.query(File).count() == 3
+
+def test_fallback_for_databases_without_on_conflict(mocker, memory_db):
+    mocker.patch.dict(file_ingest_service._INSERTS, clear=True)
+    db = memory_db
+    bulk_upsert_files(db, _rows(["a"], size=1, url="https://a"))
+    chunks = bulk_upsert_files(db, _rows(["a", "b"], size=5))
+
+    assert chunks == [{"chunk": 0, "rows": 2, "inserted": 1, "updated": 1}]
+    a = db.query(File).filter_by(cloud_id="a").one()
+    assert (a.size, a.url) == (5, "https://a")
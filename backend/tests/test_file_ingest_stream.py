@@ -0,0 +1,54 @@
+import asyncio
+import json
+import msgpack
+import pytest
+from fastapi import HTTPException
+from backend.models import BackgroundJob, File
+from backend.services import file_ingest_service
+from backend.services.file_ingest_service import ingest_files_stream_service
+
+class FakeRequest:
+    def __init__(self, content_type, chunks):
+        self.headers = {"content-type": content_type}
+        self._chunks = chunks
+
+    async def stream(self):
+        for chunk in self._chunks:
+            yield chunk
+
+def test_ndjson_is_upserted_in_batches_with_invalid_lines_reported(mocker, memory_db, make_user):
+    mocker.patch.object(file_ingest_service, "FILE_UPSERT_CHUNK_SIZE", 2)
+    db = memory_db
+    body = "\n".join(
+        [json.dumps({"cloud_id": f"f{i}", "name": f"f{i}.txt", "size": i}) for i in range(5)]
+        + ["{broken", json.dumps({"name": "no id"}), ""]
+    ).encode()
+    # Split mid-line to check records spanning chunks
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+
+    result = asyncio.run(ingest_files_stream_service(make_user(), db, FakeRequest("application/x-ndjson", chunks)))
+
+    assert (result["received"], result["inserted"], result["invalid"], result["batches"]) == (7, 5, 2, 3)
+    assert [error["record"] for error in result["errors"]] == [6, 7]
+    assert db.query(File).count() == 5
+    job = db.query(BackgroundJob).get(result["job_id"])
+    assert (job.job_type, job.status, job.files_found) == ("ingest", "complete", 5)
+
+def test_msgpack_accepts_single_records_and_arrays(memory_db, make_user):
+    db = memory_db
+    packer = msgpack.Packer()
+    body = packer.pack({"cloud_id": "a", "name": "a"}) + packer.pack([{"cloud_id": "b", "name": "b"}, {"cloud_id": "a", "name": "a2"}])
+
+    result = asyncio.run(ingest_files_stream_service(make_user(), db, FakeRequest("application/x-msgpack", [body[:5], body[5:]])))
+
+    # "a" appears twice in one batch: the later record wins
+    assert (result["received"], result["inserted"], result["updated"]) == (3, 2, 0)
+    assert db.query(File).filter_by(cloud_id="a").one().name == "a2"
+
+def test_overlong_line_is_rejected_and_recorded(mocker, memory_db, make_user):
+    mocker.patch.object(file_ingest_service, "INGEST_MAX_RECORD_BYTES", 10)
+    db = memory_db
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(ingest_files_stream_service(make_user(), db, FakeRequest("application/x-ndjson", [b"x" * 20])))
+    assert excinfo.value.status_code == 413
+    assert db.query(BackgroundJob).one().status == "error"
@@ -0,0 +1,67 @@
+import threading
+import time
+from backend.folder_walker import FolderWalker
+
+TREE = {
+    "root": [{"id": "file1", "type": "file"}, {"id": "A", "type": "folder"}, {"id": "B", "type": "folder"}],
+    "A": [{"id": "file2", "type": "file"}, {"id": "C", "type": "folder"}],
+    "B": [{"id": "file3", "type": "file"}],
+    "C": [{"id": "file4", "type": "file"}],
+}
+
+def test_walk_respects_depth():
+    walker = FolderWalker(lambda folder_id: TREE.get(folder_id, []), ["root"], max_depth=2)
+    listed = {folder_id: depth for folder_id, depth, _ in walker.walk()}
+    assert listed == {"root": 1, "A": 2, "B": 2}
+
+def test_walk_caps_concurrency_and_skips_revisits():
+    in_flight = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def list_folder(folder_id):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        time.sleep(0.01)
+        with lock:
+            in_flight["now"] -= 1
+        return [{"id": f"{folder_id}/{i}", "type": "folder"} for i in range(5)] if folder_id.count("/") < 2 else []
+
+    walker = FolderWalker(list_folder, ["r", "r"], max_depth=3, user_key="walker-test", max_concurrency=3)
+    listed = [folder_id for folder_id, _, _ in walker.walk()]
+    assert len(listed) == len(set(listed)) == 1 + 5 + 25
+    assert in_flight["peak"] <= 3
+
+def test_snapshot_resumes_walk():
+    walker = FolderWalker(lambda folder_id: TREE.get(folder_id, []), ["root"], max_depth=3, max_concurrency=1)
+    steps = walker.walk()
+    first = next(steps)
+    assert first[0] == "root"
+    state = walker.snapshot()
+    steps.close()
+
+    resumed = FolderWalker(lambda folder_id: TREE.get(folder_id, []), [], max_depth=3, frontier=[tuple(e) for e in state["frontier"]], visited=state["visited"])
+    assert sorted(folder_id for folder_id, _, _ in resumed.walk()) == ["A", "B", "C"]
+
+def test_stop_waits_for_running_listings():
+    running = {"now": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def list_folder(folder_id):
+        with lock:
+            running["now"] += 1
+        time.sleep(0.02)
+        with lock:
+            running["now"] -= 1
+        return [{"id": f"{folder_id}/{i}", "type": "folder"} for i in range(4)]
+
+    walker = FolderWalker(list_folder, ["r"], max_depth=4, user_key="stop-test", max_concurrency=4, should_stop=stop.is_set)
+    seen = 0
+    for _ in walker.walk():
+        seen += 1
+        if seen == 3:
+            stop.set()
+
+    assert seen < 1 + 4 + 16 + 64
+    assert running["now"] == 0
@@ -0,0 +1,127 @@
+import pytest
+from unittest.mock import MagicMock
+from backend.models import CloudConnection
+from backend.graph_batch import GraphBatchExecutor, batch_move_items
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+        self.text = str(json_data)
+
+    def json(self):
+        return self.json_data
+
+def _connection():
+    connection = CloudConnection()
+    connection.id = 1
+    connection.access_token = "valid_token"
+    return connection
+
+def test_requests_are_packed_twenty_per_batch_with_chains_kept_together(mocker):
+    sent = []
+
+    def fake_request(method, url, connection, db, json=None):
+        sent.append(json["requests"])
+        return MockResponse({"responses": [{"id": r["id"], "status": 200, "body": {}} for r in json["requests"]]})
+
+    mocker.patch("backend.graph_batch._make_graph_api_request", side_effect=fake_request)
+    executor = GraphBatchExecutor(_connection(), MagicMock())
+    for i in range(15):
+        executor.add("PATCH", f"/me/drive/items/a{i}", {"name": f"a{i}"})
+    first = executor.add("PATCH", "/me/drive/items/x", {"name": "x"})
+    second = executor.add("PATCH", "/me/drive/items/x", {"parentReference": {"id": "p"}}, depends_on=[first])
+    for i in range(30):
+        executor.add("DELETE", f"/me/drive/items/d{i}")
+
+    results = executor.execute()
+
+    assert len(results) == 47
+    assert all(len(batch) <= 20 for batch in sent)
+    chain_batch = next(batch for batch in sent if any(r["id"] == second for r in batch))
+    assert any(r["id"] == first for r in chain_batch)
+
+def test_only_throttled_sub_requests_are_retried(mocker):
+    sent = []
+
+    def fake_request(method, url, connection, db, json=None):
+        sent.append([r["id"] for r in json["requests"]])
+        responses = []
+        for r in json["requests"]:
+            if r["id"] == "2" and len(sent) == 1:
+                responses.append({"id": r["id"], "status": 429, "headers": {"Retry-After": "0"}})
+            else:
+                responses.append({"id": r["id"], "status": 200, "body": {"id": r["url"].rsplit("/", 1)[1]}})
+        return MockResponse({"responses": responses})
+
+    mocker.patch("backend.graph_batch._make_graph_api_request", side_effect=fake_request)
+    results = batch_move_items(_connection(), MagicMock(), [("f1", "t"), ("f2", "t"), ("f3", "t")])
+
+    assert sent == [["1", "2", "3"], ["2"]]
+    assert [r["id"] for r in results] == ["f1", "f2", "f3"]
+    assert all(r["success"] for r in results)
+
+def test_writes_that_may_have_been_applied_are_not_resent(mocker):
+    sent = []
+
+    def fake_request(method, url, connection, db, json=None):
+        sent.append([r["id"] for r in json["requests"]])
+        first = len(sent) == 1
+        statuses = {"1": 503, "2": 429, "3": 502} if first else {}
+        return MockResponse({"responses": [
+            {"id": r["id"], "status": statuses.get(r["id"], 201), "body": {"id": r["id"]}} for r in json["requests"]
+        ]})
+
+    mocker.patch("backend.graph_batch._make_graph_api_request", side_effect=fake_request)
+    executor = GraphBatchExecutor(_connection(), MagicMock())
+    executor.add("POST", "/me/drive/items/p/children", {"name": "Photos"})
+    executor.add("POST", "/me/drive/items/p/children", {"name": "Music"})
+    executor.add("GET", "/me/drive/items/x")
+    results = executor.execute()
+
+    # Only the GET goes round again: the POSTs may already have created their folders
+    assert sent == [["1", "2", "3"], ["3"]]
+    assert [results[i]["status"] for i in ("1", "2", "3")] == [503, 429, 201]
+
+def test_a_failed_batch_does_not_lose_the_others(mocker):
+    from fastapi import HTTPException
+
+    def fake_request(method, url, connection, db, json=None):
+        if any(r["url"].endswith("/bad") for r in json["requests"]):
+            raise HTTPException(status_code=400, detail="Invalid batch")
+        return MockResponse({"responses": [{"id": r["id"], "status": 200, "body": {}} for r in json["requests"]]})
+
+    mocker.patch("backend.graph_batch._make_graph_api_request", side_effect=fake_request)
+    executor = GraphBatchExecutor(_connection(), MagicMock(), max_retries=0)
+    for i in range(20):
+        executor.add("PATCH", f"/me/drive/items/a{i}", {"name": f"a{i}"})
+    for i in range(5):
+        executor.add("PATCH", "/me/drive/items/bad" if i == 0 else f"/me/drive/items/b{i}", {"name": f"b{i}"})
+    results = executor.execute()
+
+    assert sum(r["success"] for r in results.values()) == 20
+    failed = [r for r in results.values() if not r["success"]]
+    assert len(failed) == 5 and {r["status"] for r in failed} == {400}
+    assert failed[0]["body"]["error"]["message"] == "Invalid batch"
+
+def test_oversized_dependency_chain_is_rejected():
+    executor = GraphBatchExecutor(_connection(), MagicMock())
+    previous = executor.add("DELETE", "/me/drive/items/0")
+    for i in range(1, 21):
+        previous = executor.add("DELETE", f"/me/drive/items/{i}", depends_on=[previous])
+    with pytest.raises(ValueError):
+        executor.execute()
+
+def test_organise_reuses_category_folders_whatever_their_case(mocker):
+    from backend.services import onedrive_service
+    mocker.patch.object(onedrive_service, "get_all_files_recursively", return_value=[{"id": "p1", "name": "a.jpg"}, {"id": "d1", "name": "b.pdf"}])
+    mocker.patch.object(onedrive_service, "create_folder_if_not_exists", return_value="base")
+    mocker.patch.object(onedrive_service, "get_onedrive_folder_contents", return_value=[{"id": "img", "name": "images", "type": "folder"}])
+    create = mocker.patch.object(onedrive_service, "batch_create_folders", return_value={"Documents": {"success": True, "body": {"id": "docs"}}})
+    move = mocker.patch.object(onedrive_service, "batch_move_items", side_effect=lambda connection, db, moves: [{"success": True} for _ in moves])
+
+    summary = onedrive_service.smart_organise_service(MagicMock(id=1), MagicMock(), {"strategy": "by_file_type"})
+
+    assert create.call_args.args[3] == ["Documents"]
+    assert sorted(move.call_args.args[2]) == [("d1", "docs"), ("p1", "img")]
+    assert (summary["moved"], summary["errors"]) == (2, 0)
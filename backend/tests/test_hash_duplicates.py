@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from sqlalchemy import create_engine, text
+from backend.helpers import hash_columns
+from backend.models import File
+from backend.services.duplicates_service import hash_duplicate_groups
+from backend.services.enhanced_duplicates_service import EnhancedDuplicatesService
+from backend.services.file_ingest_service import bulk_upsert_files, file_row
+from backend.services.onedrive_sync_service import _apply_file_changes, get_inventory_duplicates
+
+def test_provider_hashes_map_to_columns():
+    graph = hash_columns({"quickXorHash": "AbC+/=", "sha1Hash": "ABCDEF"})
+    assert (graph["hash"], graph["quick_xor_hash"], graph["sha1_hash"], graph["md5_hash"]) == ("AbC+/=", "AbC+/=", "abcdef", None)
+    drive = hash_columns({"md5Checksum": "D41D8CD9"})
+    assert (drive["hash"], drive["md5_hash"]) == ("d41d8cd9", "d41d8cd9")
+    assert hash_columns(None)["hash"] is None
+
+def test_groups_come_from_size_and_hash(memory_db):
+    db = memory_db
+    rows = [
+        {"cloud_id": "a1", "name": "a.jpg", "size": 10, "hashes": {"quickXorHash": "qa"}},
+        {"cloud_id": "a2", "name": "copy of a.jpg", "size": 10, "hashes": {"quickXorHash": "qa"}},
+        {"cloud_id": "b1", "name": "b.jpg", "size": 20, "hashes": {"quickXorHash": "qa"}},  # same hash, other size
+        {"cloud_id": "c1", "name": "c.doc", "size": 30, "hashes": {"md5Checksum": "MC"}, "provider": "googledrive"},
+        {"cloud_id": "c2", "name": "c.doc", "size": 30, "hashes": {"md5Checksum": "mc"}, "provider": "googledrive"},
+        {"cloud_id": "e1", "name": "empty", "size": 0, "hashes": {"quickXorHash": "AAAA"}},
+        {"cloud_id": "e2", "name": "empty2", "size": 0, "hashes": {"quickXorHash": "AAAA"}},
+        {"cloud_id": "n1", "name": "nohash", "size": 40},
+        {"cloud_id": "n2", "name": "nohash", "size": 40},
+    ]
+    bulk_upsert_files(db, [file_row(1, row) for row in rows])
+    # An upsert without hashes keeps the stored ones
+    bulk_upsert_files(db, [file_row(1, {"cloud_id": "a2", "name": "copy of a.jpg", "size": 10})])
+
+    groups = hash_duplicate_groups(db, 1)
+    assert [[f.cloud_id for f in group] for group in groups] == [["c1", "c2"], ["a1", "a2"]]
+    assert [[f.cloud_id for f in group] for group in hash_duplicate_groups(db, 1, provider="onedrive")] == [["a1", "a2"]]
+    assert hash_duplicate_groups(db, 2) == []
+
+    plan = " ".join(str(row) for row in db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT size, hash FROM files WHERE user_id = 1 AND hash IS NOT NULL AND size > 0 GROUP BY size, hash HAVING count(id) > 1"
+    )))
+    assert "idx_file_user_size_hash" in plan
+
+def test_inventory_duplicates_are_limited_to_synced_roots(memory_db):
+    db = memory_db
+    item = lambda cloud_id, size, h: {"id": cloud_id, "name": f"{cloud_id}.jpg", "size": size, "file": {"hashes": {"quickXorHash": h}}}
+    _apply_file_changes(db, 1, "photos", [item("p1", 5, "x"), item("p2", 5, "x"), item("p3", 7, "y")])
+    _apply_file_changes(db, 1, "docs", [item("d1", 7, "y")])
+    db.commit()
+    connection = SimpleNamespace(user_id=1)
+
+    assert [[f["id"] for f in g] for g in get_inventory_duplicates(connection, db, ["photos"])] == [["p1", "p2"]]
+    assert [[f["id"] for f in g] for g in get_inventory_duplicates(connection, db, ["photos", "docs"])] == [["p3", "d1"], ["p1", "p2"]]
+    assert db.query(File).filter_by(cloud_id="p1").one().quick_xor_hash == "x"
+
+def test_cross_cloud_copies_match_on_a_shared_algorithm(memory_db):
+    db = memory_db
+    rows = [
+        # File.hash is quickXorHash for OneDrive and sha256 for Drive: only sha1 is shared
+        ("onedrive", "o1", 30, {"quickXorHash": "Q1", "sha1Hash": "AA11"}),
+        ("googledrive", "g1", 30, {"md5Checksum": "m1", "sha1Checksum": "aa11", "sha256Checksum": "ff11"}),
+        ("googledrive", "g2", 30, {"md5Checksum": "m1"}),  # same md5, but md5 is Drive-only here
+        ("onedrive", "o2", 20, {"quickXorHash": "Q2", "sha256Hash": "BB22"}),
+        ("googledrive", "g3", 20, {"md5Checksum": "m3", "sha256Checksum": "bb22"}),
+        ("onedrive", "o3", 20, {"quickXorHash": "Q3", "sha1Hash": "CC33"}),
+        ("googledrive", "g4", 21, {"md5Checksum": "m4", "sha1Checksum": "cc33"}),  # size differs
+    ]
+    bulk_upsert_files(db, [file_row(1, {"provider": p, "cloud_id": c, "name": f"{c}.bin", "size": size, "hashes": h}) for p, c, size, h in rows])
+    assert {f.hash for f in db.query(File).filter(File.cloud_id.in_(["o1", "g1"]))} == {"Q1", "ff11"}
+
+    found = EnhancedDuplicatesService().find_cross_cloud_duplicates(1, db)
+    assert [(d["hash"], sorted(f["cloud_id"] for f in d["files"]), d["clouds"], d["potential_savings"]) for d in found] == [
+        ("aa11", ["g1", "o1"], ["googledrive", "onedrive"], 30),
+        ("bb22", ["g3", "o2"], ["googledrive", "onedrive"], 20),
+    ]
+
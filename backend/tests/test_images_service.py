@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from backend.models import CloudConnection, File
+from backend.services.images_service import get_image_download_urls_service
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+        self.text = str(json_data)
+
+    def json(self):
+        return self.json_data
+
+@pytest.fixture
+def db(memory_db):
+    memory_db.add(CloudConnection(user_id=1, provider="onedrive", access_token="t", is_active=True))
+    memory_db.commit()
+    return memory_db
+
+def _graph(sent, missing=()):
+    def fake_request(method, url, connection, db, json=None):
+        sent.append(len(json["requests"]))
+        responses = []
+        for r in json["requests"]:
+            item_id = r["url"].split("/")[-1].split("?")[0]
+            if item_id in missing:
+                responses.append({"id": r["id"], "status": 404, "body": {"error": {"code": "itemNotFound"}}})
+            else:
+                responses.append({"id": r["id"], "status": 200, "body": {"id": item_id, "@microsoft.graph.downloadUrl": f"https://dl/{item_id}?new"}})
+        return MockResponse({"responses": responses})
+    return fake_request
+
+def test_stale_and_missing_urls_are_refreshed_in_batches(mocker, db, make_user):
+    now = datetime.now(timezone.utc)
+    for i in range(200):
+        if i < 10:
+            url, expires_at = f"https://dl/c{i}?old", now + timedelta(minutes=30)  # fresh
+        elif i < 20:
+            url, expires_at = f"https://dl/c{i}?old", now + timedelta(minutes=2)  # inside the refresh skew
+        elif i < 30:
+            url, expires_at = f"https://dl/c{i}?old", None  # cached before expiry was tracked
+        else:
+            url, expires_at = None, None
+        db.add(File(id=i + 1, user_id=1, cloud_id=f"c{i}", provider="onedrive", name=f"{i}.jpg", url=url, url_expires_at=expires_at))
+    db.commit()
+    sent = []
+    mocker.patch("backend.graph_batch._make_graph_api_request", side_effect=_graph(sent))
+
+    urls = {r["id"]: r for r in get_image_download_urls_service(list(range(1, 201)), make_user(), db)["urls"]}
+
+    assert sorted(sent, reverse=True) == [20] * 9 + [10]
+    assert all(r["url"] for r in urls.values())
+    assert urls[1]["url"].endswith("?old") and urls[1]["cached"] is True
+    assert urls[11]["url"].endswith("?new") and urls[11]["cached"] is False
+    assert db.query(File).get(50).url_expires_at is not None
+
+    # Everything is fresh now: no upstream calls
+    sent.clear()
+    get_image_download_urls_service(list(range(1, 201)), make_user(), db)
+    assert sent == []
+
+def test_items_that_cannot_be_refreshed_lose_their_dead_url(mocker, db, make_user):
+    db.add(File(id=1, user_id=1, cloud_id="gone", provider="onedrive", name="a.jpg", url="https://dl/gone?old"))
+    db.add(File(id=2, user_id=1, cloud_id="ok", provider="onedrive", name="b.jpg"))
+    db.commit()
+    mocker.patch("backend.graph_batch._make_graph_api_request", side_effect=_graph([], missing={"gone"}))
+
+    urls = {r["id"]: r for r in get_image_download_urls_service([1, 2], make_user(), db)["urls"]}
+
+    assert urls[1]["url"] is None and "404" in urls[1]["error"]
+    assert urls[2]["url"] == "https://dl/ok?new"
+    assert db.query(File).get(1).url is None
@@ -0,0 +1,26 @@
+import asyncio
+import threading
+from backend.job_events import JobEventChannel, format_sse
+
+def test_publish_from_thread_wakes_async_subscriber():
+    channel = JobEventChannel(maxlen=3)
+
+    async def consume():
+        wake = channel.subscribe()
+        threading.Timer(0.05, channel.publish, args=("progress", {"files_found": 1})).start()
+        await asyncio.wait_for(wake.wait(), 2)
+        channel.unsubscribe(wake)
+        return channel.events_since(0)
+
+    events = asyncio.run(consume())
+    assert events == [(1, "progress", {"files_found": 1})]
+
+def test_buffer_keeps_only_recent_events():
+    channel = JobEventChannel(maxlen=3)
+    for i in range(5):
+        channel.publish("progress", {"n": i})
+    assert [seq for seq, _, _ in channel.events_since(0)] == [3, 4, 5]
+    assert [seq for seq, _, _ in channel.events_since(4)] == [5]
+
+def test_format_sse():
+    assert format_sse("done", {"status": "complete"}, 7) == 'id: 7\nevent: done\ndata: {"status": "complete"}\n\n'
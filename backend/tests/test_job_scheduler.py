@@ -0,0 +1,70 @@
+import threading
+import time
+from backend.job_scheduler import JobScheduler
+
+FREE = {"concurrent_scans": 1, "scan_priority": 0, "scan_pool_share": 0.5}
+PRO = {"concurrent_scans": 2, "scan_priority": 10, "scan_pool_share": 1.0}
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def _blocking_job(started, release, job_id):
+    def run():
+        started.append(job_id)
+        release.wait(2)
+        return False
+    return run
+
+def test_per_user_quota_and_plan_share_hold_jobs_back():
+    scheduler = JobScheduler(max_workers=4)
+    started, release = [], threading.Event()
+    scheduler.submit("a1", 1, _blocking_job(started, release, "a1"), "free", FREE)
+    scheduler.submit("a2", 1, _blocking_job(started, release, "a2"), "free", FREE)
+    scheduler.submit("b1", 2, _blocking_job(started, release, "b1"), "free", FREE)
+    scheduler.submit("c1", 3, _blocking_job(started, release, "c1"), "free", FREE)
+    assert _wait_for(lambda: len(started) == 2)
+    time.sleep(0.05)
+    # One job per free user, and free jobs may hold only half of the four workers
+    assert sorted(started) == ["a1", "b1"]
+    assert scheduler.queue_position("c1") == 1
+    release.set()
+    assert _wait_for(lambda: len(started) == 4)
+
+def test_higher_priority_jobs_start_first():
+    scheduler = JobScheduler(max_workers=1)
+    started, release = [], threading.Event()
+    scheduler.submit("busy", 9, _blocking_job(started, release, "busy"), "pro", PRO)
+    assert _wait_for(lambda: started == ["busy"])
+    scheduler.submit("free", 1, _blocking_job(started, release, "free"), "free", FREE)
+    scheduler.submit("pro", 2, _blocking_job(started, release, "pro"), "pro", PRO)
+    release.set()
+    assert _wait_for(lambda: len(started) == 3)
+    assert started == ["busy", "pro", "free"]
+
+def test_interactive_paid_job_preempts_free_background_job():
+    scheduler = JobScheduler(max_workers=1)
+    events = []
+    runs = {"count": 0}
+
+    def background():
+        runs["count"] += 1
+        events.append(f"background-{runs['count']}")
+        if runs["count"] == 1:
+            _wait_for(lambda: scheduler.should_yield("bg"))
+            return True
+        return False
+
+    def interactive():
+        events.append("interactive")
+        return False
+
+    scheduler.submit("bg", 1, background, "free", {**FREE, "scan_pool_share": 1.0})
+    assert _wait_for(lambda: events == ["background-1"])
+    scheduler.submit("fg", 2, interactive, "pro", PRO, interactive=True)
+    assert _wait_for(lambda: len(events) == 3)
+    assert events == ["background-1", "interactive", "background-2"]
@@ -57,4 +57,175 @@ def test_make_graph_api_request_fails_on_refresh_failure(mocker):
         _make_graph_api_request("https://graph.microsoft.com/v1.0/me/drive/root/children", mock_connection, mock_db_session)
     
     assert excinfo.value.status_code == 401
-    assert "Token refresh failed" in excinfo.value.detail 
\ No newline at end of file
+    assert "Token refresh failed" in excinfo.value.detail 
+
+def test_make_graph_api_request_uses_pooled_session(mocker):
+    """
+    Tests that Graph calls go through the shared pooled session rather than module-level requests.
+    """
+    mock_db_session = MagicMock()
+    mock_connection = CloudConnection()
+    mock_connection.access_token = "valid_token"
+
+    mock_request = mocker.patch('backend.onedrive_api.http_request', return_value=MockResponse({"value": []}, 200))
+
+    resp = _make_graph_api_request("GET", "https://graph.microsoft.com/v1.0/me/drive/root/children", mock_connection, mock_db_session)
+
+    assert resp.status_code == 200
+    mock_request.assert_called_once()
+    assert mock_request.call_args.kwargs["headers"]["Authorization"] == "Bearer valid_token"
+
+
+def test_get_http_session_is_reused():
+    from backend.http_client import get_http_session, close_http_session
+    from backend.config import HTTP_POOL_MAXSIZE
+
+    first = get_http_session()
+    assert get_http_session() is first
+    assert first.get_adapter("https://graph.microsoft.com")._pool_maxsize == HTTP_POOL_MAXSIZE
+    close_http_session()
+    assert get_http_session() is not first
+
+
+def test_make_graph_api_request_retries_throttled_calls(mocker):
+    """
+    Tests that a 429 with Retry-After is retried instead of being handed back to the caller.
+    """
+    mock_db_session = MagicMock()
+    mock_connection = CloudConnection()
+    mock_connection.access_token = "valid_token"
+
+    throttled = MockResponse({"error": {"message": "Too many requests"}}, 429)
+    throttled.headers = {"Retry-After": "0"}
+    mock_request = mocker.patch('backend.onedrive_api.http_request', side_effect=[
+        throttled,
+        MockResponse({"value": []}, 200),
+    ])
+
+    resp = _make_graph_api_request("GET", "https://graph.microsoft.com/v1.0/me/drive/root/children", mock_connection, mock_db_session)
+
+    assert resp.status_code == 200
+    assert mock_request.call_count == 2
+
+
+def test_concurrent_401s_share_one_token_refresh(mocker):
+    """
+    Tests that several calls failing with the same expired token trigger a single refresh.
+    """
+    import threading
+
+    mock_db_session = MagicMock()
+    mock_connection = CloudConnection()
+    mock_connection.access_token = "expired_token"
+    all_failed = threading.Barrier(4)
+
+    def fake_request(method, url, headers=None, **kwargs):
+        if headers["Authorization"] == "Bearer expired_token":
+            all_failed.wait(timeout=5)
+            return MockResponse({"error": {"message": "expired"}}, 401)
+        return MockResponse({"value": []}, 200)
+
+    def fake_refresh(connection, db):
+        connection.access_token = "new_token"
+
+    mocker.patch('backend.onedrive_api.http_request', side_effect=fake_request)
+    mock_refresh = mocker.patch('backend.onedrive_api.refresh_onedrive_token', side_effect=fake_refresh)
+
+    statuses = []
+    threads = [
+        threading.Thread(target=lambda: statuses.append(_make_graph_api_request("GET", "https://graph.microsoft.com/v1.0/me", mock_connection, mock_db_session).status_code))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert statuses == [200] * 4
+    mock_refresh.assert_called_once()
+
+
+def test_get_onedrive_folder_contents_follows_next_link(mocker):
+    """
+    Tests that folder listings page through @odata.nextLink instead of stopping at the first page.
+    """
+    from backend.onedrive_api import get_onedrive_folder_contents, iter_onedrive_folder_pages
+
+    mock_db_session = MagicMock()
+    mock_connection = CloudConnection()
+    mock_connection.access_token = "valid_token"
+    pages = {
+        "page2": MockResponse({"value": [{"id": "b", "name": "b.txt"}], "@odata.nextLink": "page3"}, 200),
+        "page3": MockResponse({"value": [{"id": "c", "name": "C", "folder": {}}]}, 200),
+    }
+
+    def fake_request(method, url, **kwargs):
+        if url in pages:
+            return pages[url]
+        assert "$top=2" in url
+        return MockResponse({"value": [{"id": "a", "name": "a.txt"}], "@odata.nextLink": "page2"}, 200)
+
+    mocker.patch('backend.onedrive_api.GRAPH_PAGE_SIZE', 2)
+    mocker.patch('backend.onedrive_api.http_request', side_effect=fake_request)
+
+    items = get_onedrive_folder_contents(mock_connection, mock_db_session, "root")
+    assert [i["id"] for i in items] == ["a", "b", "c"]
+    assert items[2]["type"] == "folder"
+
+    pages_seen = list(iter_onedrive_folder_pages(mock_connection, mock_db_session, "root", prefetch=False))
+    assert [[i["id"] for i in page] for page in pages_seen] == [["a"], ["b"], ["c"]]
+
+
+def test_throttled_writes_are_not_resent_unless_refused(mocker):
+    """
+    A 503 on a POST may have been applied already, so it is returned rather than retried;
+    a 429 with Retry-After, or any throttled GET, is retried.
+    """
+    from types import SimpleNamespace
+    from backend.onedrive_api import _send_graph_request
+
+    connection = CloudConnection(id=991)
+    throttled = lambda status, headers=None: SimpleNamespace(status_code=status, headers=headers or {})
+    mocker.patch('backend.onedrive_api.backoff_delay', return_value=0)
+    send = mocker.patch('backend.onedrive_api.http_request', side_effect=[
+        throttled(503), throttled(503), throttled(200),
+        throttled(503),
+        throttled(429, {"Retry-After": "0"}), throttled(201),
+    ])
+
+    assert _send_graph_request("GET", "https://graph.microsoft.com/v1.0/me", connection, {}).status_code == 200
+    assert _send_graph_request("POST", "https://graph.microsoft.com/v1.0/$batch", connection, {}).status_code == 503
+    assert _send_graph_request("POST", "https://graph.microsoft.com/v1.0/$batch", connection, {}).status_code == 201
+    assert send.call_count == 6
+
+
+def test_personal_account_connections_do_not_share_a_tenant_bucket():
+    """
+    Opaque consumer tokens carry no tenant, so one account's Retry-After must not pause another's calls.
+    """
+    from backend.onedrive_api import get_graph_limiter
+
+    first, second = (CloudConnection(id=connection_id, access_token="EwB4A8l6BAAU...opaque", provider_user_email=f"u{connection_id}@outlook.com") for connection_id in (992, 993))
+    throttled, other = get_graph_limiter(first), get_graph_limiter(second)
+    assert throttled.tenant_bucket is not other.tenant_bucket
+
+    throttled.on_throttle(120)
+    assert throttled._reserve() > 100
+    assert other._reserve() == 0
+
+
+def test_failed_refresh_releases_the_connection_row_lock(mocker):
+    """
+    The refresh runs under the row lock _reload_connection_tokens takes; a failure must roll back to release it.
+    """
+    from backend.onedrive_api import ensure_fresh_onedrive_token
+
+    mock_db_session = MagicMock()
+    connection = CloudConnection(id=994, access_token="old_token", refresh_token="revoked")
+    mocker.patch('backend.onedrive_api._reload_connection_tokens')
+    mocker.patch('backend.onedrive_api.refresh_onedrive_token', side_effect=HTTPException(status_code=400, detail="invalid_grant"))
+
+    with pytest.raises(HTTPException):
+        ensure_fresh_onedrive_token(connection, mock_db_session, failed_token="old_token")
+    mock_db_session.rollback.assert_called_once()
+    mock_db_session.commit.assert_not_called()
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import httpx
+import pytest
+from unittest.mock import MagicMock
+from backend.models import CloudConnection
+from backend import onedrive_async_api
+from backend.onedrive_async_api import get_all_files_recursively_with_depth_async, delete_file_batch_async
+
+TREE = {
+    "root": [{"id": "file1", "name": "file1.txt"}, {"id": "folderA", "name": "A", "folder": {}}],
+    "folderA": [{"id": "file2", "name": "file2.txt"}, {"id": "folderB", "name": "B", "folder": {}}],
+    "folderB": [{"id": "file3", "name": "file3.txt"}],
+}
+
+def _graph_handler(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path.endswith("/$batch"):
+        sub_requests = json.loads(request.read())["requests"]
+        # Answer out of order, like Graph does
+        return httpx.Response(200, json={"responses": [{"id": r["id"], "status": 204} for r in reversed(sub_requests)]})
+    folder_id = "root" if "/root/children" in path else path.split("/items/")[1].split("/")[0]
+    return httpx.Response(200, json={"value": TREE.get(folder_id, [])})
+
+def _connection():
+    connection = CloudConnection()
+    connection.access_token = "valid_token"
+    return connection
+
+def _run(coro, mocker):
+    async def runner():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(_graph_handler))
+        mocker.patch.object(onedrive_async_api, "get_async_http_client", return_value=client)
+        try:
+            return await coro()
+        finally:
+            await client.aclose()
+    return asyncio.run(runner())
+
+def test_depth_limited_async_walk(mocker):
+    files = _run(lambda: get_all_files_recursively_with_depth_async(_connection(), MagicMock(), ["root"], max_depth=2), mocker)
+    assert sorted(f["id"] for f in files) == ["file1", "file2"]
+
+    files = _run(lambda: get_all_files_recursively_with_depth_async(_connection(), MagicMock(), ["root"], max_depth=3, max_concurrency=1), mocker)
+    assert sorted(f["id"] for f in files) == ["file1", "file2", "file3"]
+
+def test_delete_file_batch_async_keeps_input_order(mocker):
+    file_ids = [f"f{i}" for i in range(45)]
+    results = _run(lambda: delete_file_batch_async(_connection(), MagicMock(), file_ids), mocker)
+    assert [r["id"] for r in results] == file_ids
+    assert all(r["success"] for r in results)
+
+def test_delete_file_batch_async_shares_the_batch_retry_rules(mocker):
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sub_requests = json.loads(request.read())["requests"]
+        sent.append([r["url"].rsplit("/", 1)[1] for r in sub_requests])
+        if any(r["url"].endswith("/broken") for r in sub_requests):
+            return httpx.Response(400, json={"error": {"message": "Invalid batch"}})
+        return httpx.Response(200, json={"responses": [
+            {"id": r["id"], "status": 429, "headers": {"Retry-After": "0"}} if len(sent) == 1 and r["url"].endswith("/f1")
+            else {"id": r["id"], "status": 204}
+            for r in sub_requests
+        ]})
+
+    async def runner():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        mocker.patch.object(onedrive_async_api, "get_async_http_client", return_value=client)
+        try:
+            first = await delete_file_batch_async(_connection(), MagicMock(), ["f0", "f1", "f2"])
+            broken = await delete_file_batch_async(_connection(), MagicMock(), ["broken"])
+            return first, broken
+        finally:
+            await client.aclose()
+
+    first, broken = asyncio.run(runner())
+    # Only the throttled DELETE is sent again, as in the blocking path
+    assert sent[:2] == [["f0", "f1", "f2"], ["f1"]]
+    assert [(r["id"], r["success"]) for r in first] == [("f0", True), ("f1", True), ("f2", True)]
+    assert broken == [{"id": "broken", "status": 400, "success": False}]
+
+def test_async_folder_listing_follows_next_link(mocker):
+    from backend.onedrive_async_api import get_onedrive_folder_contents_async
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params.get("page") == "2":
+            return httpx.Response(200, json={"value": [{"id": "b", "name": "b.txt"}]})
+        return httpx.Response(200, json={
+            "value": [{"id": "a", "name": "a.txt"}],
+            "@odata.nextLink": "https://graph.microsoft.com/v1.0/me/drive/root/children?page=2",
+        })
+
+    async def runner():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        mocker.patch.object(onedrive_async_api, "get_async_http_client", return_value=client)
+        try:
+            return await get_onedrive_folder_contents_async(_connection(), MagicMock(), "root")
+        finally:
+            await client.aclose()
+
+    items = asyncio.run(runner())
+    assert [i["id"] for i in items] == ["a", "b"]
+
+def test_async_client_lives_between_startup_and_shutdown():
+    async def lifecycle():
+        client = await onedrive_async_api.open_async_http_client()
+        assert onedrive_async_api.get_async_http_client() is client
+        await onedrive_async_api.close_async_http_client()
+        return client
+
+    assert asyncio.run(lifecycle()).is_closed
+    with pytest.raises(RuntimeError):
+        onedrive_async_api.get_async_http_client()
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+from backend.models import DriveDeltaState, File, FileSyncRoot
+from backend.services import onedrive_sync_service
+from backend.services.onedrive_sync_service import get_inventory_files, sync_onedrive_inventory
+
+def _item(cloud_id, size=5):
+    return {"id": cloud_id, "name": f"{cloud_id}.txt", "size": size, "file": {"hashes": {"quickXorHash": cloud_id}}}
+
+def _drive(mocker, tree):
+    """Serves each root's delta feed from tree[root] as a single page."""
+    pages = lambda connection, db, root, delta_link: iter([(tree[root], f"{root}-link")])
+    mocker.patch.object(onedrive_sync_service, "iter_drive_delta_pages", side_effect=pages)
+
+def test_full_sync_forgets_files_only_when_no_synced_root_still_has_them(mocker, memory_db):
+    db = memory_db
+    connection = SimpleNamespace(id=7, user_id=1)
+    _drive(mocker, {"photos": [_item("a"), _item("b")], "docs": [_item("b"), _item("c")]})
+    sync_onedrive_inventory(connection, db, ["photos", "docs"])
+    assert sorted(f["id"] for f in get_inventory_files(connection, db, ["photos"])) == ["a", "b"]
+    assert db.query(FileSyncRoot).count() == 4
+
+    # b leaves photos but is still under docs; a is gone from the drive
+    _drive(mocker, {"photos": [], "docs": [_item("b"), _item("c")]})
+    summary = sync_onedrive_inventory(connection, db, ["photos"], full=True)
+    assert summary["deleted"] == 1
+    assert sorted(f.cloud_id for f in db.query(File)) == ["b", "c"]
+    assert get_inventory_files(connection, db, ["photos"]) == []
+    assert sorted(f["id"] for f in get_inventory_files(connection, db, ["docs"])) == ["b", "c"]
+
+def test_concurrent_first_syncs_share_one_delta_state(mocker, memory_db):
+    db = memory_db
+    connection = SimpleNamespace(id=7, user_id=1)
+    _drive(mocker, {"root": [_item("a")]})
+    # Another worker creates the state between this one's lookup and its insert
+    db.add(DriveDeltaState(connection_id=7, root_folder_id="root"))
+    db.commit()
+    find = onedrive_sync_service._find_delta_state
+    mocker.patch.object(onedrive_sync_service, "_find_delta_state", side_effect=[None, find(db, 7, "root")])
+
+    assert sync_onedrive_inventory(connection, db, ["root"])["upserted"] == 1
+    assert [state.delta_link for state in db.query(DriveDeltaState)] == ["root-link"]
+
+def test_deleting_a_folder_forgets_the_files_below_it(mocker, memory_db):
+    db = memory_db
+    connection = SimpleNamespace(id=7, user_id=1)
+    _drive(mocker, {"root": [_item("top"), _item("deep1"), _item("deep2")]})
+    sync_onedrive_inventory(connection, db, ["root"])
+
+    # The incremental feed only reports the folder; its files are gone from a full listing
+    feeds = {"root-link": [{"id": "albums", "deleted": {}, "folder": {}}], None: [_item("top")]}
+    mocker.patch.object(onedrive_sync_service, "iter_drive_delta_pages", side_effect=lambda connection, db, root, delta_link: iter([(feeds[delta_link], "root-link")]))
+    summary = sync_onedrive_inventory(connection, db, ["root"])
+
+    assert summary["folders"][0]["mode"] == "full" and summary["deleted"] == 2
+    assert [f.cloud_id for f in db.query(File)] == ["top"]
+
+    # Deleting a file that is stored needs no resync
+    feeds["root-link"] = [{"id": "top", "deleted": {}}]
+    assert sync_onedrive_inventory(connection, db, ["root"])["folders"][0]["mode"] == "incremental"
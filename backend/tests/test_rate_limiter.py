@@ -0,0 +1,60 @@
+import asyncio
+import threading
+from backend.rate_limiter import TokenBucket, AdaptiveConcurrency, parse_retry_after, backoff_delay, should_retry
+
+def test_parse_retry_after_seconds_and_dates():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("not a date") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+def test_backoff_prefers_retry_after():
+    assert backoff_delay(3, retry_after=2.5) == 2.5
+    assert 0 <= backoff_delay(2) <= 4
+
+def test_token_bucket_waits_once_burst_is_spent():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0 < bucket.reserve() <= 0.1
+    bucket.pause(5)
+    assert bucket.reserve() > 4
+
+def test_adaptive_concurrency_aimd():
+    window = AdaptiveConcurrency(initial=8, minimum=1, maximum=10)
+    assert all(window.try_acquire() for _ in range(8))
+    assert not window.try_acquire()
+    window.on_throttle()
+    assert window.limit == 4
+    for _ in range(8):
+        window.release()
+    for _ in range(4 * 3):
+        window.on_success()
+    assert window.limit == 6
+
+def test_waiters_are_woken_by_a_release_instead_of_polling():
+    window = AdaptiveConcurrency(initial=1, minimum=1, maximum=1)
+    window.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (window.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.1)
+    window.release()
+    assert acquired.wait(1)
+    waiter.join()
+
+    async def run():
+        task = asyncio.ensure_future(window.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        # Released from another thread, as a blocking caller sharing the window would
+        threading.Thread(target=window.release).start()
+        await asyncio.wait_for(task, 1)
+    asyncio.run(run())
+    assert window.in_flight == 1
+
+def test_only_idempotent_calls_or_refused_ones_are_retried():
+    assert should_retry("GET", 503, None) and should_retry("delete", 429, None)
+    assert not should_retry("POST", 503, 5) and not should_retry("PATCH", 429, None)
+    assert should_retry("POST", 429, 5)
+    assert not should_retry("GET", 500, None)
@@ -0,0 +1,202 @@
+import os
+import threading
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+from backend import scan_results
+from backend.config import SCAN_JOB_STALE_SECONDS
+from backend.models import BackgroundJob, CloudConnection
+from backend.scan_results import ScanResultWriter
+from backend.services import scan_job_service
+from backend.services.background_job_service import claim_next_job
+from backend.services.scan_job_service import (
+    WORKER_ID, _claim_job, _now, _job_payload, _purge_periodically, get_scan_job_result_service, purge_expired_scan_results, run_claimed_scan_job,
+)
+
+def _folder(folder_id):
+    return {"id": folder_id, "name": folder_id, "type": "folder"}
+
+def _file(file_id):
+    return {"id": file_id, "name": f"{file_id}.txt", "type": "file", "size": 1}
+
+TREE = {
+    "root": [_folder("a"), _folder("b"), _folder("c"), _file("r1")],
+    "a": [_file("a1"), _file("a2"), _folder("a-sub")],
+    "b": [_file("b1")],
+    "c": [],
+    "a-sub": [_file("s1")],
+}
+
+def _scan_job(db, job_id="scan1", **fields):
+    db.add(CloudConnection(id=1, user_id=1, provider="onedrive", access_token="t", is_active=True))
+    db.add(BackgroundJob(
+        **{"id": job_id, "user_id": 1, "connection_id": 1, "job_type": "scan", "status": "pending",
+           "params": {"folder_ids": ["root"], "max_depth": 5, "max_concurrency": 4}, **fields}
+    ))
+    db.commit()
+
+def test_folder_listings_each_get_their_own_session(memory_db, mocker, tmp_path):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    mocker.patch.object(scan_job_service, "_seed_estimator")
+    _scan_job(memory_db)
+    listings = []
+    lock = threading.Lock()
+
+    def list_folder(connection, db, folder_id):
+        # The connection was loaded by the session handed in, not shared with other threads
+        assert connection in db
+        with lock:
+            listings.append((folder_id, db))
+        return TREE[folder_id]
+
+    mocker.patch.object(scan_job_service, "get_onedrive_folder_contents", side_effect=list_folder)
+    assert run_claimed_scan_job("scan1", memory_db.get_bind()) is False
+
+    memory_db.expire_all()
+    job = memory_db.query(BackgroundJob).get("scan1")
+    assert (job.status, job.folders_visited, job.result_count) == ("complete", 5, 5)
+    assert sorted(f["id"] for f in job.result) == ["a1", "a2", "b1", "r1", "s1"]
+    assert sorted(folder_id for folder_id, _ in listings) == sorted(TREE)
+    assert len({id(db) for _, db in listings}) == len(listings)
+    assert "scan1" not in scan_job_service.SCAN_JOBS
+
+STALE = timedelta(seconds=SCAN_JOB_STALE_SECONDS + 60)
+
+def test_jobs_are_claimed_once_and_reclaimed_when_stale(memory_db):
+    db = memory_db
+    _scan_job(db)
+    assert claim_next_job(db, ["scan"]) == ("scan1", "scan")
+    # Held by a worker that is heartbeating: nobody else can take it
+    assert claim_next_job(db, ["scan"]) is None
+    assert _claim_job(db, "scan1") is False
+
+    db.query(BackgroundJob).filter_by(id="scan1").update({"worker_id": "gone:1", "heartbeat_at": _now() - STALE})
+    db.commit()
+    assert _claim_job(db, "scan1") is True
+    assert _claim_job(db, "scan1") is False
+    db.expire_all()
+    assert db.query(BackgroundJob).get("scan1").worker_id == WORKER_ID
+
+    db.query(BackgroundJob).filter_by(id="scan1").update({"status": "complete", "heartbeat_at": _now() - STALE})
+    db.commit()
+    assert claim_next_job(db, ["scan"]) is None
+
+def test_crashed_scan_resumes_from_its_checkpoint(memory_db, mocker, tmp_path):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    mocker.patch.object(scan_job_service, "_seed_estimator")
+    # The dead worker had listed root and a, checkpointed, then spooled a file it never checkpointed
+    writer = ScanResultWriter("scan1")
+    writer.write([_file("r1"), _file("a1"), _file("a2")])
+    spool_offset, spool_count = writer.flush()
+    writer.write([_file("b1")])
+    writer.close()
+    _scan_job(
+        memory_db, status="running", worker_id="gone:1", heartbeat_at=_now() - STALE, folders_visited=2,
+        checkpoint={
+            "frontier": [["b", 2], ["c", 2], ["a-sub", 3]],
+            "visited": ["root", "a", "b", "c", "a-sub"],
+            "spool_offset": spool_offset,
+            "spool_count": spool_count,
+        },
+    )
+    listed = []
+    mocker.patch.object(scan_job_service, "get_onedrive_folder_contents", side_effect=lambda connection, db, folder_id: listed.append(folder_id) or TREE[folder_id])
+
+    assert claim_next_job(memory_db, ["scan"]) == ("scan1", "scan")
+    assert run_claimed_scan_job("scan1", memory_db.get_bind()) is False
+
+    memory_db.expire_all()
+    job = memory_db.query(BackgroundJob).get("scan1")
+    assert sorted(listed) == ["a-sub", "b", "c"]
+    assert (job.status, job.folders_visited, job.result_count, job.checkpoint) == ("complete", 5, 5, None)
+    assert sorted(f["id"] for f in job.result) == ["a1", "a2", "b1", "r1", "s1"]
+
+def test_a_listing_slower_than_the_stale_cutoff_keeps_the_job(file_db, mocker, tmp_path):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    mocker.patch.object(scan_job_service, "_seed_estimator")
+    stale_seconds = 0.6
+    mocker.patch.object(scan_job_service, "SCAN_JOB_STALE_SECONDS", stale_seconds)
+    mocker.patch("backend.services.background_job_service.SCAN_JOB_STALE_SECONDS", stale_seconds)
+    _scan_job(file_db)
+    listing, release = threading.Event(), threading.Event()
+
+    def list_folder(connection, db, folder_id):
+        if folder_id == "root":
+            # e.g. a long paginated listing, or every thread in throttle backoff
+            listing.set()
+            release.wait(5)
+        return TREE[folder_id]
+
+    mocker.patch.object(scan_job_service, "get_onedrive_folder_contents", side_effect=list_folder)
+    assert claim_next_job(file_db, ["scan"]) == ("scan1", "scan")
+    scan = threading.Thread(target=run_claimed_scan_job, args=("scan1", file_db.get_bind()))
+    scan.start()
+    assert listing.wait(5)
+    try:
+        for _ in range(4):
+            threading.Event().wait(stale_seconds)
+            assert claim_next_job(file_db, ["scan"]) is None
+            assert _claim_job(file_db, "scan1") is False
+    finally:
+        release.set()
+        scan.join(5)
+
+    file_db.expire_all()
+    assert file_db.query(BackgroundJob).get("scan1").status == "complete"
+
+def _finished_job(db, job_id, files, spill, expires_in):
+    job = BackgroundJob(id=job_id, user_id=1, job_type="scan", status="complete", result_count=len(files), expires_at=_now() + expires_in)
+    if spill:
+        writer = ScanResultWriter(job_id)
+        writer.write(files)
+        job.result_path = writer.finish()
+    else:
+        job.result = files
+    db.add(job)
+    db.commit()
+    return job
+
+def test_results_are_paged_inline_and_from_the_spool(memory_db, make_user, mocker, tmp_path):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    files = [_file(f"f{i}") for i in range(7)]
+    for job_id, spill in (("inline", False), ("spilled", True)):
+        _finished_job(memory_db, job_id, files, spill, timedelta(hours=1))
+        pages, offset = [], 0
+        while offset is not None:
+            page = get_scan_job_result_service(make_user(), memory_db, job_id, offset=offset, limit=3)
+            pages.append([f["id"] for f in page["files"]])
+            assert page["total"] == 7
+            offset = page["next_offset"]
+        assert pages == [["f0", "f1", "f2"], ["f3", "f4", "f5"], ["f6"]]
+
+def test_expired_results_are_gone_and_purged(memory_db, make_user, mocker, tmp_path):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    inline = _finished_job(memory_db, "inline", [_file("a")], False, -timedelta(seconds=1))
+    spilled = _finished_job(memory_db, "spilled", [_file("b")], True, -timedelta(seconds=1))
+    kept = _finished_job(memory_db, "kept", [_file("c")], False, timedelta(hours=1))
+    spill_path = spilled.result_path
+
+    assert _job_payload(inline)["result_expired"] is True and _job_payload(inline)["result"] is None
+    with pytest.raises(HTTPException) as exc:
+        get_scan_job_result_service(make_user(), memory_db, "spilled")
+    assert exc.value.status_code == 410
+
+    assert purge_expired_scan_results(memory_db) == 2
+    assert (inline.result, spilled.result_path, kept.result) == (None, None, [_file("c")])
+    assert not os.path.exists(spill_path)
+
+def test_expired_results_are_purged_periodically(memory_db, mocker, tmp_path):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    mocker.patch.object(scan_job_service, "SCAN_RESULT_PURGE_SECONDS", 0.01)
+    _finished_job(memory_db, "old", [_file("a")], False, -timedelta(seconds=1))
+    stop = threading.Event()
+    purge = mocker.patch.object(scan_job_service, "purge_expired_scan_results", side_effect=lambda db: stop.set() or purge_expired_scan_results(db))
+
+    purger = threading.Thread(target=_purge_periodically, args=(memory_db.get_bind(), stop))
+    purger.start()
+    purger.join(timeout=5)
+
+    assert purge.call_count == 1
+    memory_db.expire_all()
+    assert memory_db.query(BackgroundJob).get("old").result is None
+
@@ -0,0 +1,43 @@
+import time
+from backend import scan_progress
+from backend.scan_progress import ScanProgressEstimator
+
+def _file(item_id, size):
+    return {"id": item_id, "type": "file", "size": size}
+
+def _folder(item_id, size, child_count):
+    return {"id": item_id, "type": "folder", "size": size, "child_count": child_count}
+
+def test_progress_follows_bytes_against_seeded_folder_sizes():
+    estimator = ScanProgressEstimator(max_depth=5)
+    estimator.seed("root", 100, 3)
+    estimator.record_listing("root", 1, [_file("a", 20), _folder("B", 60, 2), _folder("C", 20, 1)])
+    assert estimator.progress == 20
+
+    estimator.record_listing("B", 2, [_file("b1", 30), _file("b2", 30)])
+    assert estimator.progress == 80
+    summary = estimator.summary()
+    assert summary["bytes_scanned"] == 80
+    assert summary["expected_bytes"] == 100
+    assert summary["expected_items"] == 6
+
+def test_folders_below_max_depth_are_not_expected():
+    estimator = ScanProgressEstimator(max_depth=1)
+    estimator.seed("root", 100, 2)
+    estimator.record_listing("root", 1, [_file("a", 10), _folder("deep", 90, 5)])
+    assert estimator.summary()["expected_bytes"] == 10
+    assert estimator.progress == 99
+
+def test_snapshot_round_trip_and_stall_states(mocker):
+    estimator = ScanProgressEstimator(max_depth=5)
+    estimator.seed("root", 50, 1)
+    estimator.record_listing("root", 1, [_folder("A", 50, 1)])
+    restored = ScanProgressEstimator(max_depth=5, state=estimator.snapshot())
+    assert restored.summary()["expected_bytes"] == 50
+
+    mocker.patch.object(scan_progress, "SCAN_STALL_SECONDS", 0)
+    assert restored.summary()["state"] == "stalled"
+    mocker.patch.object(scan_progress, "SCAN_STALL_SECONDS", 60)
+    throttled = restored.summary(last_throttled_at=time.time(), throttle_count=3)
+    assert throttled["state"] == "throttled"
+    assert throttled["throttle_count"] == 3
@@ -0,0 +1,45 @@
+import os
+import time
+from backend import scan_results
+from backend.scan_results import ScanResultWriter, read_result_page, enforce_disk_budget
+
+def test_spool_pages_and_resumes_from_checkpoint(tmp_path, mocker):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+
+    writer = ScanResultWriter("job1")
+    writer.write({"id": f"f{i}"} for i in range(5))
+    offset, count = writer.flush()
+    # Written after the last checkpoint, then the worker dies
+    writer.write([{"id": "lost"}])
+    writer._file.close()
+
+    resumed = ScanResultWriter("job1", offset, count)
+    assert resumed.restored
+    resumed.write({"id": f"f{i}"} for i in range(5, 8))
+    path = resumed.finish()
+
+    assert [f["id"] for f in read_result_page(path, 0, 3)] == ["f0", "f1", "f2"]
+    assert [f["id"] for f in read_result_page(path, 6, 10)] == ["f6", "f7"]
+    assert read_result_page(path, 20, 10) == []
+
+def test_missing_spool_restarts_from_scratch(tmp_path, mocker):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    writer = ScanResultWriter("job2", offset=128, count=4)
+    assert not writer.restored
+    assert writer.count == 0
+    writer.discard()
+
+def test_disk_budget_evicts_least_recently_read(tmp_path, mocker):
+    mocker.patch.object(scan_results, "SCAN_RESULT_DIR", str(tmp_path))
+    paths = []
+    for name in ("old", "new"):
+        writer = ScanResultWriter(name)
+        writer.write({"id": str(i), "name": "x" * 50} for i in range(20))
+        paths.append(writer.finish())
+    past = time.time() - 60
+    os.utime(paths[0], (past, past))
+    mocker.patch.object(scan_results, "SCAN_RESULT_MAX_BYTES", os.path.getsize(paths[1]))
+
+    assert enforce_disk_budget() == 1
+    assert not os.path.exists(paths[0])
+    assert os.path.exists(paths[1])
@@ -0,0 +1,95 @@
+import pytest
+from fastapi import HTTPException
+from backend.models import File, NameStem
+from backend.services import duplicate_index_service
+from backend.services.duplicate_index_service import reindex_files
+from backend.name_similarity import normalize_name, similar_name_groups
+from backend.services.similar_files_service import get_similar_files_service
+
+def _add_files(db, names, user_id=1):
+    for name in names:
+        db.add(File(user_id=user_id, cloud_id=f"{user_id}-{db.query(File).count()}", provider="onedrive", name=name, size=1))
+    db.flush()
+    reindex_files(db, user_id, File.name_stem.is_(None))
+    db.commit()
+
+def _all_pages(db, user, **kwargs):
+    seen, cursor = [], None
+    while True:
+        page = get_similar_files_service(user, db, cursor=cursor, **kwargs)
+        seen += [sorted(f["name"] for f in group) for group in page["similar"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return seen
+
+def _names(groups, rows):
+    by_id = dict(rows)
+    return sorted(sorted(by_id[file_id] for file_id, _ in group["files"]) for group in groups)
+
+def test_names_are_normalized_before_comparison():
+    assert normalize_name("Copy of Holiday_Photo (2).JPG") == "holiday photo"
+    assert normalize_name("Budget 2024 - Copy.xlsx") == "budget 2024"
+    assert normalize_name("report.final.v2.docx") == "report final v2"
+    assert normalize_name(".bashrc") == "bashrc"
+
+def test_variants_are_grouped_and_unrelated_names_are_not():
+    rows = list(enumerate([
+        "Quarterly Report.docx", "Quarterly_Report (1).docx", "Copy of quarterly report.pdf", "Quarterly Reports.docx",
+        "IMG_1001.jpg", "IMG_1002.jpg",
+        "same.txt", "same.txt",
+        "holiday-itinerary.pdf",
+    ]))
+    groups = similar_name_groups(rows, 0.7)
+    assert _names(groups, rows) == [[
+        "Copy of quarterly report.pdf", "Quarterly Report.docx", "Quarterly Reports.docx", "Quarterly_Report (1).docx",
+    ]]
+    assert groups[0]["key"] == "quarterly report"
+    assert [score for _, score in groups[0]["files"]][:3] == [100, 100, 100]
+
+    # A looser threshold also pairs numbered camera files
+    assert ["IMG_1001.jpg", "IMG_1002.jpg"] in _names(similar_name_groups(rows, 0.5), rows)
+
+def test_pages_cover_all_groups_and_follow_inventory_changes(mocker, memory_db, make_user):
+    db = memory_db
+    topics = [f"{word} notes" for word in "apple birch cedar delta ember fjord grove harbor iris jasper kelp lotus maple nectar onyx pearl quartz raven sage tundra umber violet willow xenon yarrow".split()]
+    _add_files(db, [name for topic in topics for name in (f"{topic}.doc", f"{topic.replace(' ', '_')} (1).doc")])
+    _add_files(db, ["apple notes.doc"], user_id=2)
+
+    seen = _all_pages(db, make_user(), limit=10)
+    assert len(seen) == 25 and all(len(group) == 2 for group in seen)
+
+    # A new file is matched against the stems it shares buckets with, not the whole inventory
+    index = mocker.spy(duplicate_index_service, "index_name_stems")
+    _add_files(db, ["Copy of cedar notes.doc", "Cedar-Notes v2.doc"])
+    assert index.spy_return == 1
+    page = get_similar_files_service(make_user(), db, limit=100)
+    cedar = [group for group in page["similar"] if len(group) > 2]
+    assert [sorted(f["name"] for f in group) for group in cedar] == [["Cedar-Notes v2.doc", "Copy of cedar notes.doc", "cedar notes.doc", "cedar_notes (1).doc"]]
+    assert sorted(f["similarityScore"] for f in cedar[0]) == [79, 100, 100, 100]
+
+    # A stricter threshold splits the stored cluster; a looser one than the index was built with is refused
+    strict = get_similar_files_service(make_user(), db, threshold=0.9, limit=100)
+    assert max(len(group) for group in strict["similar"]) == 3
+
+def test_stems_indexed_one_at_a_time_cluster_like_a_single_pass(memory_db, make_user):
+    db = memory_db
+    names = [
+        "Quarterly Report.docx", "IMG_1001.jpg", "Quarterly_Report (1).docx", "holiday-itinerary.pdf",
+        "Copy of quarterly report.pdf", "Quarterly Reports.docx", "holiday itinerary v2.pdf", "same.txt", "same.txt",
+    ]
+    for name in names:
+        _add_files(db, [name])
+    rows = list(enumerate(names))
+    assert sorted(_all_pages(db, make_user())) == _names(similar_name_groups(rows, 0.7), rows)
+    assert db.query(NameStem).count() == 6
+
+    # Deleting the file that linked two stems splits their listing
+    db.query(File).filter(File.name == "Quarterly Report.docx").update({"is_deleted": True})
+    db.commit()
+    assert ["Copy of quarterly report.pdf", "Quarterly Reports.docx", "Quarterly_Report (1).docx"] in _all_pages(db, make_user())
+
+def test_threshold_is_validated(memory_db, make_user):
+    for threshold in (1.5, 0.5):
+        with pytest.raises(HTTPException) as exc:
+            get_similar_files_service(make_user(), memory_db, threshold=threshold)
+        assert exc.value.status_code == 400
@@ -0,0 +1,98 @@
+"""
+Standalone job worker, for running with JOB_EXECUTION_MODE=queue:
+
+    python -m backend.worker [--processes N] [--job-types scan,dedup,organise]
+
+The supervisor starts N worker processes (spawned, so each has its own interpreter, GIL and
+database pool) and restarts any that die. Each process claims one job at a time from the
+background_jobs table and runs it; scans still list folders on threads inside that process.
+On SIGTERM/SIGINT running scans checkpoint and hand their job back to the queue, so another
+worker resumes them without waiting for the heartbeat to go stale.
+"""
+import argparse
+import logging
+import multiprocessing
+import signal
+import time
+from typing import List
+from backend.config import WORKER_PROCESSES, WORKER_POLL_SECONDS, SCAN_RESULT_PURGE_SECONDS
+
+logger = logging.getLogger("backend.worker")
+
+def _process_main(job_types: List[str], poll_seconds: float) -> None:
+    # Imported in the child so every process builds its own engine and WORKER_ID
+    from sqlalchemy.exc import SQLAlchemyError
+    from backend.database import SessionLocal, engine
+    from backend.services.background_job_service import claim_next_job, run_job
+    from backend.services.scan_job_service import request_shutdown, purge_expired_scan_results
+
+    stopping = []
+
+    def _stop(signum, frame):
+        stopping.append(signum)
+        request_shutdown()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    last_purge = 0.0
+    while not stopping:
+        db = SessionLocal()
+        try:
+            if time.monotonic() - last_purge > SCAN_RESULT_PURGE_SECONDS:
+                purge_expired_scan_results(db)
+                last_purge = time.monotonic()
+            claimed = claim_next_job(db, job_types)
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not claim a job: {e}")
+            db.rollback()
+            claimed = None
+        finally:
+            db.close()
+        if claimed is None:
+            time.sleep(poll_seconds)
+            continue
+        job_id, job_type = claimed
+        logger.info(f"Running {job_type} job {job_id}")
+        run_job(job_id, job_type, engine)
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run queued background jobs")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES)
+    parser.add_argument("--job-types", default="scan,dedup,organise")
+    parser.add_argument("--poll-seconds", type=float, default=WORKER_POLL_SECONDS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    job_types = [job_type.strip() for job_type in args.job_types.split(",") if job_type.strip()]
+    context = multiprocessing.get_context("spawn")
+    processes: List[multiprocessing.Process] = []
+    stopping = []
+
+    def _start() -> multiprocessing.Process:
+        process = context.Process(target=_process_main, args=(job_types, args.poll_seconds), daemon=False)
+        process.start()
+        return process
+
+    def _stop(signum, frame):
+        stopping.append(signum)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    processes.extend(_start() for _ in range(max(1, args.processes)))
+    logger.info(f"Started {len(processes)} worker processes for {', '.join(job_types)} jobs")
+    while not stopping:
+        for i, process in enumerate(processes):
+            if not process.is_alive() and not stopping:
+                logger.warning(f"Worker process {process.pid} exited with {process.exitcode}; restarting")
+                processes[i] = _start()
+        time.sleep(1)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,29 @@ const authHeaders = () => ({
   Authorization: `Bearer ${localStorage.getItem('token')}`
 });
 
-export const getDuplicateFiles = async () => {
-  const res = await axios.get('/api/files/duplicates', { headers: authHeaders() });
+// Groups come a page at a time; pass the previous response's next_cursor to get the next one
+export const getDuplicateFiles = async (cursor?: string | null) => {
+  const res = await axios.get('/api/files/duplicates', {
+    headers: authHeaders(),
+    params: cursor ? { cursor } : undefined,
+  });
   return res.data;
 };
 
-export const getSimilarFiles = async () => {
-  const res = await axios.get('/api/files/similar', { headers: authHeaders() });
+// "IMG_001.jpg" / "IMG_001 (1).JPEG" / "Copy of img_001.jpg" of the same size, a page of groups at a time
+export const getCopyVariants = async (cursor?: string | null) => {
+  const res = await axios.get('/api/files/copy-variants', {
+    headers: authHeaders(),
+    params: cursor ? { cursor } : undefined,
+  });
+  return res.data;
+};
+
+export const getSimilarFiles = async (cursor?: string | null) => {
+  const res = await axios.get('/api/files/similar', {
+    headers: authHeaders(),
+    params: cursor ? { cursor } : undefined,
+  });
   return res.data;
 };
 
@@ -4,8 +4,11 @@ const authHeaders = () => ({
   Authorization: `Bearer ${localStorage.getItem('token')}`
 });
 
-export const getDuplicateImages = async () => {
-  const res = await axios.get('/api/images/duplicates', { headers: authHeaders() });
+export const getDuplicateImages = async (cursor?: string | null) => {
+  const res = await axios.get('/api/images/duplicates', {
+    headers: authHeaders(),
+    params: cursor ? { cursor } : undefined,
+  });
   return res.data;
 };
 
@@ -24,13 +24,68 @@ export async function startScanJob(folderIds: string[], maxDepth: number) {
  *   - folders_visited: number
  *   - files_found: number
  *   - error: string | null
- *   - result: array (when complete)
+ *   - result: array (when complete and small; otherwise use fetchScanJobResult)
+ *   - result_count: number (when complete)
+ *   - queue_position: number | null (while the job waits for a scheduler slot)
+ *   - estimate: { state: 'running' | 'stalled' | 'throttled', eta_seconds, items_per_second,
+ *       bytes_per_second, bytes_scanned, expected_bytes, ... } | null
  */
 export async function pollScanJob(jobId: string) {
   const { data } = await axios.get(`/api/onedrive/scan_job/${jobId}/status`);
   return data;
 }
 
+/**
+ * Follows a scan job over Server-Sent Events until it finishes, reporting progress as it is
+ * pushed. Falls back to polling the status endpoint if the stream cannot be opened.
+ * Resolves with the final job status (without the inline result).
+ */
+export function watchScanJob(jobId: string, onProgress: (status: any) => void, onFiles?: (files: any[]) => void): Promise<any> {
+  const pollUntilDone = async () => {
+    let jobStatus;
+    do {
+      await new Promise(res => setTimeout(res, 1000));
+      jobStatus = await pollScanJob(jobId);
+      onProgress(jobStatus);
+    } while (jobStatus.status === 'pending' || jobStatus.status === 'running');
+    return jobStatus;
+  };
+
+  if (typeof EventSource === 'undefined') {
+    return pollUntilDone();
+  }
+  return new Promise((resolve, reject) => {
+    const token = localStorage.getItem('token') || '';
+    const source = new EventSource(`/api/onedrive/scan_job/${jobId}/events?token=${encodeURIComponent(token)}`);
+    source.addEventListener('progress', (e) => onProgress(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener('files', (e) => onFiles?.(JSON.parse((e as MessageEvent).data).files));
+    source.addEventListener('done', (e) => {
+      source.close();
+      resolve(JSON.parse((e as MessageEvent).data));
+    });
+    source.onerror = () => {
+      source.close();
+      pollUntilDone().then(resolve, reject);
+    };
+  });
+}
+
+/**
+ * Fetches every file found by a finished scan job, one page at a time.
+ */
+export async function fetchScanJobResult(jobId: string, pageSize = 1000) {
+  const files: any[] = [];
+  let offset: number | null = 0;
+  while (offset !== null) {
+    const { data } = await axios.get(`/api/onedrive/scan_job/${jobId}/result`, {
+      params: { offset, limit: pageSize },
+    });
+    files.push(...data.files);
+    offset = data.next_offset;
+  }
+  return files;
+}
+
 /**
  * Cancels a running scan job.
  */
@@ -1,5 +1,5 @@
 import { useState, useCallback, useRef } from 'react';
-import { fetchRecursiveFiles, startScanJob, pollScanJob, cancelScanJob } from '../api/onedriveScan';
+import { fetchRecursiveFiles, startScanJob, watchScanJob, fetchScanJobResult, cancelScanJob } from '../api/onedriveScan';
 import { getCachedFiles, setCachedFiles, clearCacheForFolder } from '../utils/onedriveCache';
 
 export function useFolderScan(userId: string) {
@@ -43,28 +43,26 @@ export function useFolderScan(userId: string) {
         // 3. Start job-based scan
         const jobId = await startScanJob([folderId], depth);
         jobIdRef.current = jobId;
-        let jobStatus;
-        do {
-          await new Promise(res => setTimeout(res, 1000));
-          jobStatus = await pollScanJob(jobId);
-          setProgress(jobStatus.progress);
-          setFoldersVisited(jobStatus.folders_visited || 0);
-          setFilesFound(jobStatus.files_found || 0);
-          if (jobStatus.status === 'cancelled') {
-            setStatus('cancelled');
-            setError(jobStatus.error || 'Scan job cancelled');
-            throw new Error(jobStatus.error || 'Scan job cancelled');
-          }
-          if (jobStatus.status === 'error') {
-            setStatus('error');
-            setError(jobStatus.error || 'Scan job failed');
-            throw new Error(jobStatus.error || 'Scan job failed');
-          }
-        } while (jobStatus.status !== 'complete');
+        const jobStatus = await watchScanJob(jobId, (update) => {
+          setProgress(update.progress);
+          setFoldersVisited(update.folders_visited || 0);
+          setFilesFound(update.files_found || 0);
+        });
+        if (jobStatus.status === 'cancelled') {
+          setStatus('cancelled');
+          setError(jobStatus.error || 'Scan job cancelled');
+          throw new Error(jobStatus.error || 'Scan job cancelled');
+        }
+        if (jobStatus.status === 'error') {
+          setStatus('error');
+          setError(jobStatus.error || 'Scan job failed');
+          throw new Error(jobStatus.error || 'Scan job failed');
+        }
         if (jobStatus.status === 'complete') {
-          await setCachedFiles(userId, folderId, depth, jobStatus.result, { source: 'backend-job' });
+          const files = jobStatus.result ?? await fetchScanJobResult(jobId);
+          await setCachedFiles(userId, folderId, depth, files, { source: 'backend-job' });
           setStatus('done');
-          return jobStatus.result;
+          return files;
         }
       } else {
         setStatus('error');
@@ -93,6 +93,9 @@ const SmartOrganiser = () => {
   const [duplicateFiles, setDuplicateFiles] = useState<FileGroupFile[][]>([]);
   const [similarFiles, setSimilarFiles] = useState<FileGroupFile[][]>([]);
   const [duplicateImages, setDuplicateImages] = useState<DuplicateImage[][]>([]);
+  const [duplicateFilesCursor, setDuplicateFilesCursor] = useState<string | null>(null);
+  const [duplicateImagesCursor, setDuplicateImagesCursor] = useState<string | null>(null);
+  const [similarFilesCursor, setSimilarFilesCursor] = useState<string | null>(null);
   const [selectedMenu, setSelectedMenu] = useState('dashboard');
   const [snackbar, setSnackbar] = useState<{ open: boolean, message: string }>({ open: false, message: '' });
 
@@ -104,14 +107,41 @@ const SmartOrganiser = () => {
     if (selectedMenu === 'cleanup') {
       getCleanupRecommendations().then(setCleanupFiles);
     } else if (selectedMenu === 'duplicates') {
-      getDuplicateFiles().then(data => setDuplicateFiles(Array.isArray(data.duplicates) ? data.duplicates : []));
+      getDuplicateFiles().then(data => {
+        setDuplicateFiles(Array.isArray(data.duplicates) ? data.duplicates : []);
+        setDuplicateFilesCursor(data.next_cursor ?? null);
+      });
     } else if (selectedMenu === 'similar') {
-      getSimilarFiles().then(data => setSimilarFiles(Array.isArray(data.similar) ? data.similar : []));
+      getSimilarFiles().then(data => {
+        setSimilarFiles(Array.isArray(data.similar) ? data.similar : []);
+        setSimilarFilesCursor(data.next_cursor ?? null);
+      });
     } else if (selectedMenu === 'images') {
-      getDuplicateImages().then(data => setDuplicateImages(Array.isArray(data.duplicates) ? data.duplicates : []));
+      getDuplicateImages().then(data => {
+        setDuplicateImages(Array.isArray(data.duplicates) ? data.duplicates : []);
+        setDuplicateImagesCursor(data.next_cursor ?? null);
+      });
     }
   }, [selectedMenu]);
 
+  const loadMoreDuplicateFiles = async () => {
+    const data = await getDuplicateFiles(duplicateFilesCursor);
+    setDuplicateFiles(prev => [...prev, ...(Array.isArray(data.duplicates) ? data.duplicates : [])]);
+    setDuplicateFilesCursor(data.next_cursor ?? null);
+  };
+
+  const loadMoreSimilarFiles = async () => {
+    const data = await getSimilarFiles(similarFilesCursor);
+    setSimilarFiles(prev => [...prev, ...(Array.isArray(data.similar) ? data.similar : [])]);
+    setSimilarFilesCursor(data.next_cursor ?? null);
+  };
+
+  const loadMoreDuplicateImages = async () => {
+    const data = await getDuplicateImages(duplicateImagesCursor);
+    setDuplicateImages(prev => [...prev, ...(Array.isArray(data.duplicates) ? data.duplicates : [])]);
+    setDuplicateImagesCursor(data.next_cursor ?? null);
+  };
+
   const handleOrganise = async () => {
     setLoading(true);
     setError(null);
@@ -269,6 +299,9 @@ const SmartOrganiser = () => {
               onDeleteSelected={undefined}
             />
           )}
+          {selectedMenu === 'duplicates' && duplicateFilesCursor && (
+            <Button variant="outlined" sx={{ mt: 2 }} onClick={loadMoreDuplicateFiles}>Load more</Button>
+          )}
           {selectedMenu === 'similar' && Array.isArray(similarFiles) && (
             <FileGroupList
               groups={similarFiles}
@@ -277,6 +310,9 @@ const SmartOrganiser = () => {
               onDeleteSelected={handleDeleteSimilarFiles}
             />
           )}
+          {selectedMenu === 'similar' && similarFilesCursor && (
+            <Button variant="outlined" sx={{ mt: 2 }} onClick={loadMoreSimilarFiles}>Load more</Button>
+          )}
           {selectedMenu === 'images' && Array.isArray(duplicateImages) && duplicateImages.map((group, i) => 
             <DuplicateImagesGroup
               key={i}
@@ -284,6 +320,9 @@ const SmartOrganiser = () => {
               onDeleteSelected={ids => handleDeleteDuplicateImages(i, ids)}
             />
           )}
+          {selectedMenu === 'images' && duplicateImagesCursor && (
+            <Button variant="outlined" sx={{ mt: 2 }} onClick={loadMoreDuplicateImages}>Load more</Button>
+          )}
           {selectedMenu === 'rules' && <RuleBuilder onSave={handleSaveRule} />}
         </Box>
       </Grid>